@@ -0,0 +1,279 @@
+import base64
+import difflib
+import hashlib
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from github import GithubException
+
+
+def blob_sha(body):
+    return hashlib.sha1(b"blob %d\0" % len(body) + body).hexdigest()
+
+
+def unified_patch(before, after):
+    # Per-file patch as GitHub returns it (hunks only, no file headers); None
+    # for binary files
+    try:
+        old, new = before.decode().splitlines(keepends=True), after.decode().splitlines(keepends=True)
+    except UnicodeDecodeError:
+        return None
+    lines = []
+    for line in list(difflib.unified_diff(old, new, n=3))[2:]:
+        lines.append(line if line.endswith("\n") else line + "\n\\ No newline at end of file\n")
+    return "".join(lines).rstrip("\n")
+
+
+class FakeRef:
+    def __init__(self, repo, name, sha):
+        self.repo = repo
+        self.ref = f"refs/{name}"
+        self.object = SimpleNamespace(sha=sha, type="commit")
+
+    def edit(self, sha, force=False):
+        self.repo._call("ref.edit")
+        with self.repo.lock:
+            if self.repo.refs[self.ref] != self.object.sha and not force:
+                raise GithubException(422, {"message": "Update is not a fast forward"}, None)
+            self.repo.refs[self.ref] = sha
+            self.object.sha = sha
+
+
+class FakeRepository:
+    # In-memory stand-in for the part of PyGithub's Repository the storage
+    # backends use: the contents API (get_contents, get_dir_contents,
+    # create_file, update_file, delete_file), the Git Data API (refs,
+    # commits, trees, blobs), the commit list and compare with per-file patches. Every commit keeps a full snapshot of the files,
+    # SHAs are computed like git's, and stale writes fail with the status
+    # codes GitHub returns. latency seconds are slept on every call and
+    # calls counts them by method.
+
+    def __init__(self, full_name="bench/facility", default_branch="main", latency=0.0):
+        self.full_name = full_name
+        self.default_branch = default_branch
+        self.latency = latency
+        self.calls = Counter()
+        self.lock = threading.RLock()
+        self.blobs = {}  # sha -> bytes
+        self.trees = {}  # sha -> [element]
+        self.commits = {}  # sha -> commit
+        self.refs = {f"refs/heads/{default_branch}": self._commit({}, [], "Initial commit").sha}
+
+    # Contents API
+
+    def get_contents(self, path, ref=None):
+        self._call("get_contents")
+        files = self._files()
+        path = path.strip("/")
+        if path in files:
+            return self._content_file(path, files[path])
+        prefix = f"{path}/" if path else ""
+        listing = {}
+        for file_path, body in files.items():
+            if file_path.startswith(prefix):
+                name = file_path[len(prefix):].split("/")[0]
+                if "/" in file_path[len(prefix):]:
+                    listing[name] = SimpleNamespace(path=prefix + name, name=name, type="dir", sha=None, size=0)
+                else:
+                    listing[name] = self._content_file(file_path, body)
+        if not listing:
+            raise GithubException(404, {"message": "Not Found"}, None)
+        return sorted(listing.values(), key=lambda content: content.path)
+
+    def get_dir_contents(self, path, ref=None):
+        contents = self.get_contents(path, ref)
+        return contents if isinstance(contents, list) else [contents]
+
+    def create_file(self, path, message, content, branch=None):
+        self._call("create_file")
+        with self.lock:
+            files = self._files()
+            if path in files:
+                raise GithubException(422, {"message": "sha wasn't supplied"}, None)
+            return self._write_file(path, message, content, files)
+
+    def update_file(self, path, message, content, sha, branch=None):
+        self._call("update_file")
+        with self.lock:
+            files = self._files()
+            if path not in files:
+                raise GithubException(404, {"message": "Not Found"}, None)
+            if blob_sha(files[path]) != sha:
+                raise GithubException(409, {"message": f"{path} does not match {sha}"}, None)
+            return self._write_file(path, message, content, files)
+
+    def delete_file(self, path, message, sha, branch=None):
+        self._call("delete_file")
+        with self.lock:
+            files = self._files()
+            if path not in files:
+                raise GithubException(404, {"message": "Not Found"}, None)
+            if blob_sha(files[path]) != sha:
+                raise GithubException(409, {"message": f"{path} does not match {sha}"}, None)
+            del files[path]
+            commit = self._commit(files, [self._head()], message)
+            self.refs[f"refs/heads/{self.default_branch}"] = commit.sha
+            return {"commit": commit, "content": None}
+
+    # Git Data API
+
+    def get_git_ref(self, ref):
+        self._call("get_git_ref")
+        with self.lock:
+            if f"refs/{ref}" not in self.refs:
+                raise GithubException(404, {"message": "Not Found"}, None)
+            return FakeRef(self, ref, self.refs[f"refs/{ref}"])
+
+    def create_git_ref(self, ref, sha):
+        self._call("create_git_ref")
+        with self.lock:
+            if ref in self.refs:
+                raise GithubException(422, {"message": "Reference already exists"}, None)
+            self.refs[ref] = sha
+            return FakeRef(self, ref[len("refs/"):], sha)
+
+    def get_git_commit(self, sha):
+        self._call("get_git_commit")
+        return self.commits[sha]
+
+    def get_git_tree(self, sha, recursive=False):
+        self._call("get_git_tree")
+        with self.lock:
+            if f"refs/heads/{sha}" in self.refs:
+                # A branch name stands for its head commit's tree
+                sha = self.commits[self.refs[f"refs/heads/{sha}"]].tree.sha
+            if sha not in self.trees:
+                raise GithubException(404, {"message": "Not Found"}, None)
+            elements = self.trees[sha]
+            if recursive:
+                elements = list(self._walk(sha, ""))
+            return SimpleNamespace(sha=sha, tree=elements)
+
+    def get_git_blob(self, sha):
+        self._call("get_git_blob")
+        body = self.blobs[sha]
+        return SimpleNamespace(sha=sha, size=len(body), encoding="base64", content=base64.b64encode(body).decode())
+
+    def create_git_blob(self, content, encoding):
+        self._call("create_git_blob")
+        body = base64.b64decode(content) if encoding == "base64" else content.encode()
+        with self.lock:
+            self.blobs[blob_sha(body)] = body
+        return SimpleNamespace(sha=blob_sha(body))
+
+    def create_git_tree(self, tree, base_tree=None):
+        self._call("create_git_tree")
+        with self.lock:
+            files = dict(self._tree_files(base_tree.sha)) if base_tree is not None else {}
+            for element in tree:
+                entry = element._identity
+                path = entry["path"]
+                if "content" in entry:
+                    files[path] = entry["content"].encode()
+                elif entry.get("sha") is None:
+                    # Deleting a path removes a file or a whole subtree
+                    for file_path in [file_path for file_path in files
+                                      if file_path == path or file_path.startswith(f"{path}/")]:
+                        del files[file_path]
+                else:
+                    files[path] = self.blobs[entry["sha"]]
+            return SimpleNamespace(sha=self._tree(files))
+
+    def create_git_commit(self, message, tree, parents):
+        self._call("create_git_commit")
+        with self.lock:
+            return self._commit(self._tree_files(tree.sha), [parent.sha for parent in parents], message)
+
+    def get_commits(self, sha=None, since=None):
+        # The branch's history, newest first, as far back as since
+        self._call("get_commits")
+        with self.lock:
+            sha = self.refs.get(f"refs/heads/{sha or self.default_branch}", sha)
+            commits = []
+            while sha and (since is None or self.commits[sha].date >= since):
+                commit = self.commits[sha]
+                commits.append(SimpleNamespace(sha=sha, commit=SimpleNamespace(
+                    message=commit.message, committer=SimpleNamespace(date=commit.date))))
+                sha = commit.parents[0].sha if commit.parents else None
+            return commits
+
+    def compare(self, base, head):
+        self._call("compare")
+        with self.lock:
+            before, after = self.commits[base].files, self.commits[head].files
+        files = []
+        for path in sorted(before.keys() | after.keys()):
+            if before.get(path) == after.get(path):
+                continue
+            status = "added" if path not in before else "removed" if path not in after else "modified"
+            files.append(SimpleNamespace(filename=path, status=status, previous_filename=None,
+                                         sha=blob_sha(after[path]) if path in after else None,
+                                         patch=unified_patch(before.get(path, b""), after.get(path, b""))))
+        return SimpleNamespace(files=files)
+
+    # Helpers
+
+    def _call(self, name):
+        with self.lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _head(self):
+        return self.refs[f"refs/heads/{self.default_branch}"]
+
+    def _files(self):
+        return dict(self.commits[self._head()].files)
+
+    def _tree_files(self, sha):
+        return {element.path: self.blobs[element.sha] for element in self._walk(sha, "")}
+
+    def _walk(self, sha, prefix):
+        for element in self.trees[sha]:
+            if element.type == "tree":
+                yield from self._walk(element.sha, f"{prefix}{element.path}/")
+            else:
+                yield SimpleNamespace(path=prefix + element.path, mode=element.mode, type="blob",
+                                      sha=element.sha, size=element.size)
+
+    def _tree(self, files, prefix=""):
+        entries = {}
+        directories = set()
+        for path, body in files.items():
+            if not path.startswith(prefix):
+                continue
+            rest = path[len(prefix):]
+            if "/" in rest:
+                directories.add(rest.split("/")[0])
+            else:
+                self.blobs[blob_sha(body)] = body
+                entries[rest] = SimpleNamespace(path=rest, mode="100644", type="blob", sha=blob_sha(body), size=len(body))
+        for directory in directories:
+            entries[directory] = SimpleNamespace(path=directory, mode="040000", type="tree",
+                                                 sha=self._tree(files, f"{prefix}{directory}/"), size=None)
+        elements = [entries[name] for name in sorted(entries)]
+        sha = hashlib.sha1("".join(f"{e.mode} {e.path} {e.sha}\n" for e in elements).encode()).hexdigest()
+        self.trees[sha] = elements
+        return sha
+
+    def _commit(self, files, parents, message):
+        tree = self._tree(files)
+        sha = hashlib.sha1(f"{tree} {parents} {message} {len(self.commits)}".encode()).hexdigest()
+        self.commits[sha] = SimpleNamespace(sha=sha, tree=SimpleNamespace(sha=tree), message=message, files=dict(files),
+                                            parents=[SimpleNamespace(sha=parent) for parent in parents],
+                                            date=datetime.now(timezone.utc))
+        return self.commits[sha]
+
+    def _write_file(self, path, message, content, files):
+        body = content.encode() if isinstance(content, str) else bytes(content)
+        files[path] = body
+        commit = self._commit(files, [self._head()], message)
+        self.refs[f"refs/heads/{self.default_branch}"] = commit.sha
+        return {"commit": commit, "content": self._content_file(path, body)}
+
+    def _content_file(self, path, body):
+        return SimpleNamespace(path=path, name=path.rpartition("/")[2], type="file", sha=blob_sha(body),
+                               size=len(body), encoding="base64", content=base64.b64encode(body).decode(),
+                               decoded_content=body)
@@ -0,0 +1,124 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import exports
+import search
+import storage
+from fake_github import FakeRepository
+
+WORK_ORDERS = "work order records.json"
+LOCATIONS = ['Admin indoor', 'QC lab & Sampling room', 'Processing', 'Receiving area & Reject room',
+             'Technical corridor', 'Packaging', 'Warehouse', 'Utilities & Area Surround']
+ELEMENTS = ['Floors', 'Lights', 'Electrical Outlets', 'Doors', 'Ceilings', 'Walls', 'Windows', 'Furniture']
+PEOPLE = ['shehab', 'sameh', 'kaleed', 'yasser', 'masry', 'zeinab', 'wael']
+WORDS = ['crack', 'leak', 'stain', 'broken', 'loose', 'missing', 'faded', 'noisy', 'rust', 'gap']
+# GitHub engines -> (layout, file format)
+GITHUB_ENGINES = {"single": ("single", "json"), "sharded": ("sharded", "json"), "compact": ("single", "compact")}
+
+
+def work_order(number):
+    day = 1 + number % 28
+    month = 1 + (number // 28) % 12
+    return {
+        "id": str(number),
+        "Location": random.choice(LOCATIONS),
+        "Element": random.choice(ELEMENTS),
+        "Detector Name": random.choice(PEOPLE),
+        "Date": f"2025-{month:02d}-{day:02d} 10:00:00",
+        "Rating": random.choice([1, 2, 3]),
+        "Responsible Person": random.choice(PEOPLE),
+        "Expected Repair Date": "",
+        "Actual Repair Date": "",
+        "Image": "",
+        "Thumbnail": "",
+        "Comment": " ".join(random.sample(WORDS, 3)),
+        "Safety related": random.choice(["Yes", "No"]),
+        "Quality related": random.choice(["Yes", "No"]),
+    }
+
+
+def make_backend(engine, repo, directory):
+    if engine == "sqlite":
+        return storage.SQLiteBackend(os.path.join(directory, f"bench-{time.monotonic_ns()}.db"))
+    return storage.GithubBackend(repo, storage.DocumentCache(), *GITHUB_ENGINES[engine])
+
+
+def measure(repo, operation, count=1):
+    # (operations per second, API calls per operation)
+    calls = sum(repo.calls.values())
+    start = time.perf_counter()
+    for _ in range(count):
+        operation()
+    seconds = time.perf_counter() - start
+    return {"ops_per_s": round(count / seconds, 1), "ms": round(seconds * 1000 / count, 2),
+            "api_calls": round((sum(repo.calls.values()) - calls) / count, 1)}
+
+
+def run(engine, size, operations, latency, directory):
+    random.seed(size)
+    repo = FakeRepository(latency=latency)
+    backend = make_backend(engine, repo, directory)
+    # Seeding goes through one whole-collection save
+    backend.save(WORK_ORDERS, {"records": [work_order(number) for number in range(1, size + 1)]})
+    results = {}
+
+    ids = iter(range(size + 1, size + operations + 1))
+    results["create"] = measure(repo, lambda: backend.append(WORK_ORDERS, work_order(next(ids))), operations)
+    results["update"] = measure(
+        repo, lambda: backend.update_by_id(WORK_ORDERS, str(random.randint(1, size)), {"Comment": "fixed"}), operations)
+    # A new GitHub backend starts with an empty document cache; SQLite has none
+    cold = (lambda: backend) if engine == "sqlite" else (lambda: make_backend(engine, repo, directory))
+    results["load (cold)"] = measure(repo, lambda: cold().load(WORK_ORDERS))
+    results["load (warm)"] = measure(repo, lambda: backend.load(WORK_ORDERS), operations)
+
+    results["query page"] = measure(repo, lambda: backend.query(
+        WORK_ORDERS, {"Location": [random.choice(LOCATIONS)]}, sort="Date", descending=True, limit=50), operations)
+    results["query date range"] = measure(repo, lambda: backend.query(
+        WORK_ORDERS, date_from="2025-03-01", date_to="2025-03-31", limit=50), operations)
+
+    engine_search = search.SearchEngine(backend)
+    results["search index build"] = measure(repo, lambda: engine_search.index(WORK_ORDERS))
+    results["search"] = measure(repo, lambda: engine_search.search(
+        WORK_ORDERS, random.choice(WORDS), {"Location": [random.choice(LOCATIONS)]}), operations)
+
+    exporter = exports.Exporter(backend)
+    results["export csv"] = measure(repo, lambda: exporter.export("csv", [WORK_ORDERS]))
+    results["export csv (cached)"] = measure(repo, lambda: exporter.export("csv", [WORK_ORDERS]), operations)
+    results["export xlsx"] = measure(repo, lambda: exporter.export("xlsx", [WORK_ORDERS]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage benchmarks against an in-memory GitHub repository")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--engines", nargs="+", default=["single", "sharded", "compact", "sqlite"],
+                        help="GitHub engines (single, sharded, compact) and/or sqlite")
+    parser.add_argument("--operations", type=int, default=20, help="repetitions of each timed operation")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API call")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    report = []
+    with tempfile.TemporaryDirectory() as directory:
+        for engine in args.engines:
+            for size in args.sizes:
+                results = run(engine, size, args.operations, args.latency, directory)
+                report.append({"engine": engine, "records": size, "latency": args.latency, "results": results})
+                print(f"\n{engine}, {size} records")
+                print(f"  {'operation':<22}{'ops/s':>10}{'ms/op':>10}{'calls/op':>10}")
+                for operation, result in results.items():
+                    print(f"  {operation:<22}{result['ops_per_s']:>10}{result['ms']:>10}{result['api_calls']:>10}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
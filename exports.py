@@ -0,0 +1,122 @@
+import io
+import threading
+from collections import OrderedDict
+import pandas as pd
+import xlsxwriter
+import schema
+from instrumentation import metrics
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+FORMATS = {
+    "csv": ("csv", "text/csv"),
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def accepted_values(filters):
+    # filters: field -> accepted values; an empty list accepts everything
+    return {field: set(map(str, accepted)) for field, accepted in (filters or {}).items() if accepted}
+
+
+def matches(record, accepted):
+    return all(str(record.get(field)) in values for field, values in accepted.items())
+
+
+def sheet_name(file_path):
+    return file_path.rsplit(".", 1)[0][:31]
+
+
+def cell(value):
+    if value is None or value is pd.NaT or value is pd.NA or (isinstance(value, float) and value != value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+class Exporter:
+    # CSV and XLSX downloads built only when asked for and cached under the
+    # versions of the collections they came from, so the same data is never
+    # serialized twice. Records are read and written chunk by chunk, which
+    # keeps large exports from holding a DataFrame of the whole collection.
+
+    def __init__(self, backend, max_entries=16, chunk_size=5000):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.chunk_size = chunk_size
+        self.entries = OrderedDict()  # key -> bytes
+        self.lock = threading.Lock()
+
+    def cached(self, fmt, file_paths, filters=None):
+        key = self._key(fmt, file_paths, filters)
+        with self.lock:
+            return key in self.entries
+
+    def export(self, fmt, file_paths, filters=None):
+        # CSV takes one collection, XLSX gets a sheet per collection
+        key = self._key(fmt, file_paths, filters)
+        with self.lock:
+            if key in self.entries:
+                metrics.hit("exports")
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        metrics.miss("exports")
+        if fmt == "csv":
+            data = b"".join(self.stream_csv(file_paths[0], filters))
+        else:
+            data = self.build_xlsx(file_paths, filters)
+        with self.lock:
+            self.entries[key] = data
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return data
+
+    def chunks(self, file_path, filters=None):
+        # Typed DataFrames of at most chunk_size records each, all with the
+        # schema's columns so the chunks line up. Filters on fields the
+        # collection does not have are ignored.
+        columns = schema.COLUMNS[file_path]
+        accepted = {field: values for field, values in accepted_values(filters).items() if field in columns}
+        chunk = []
+        for record in self.backend.iter_records(file_path):
+            if matches(record, accepted):
+                chunk.append(record)
+            if len(chunk) == self.chunk_size:
+                yield schema.frame(file_path, chunk)[columns]
+                chunk = []
+        if chunk:
+            yield schema.frame(file_path, chunk)[columns]
+
+    def stream_csv(self, file_path, filters=None):
+        header = True
+        for df in self.chunks(file_path, filters):
+            yield df.to_csv(index=False, header=header, date_format=DATE_FORMAT).encode("utf-8")
+            header = False
+        if header:
+            yield schema.frame(file_path, []).to_csv(index=False).encode("utf-8")
+
+    def build_xlsx(self, file_paths, filters=None):
+        output = io.BytesIO()
+        # constant_memory flushes every finished row to a temporary file
+        workbook = xlsxwriter.Workbook(output, {"constant_memory": True, "default_date_format": "yyyy-mm-dd hh:mm:ss"})
+        for file_path in file_paths:
+            worksheet = workbook.add_worksheet(sheet_name(file_path))
+            row = 0
+            for df in self.chunks(file_path, filters):
+                if row == 0:
+                    worksheet.write_row(0, 0, list(df.columns))
+                    row = 1
+                for values in df.itertuples(index=False):
+                    worksheet.write_row(row, 0, [cell(value) for value in values])
+                    row += 1
+            if row == 0:
+                worksheet.write_row(0, 0, schema.COLUMNS[file_path])
+        workbook.close()
+        return output.getvalue()
+
+    def _key(self, fmt, file_paths, filters):
+        versions = tuple(self.backend.version(file_path) for file_path in file_paths)
+        filter_key = tuple(sorted((field, tuple(sorted(values))) for field, values in accepted_values(filters).items()))
+        return fmt, tuple(file_paths), versions, filter_key
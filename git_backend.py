@@ -1,72 +1,222 @@
-import json
-from github import Github
 import streamlit as st
 import base64
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 from PIL import Image
 import pytz
-import io
 from io import BytesIO
 import git_backend as gb
-import os
+import exports
+import history
+import images
+import imports
+import kpis
+import schema
+import search
+import storage
+import submissions
+import threading
+import time
+from instrumentation import metrics
 st.set_page_config(
     layout="wide",
     page_title='facility_w',
     page_icon='🪙')
 
 egypt_tz = pytz.timezone('Africa/Cairo')
-# GitHub setup
-g = Github(st.secrets["GITHUB_TOKEN"])
-repo = g.get_repo(st.secrets["REPO_NAME"])
 
+# Process-wide resources: created on the first run and shared by every session and rerun
+@st.cache_resource
+def get_backend():
+    # Storage setup (GitHub by default, see STORAGE_BACKEND in st.secrets)
+    return storage.get_backend(st.secrets)
+
+@st.cache_resource
+def get_submission_queue():
+    return submissions.SubmissionQueue()
+
+@st.cache_resource
+def get_search_engine():
+    # Indexed search over the collections, kept current as records are written
+    return search.SearchEngine(get_backend())
+
+@st.cache_resource
+def get_kpi_engine():
+    # Maintenance KPIs, updated as work orders are created, updated and completed
+    return kpis.KpiEngine(get_backend())
+
+@st.cache_resource
+def get_history_engine():
+    # Change log timelines per work order, modifier and date
+    return history.HistoryEngine(get_backend())
+
+@st.cache_resource
+def get_exporter():
+    # CSV/XLSX downloads cached per collection version
+    return exports.Exporter(get_backend())
+
+@st.cache_resource
+def get_archive_schedule():
+    # When this process last queued the archival of closed work orders
+    return {"last_run": 0.0, "lock": threading.Lock()}
+
+@st.cache_resource
+def get_image_cache():
+    # Images already viewed are served from memory or disk (IMAGE_CACHE_DIR, IMAGE_CACHE_MB)
+    return images.ImageCache(
+        st.secrets.get("IMAGE_CACHE_DIR", ".image_cache"),
+        max_disk_bytes=st.secrets.get("IMAGE_CACHE_MB", 200) * 2 ** 20)
+
+backend = get_backend()
+repo = getattr(backend, "repo", None)
+submission_queue = get_submission_queue()
+search_engine = get_search_engine()
+exporter = get_exporter()
+kpi_engine = get_kpi_engine()
+history_engine = get_history_engine()
+image_cache = get_image_cache()
+# Metrics are also logged as JSON every METRICS_LOG_SECONDS when set
+metrics.start_logging(st.secrets.get("METRICS_LOG_SECONDS", 0))
+
+@metrics.timed("app.load_data")
 def load_data(file_path):
-    if file_path not in ("check list.json", "change log.json",'work order records.json','completed work order.json'):
+    if file_path not in storage.COLLECTIONS:
         return None
     try:
-        content = repo.get_contents(file_path)
-        data = json.loads(content.decoded_content.decode())
-    except:
-        # If file does not exist or is not accessible, return a default structure based on the file type
-        if file_path == "check list.json":
-            data = {"check": []}
-        elif file_path == "change log.json":
-            data = {"logs": []}
-        elif file_path == "work order records.json":
-            data = {"records": []}  # Adjust according to the structure of work order records
-        elif file_path == "completed work order.json":
-            data = {"completed": []}  # Adjust according to the structure of completed work orders
+        data = backend.load(file_path)
+    except Exception:
+        data = None
+    # If file does not exist or is not accessible, return a default structure based on the file type
+    if data is None:
+        data = storage.default_data(file_path)
     return data
 
-def save_data(file_path, data):
+@metrics.timed("app.load_snapshot")
+def load_snapshot(file_paths):
+    # The given collections fetched concurrently (one tree listing on GitHub)
     try:
-        content = repo.get_contents(file_path)
-        repo.update_file(file_path, f"Update {file_path}", json.dumps(data, indent=2), content.sha)
-    except:
-        repo.create_file(file_path, f"Create {file_path}", json.dumps(data, indent=2))
-
+        snapshot = backend.load_snapshot(file_paths)
+    except Exception:
+        snapshot = {}
+    return {file_path: snapshot.get(file_path) or storage.default_data(file_path) for file_path in file_paths}
+
+@metrics.timed("app.sync")
+def sync_storage(max_age=0):
+    # Pulls in what other tablets committed since the last sync, at most once
+    # every max_age seconds (see GithubBackend.sync)
+    try:
+        return backend.sync(max_age)
+    except Exception:
+        return []
+
+@metrics.timed("app.query_records")
+def query_records(file_path, filters=None, date_from=None, date_to=None, sort=None, descending=False, offset=0, limit=None):
+    # (matching records, the requested page of them); filtering, sorting and
+    # paging happen in the storage engine
+    try:
+        return backend.query(file_path, filters, date_from, date_to, sort, descending, offset, limit)
+    except Exception:
+        return 0, []
 
-# Handle Images
-def save_image(image_data, image_name):
+def distinct_values(file_path, field):
+    # Choices for a filter on field, read from the storage engine
     try:
-        image_path = f"images/{image_name}"
-        encoded_image = base64.b64encode(image_data)
+        return backend.distinct(file_path, field)
+    except Exception:
+        return []
+
+@metrics.timed("app.save_data")
+def save_data(file_path, data, tx=None):
+    (tx or backend).save(file_path, data)
+
+def transaction(message="Update records"):
+    # Writes staged through the returned transaction land in a single commit
+    return backend.transaction(message)
+
+def purge_data(file_paths, directories=(), archive=False):
+    # Empties the collections and deletes the directories in one commit,
+    # optionally keeping a snapshot first; returns where it was archived
+    archived = None
+    if archive:
+        archived = backend.archive(datetime.now(egypt_tz).strftime("archive-%Y%m%d-%H%M%S"))
+    with transaction(f"Clear {', '.join(file_paths + list(directories))}") as tx:
+        for file_path in file_paths:
+            save_data(file_path, storage.default_data(file_path), tx)
+        for directory in directories:
+            tx.purge(directory)
+    return archived
 
-        try:
-            content = repo.get_contents(image_path)
-            repo.update_file(image_path, f"Update {image_name}", encoded_image, content.sha)
-        except:
-            repo.create_file(image_path, f"Create {image_name}", encoded_image)
+
+# Handle Images
+@metrics.timed("app.put_image", size=lambda result, args: len(args[0]))
+def put_image(image_data, variant="display", tx=None):
+    # Raw JPEG bytes under their content hash; an image already stored is not uploaded again
+    image_path = images.content_path(variant, image_data)
+    if backend.image_exists(image_path):
         return image_path
-    except Exception as e:
-        st.error(f"Error saving image: {str(e)}")
-        return None
+    return (tx or backend).put_image(image_path, image_data)
+
+@metrics.timed("app.fetch_image", size=lambda result, args: len(result))
+def fetch_image(image_path):
+    image_data = backend.get_image(image_path)
+    if images.is_legacy(image_path):
+        return base64.b64decode(image_data)
+    return image_data
+
+def image_version(image_path):
+    return "" if images.is_immutable(image_path) else backend.image_version(image_path)
+
+@metrics.timed("app.load_image", size=lambda result, args: len(result))
+def load_image(image_path):
+    return image_cache.get(image_path, image_version(image_path), fetch_image)
+
+def prefetch_images(image_paths):
+    image_cache.prefetch([(path, image_version(path)) for path in image_paths if path], fetch_image)
+
+# Downloads: nothing is serialized until asked for, then once per version of the data
+def export_downloads(label, file_paths, key, filters=None):
+    formats = ["csv", "xlsx"] if len(file_paths) == 1 else ["xlsx"]
+    for column, fmt in zip(st.columns(len(formats)), formats):
+        extension, mime = exports.FORMATS[fmt]
+        with column:
+            if gb.exporter.cached(fmt, file_paths, filters) or st.button(f"Prepare {label} ({extension.upper()})", key=f"{key}_{fmt}_prepare"):
+                st.download_button(
+                    label=f"Download {label} as {extension.upper()}",
+                    data=gb.exporter.export(fmt, file_paths, filters),
+                    file_name=f"{label.lower().replace(' ', '_')}.{extension}",
+                    mime=mime,
+                    key=f"{key}_{fmt}")
+
+# Record tables: only the page on screen becomes a DataFrame and is sent to the browser
+def record_table(file_path, key, filter_fields=(), page_size=50):
+    with st.expander("Filter and sort"):
+        filters = {field: st.multiselect(field, gb.distinct_values(file_path, field), key=f"{key}_filter_{field}")
+                   for field in filter_fields}
+        date_from = st.text_input('From date (YYYY-MM-DD)', key=f"{key}_date_from")
+        date_to = st.text_input('To date (YYYY-MM-DD)', key=f"{key}_date_to")
+        sort = st.selectbox('Sort by', ['(as stored)'] + schema.COLUMNS[file_path], key=f"{key}_sort")
+        descending = st.checkbox('Descending', key=f"{key}_descending")
+    sort = None if sort == '(as stored)' else sort
+    page_number = st.session_state.get(f"{key}_page", 1)
+    total, records = gb.query_records(file_path, filters, date_from, date_to, sort, descending,
+                                      (page_number - 1) * page_size, page_size)
+    pages = max(1, -(-total // page_size))
+    if page_number > pages:
+        # The filters left fewer pages than the one that was open
+        page_number = st.session_state[f"{key}_page"] = pages
+        total, records = gb.query_records(file_path, filters, date_from, date_to, sort, descending,
+                                          (page_number - 1) * page_size, page_size)
+    st.dataframe(schema.frame(file_path, records))
+    col1, col2 = st.columns([1, 3])
+    col1.number_input('Page', min_value=1, max_value=pages, key=f"{key}_page")
+    col2.caption(f"{total} records, page {page_number} of {pages}")
+    return total
 
 # Checklist CRUD operations
-def create_checklist_record(record):
-    data = load_data("check list.json")
+# Records created without an id get the next one from the collection's allocator
+def create_checklist_record(record, tx=None):
     new_record = {
-        "id": record.get("id", str(len(data["check"]) + 1)),
+        "id": record.get("id", ""),
         "Location": record.get("Location", ""),
         "Element": record.get("Element", ""),
         "Detector Name": record.get("Detector Name", ""),
@@ -74,23 +224,14 @@ def create_checklist_record(record):
         "Rating": record.get("Rating", ""),
         "Comment": record.get("Comment", ""),
     }
-    data["check"].append(new_record)
-    save_data("check list.json", data)
-    return new_record
-
-def update_checklist_record(record_id, updated_data):
-    data = load_data("check list.json")
-    for record in data["check"]:
-        if record["id"] == record_id:
-            record.update(updated_data)
-            save_data("check list.json", data)
-            return record
-    return None
-
-def create_work_order(work):
-    data = load_data("work order records.json")
+    return (tx or backend).append("check list.json", new_record)
+
+def update_checklist_record(record_id, updated_data, tx=None):
+    return (tx or backend).update_by_id("check list.json", record_id, updated_data)
+
+def create_work_order(work, tx=None):
     new_record = {
-        "id": work.get("id", str(len(data["records"]) + 1)),
+        "id": work.get("id", ""),
         "Location": work.get("Location", ""),
         "Element": work.get("Element", ""),
         "Detector Name": work.get("Detector Name", ""),
@@ -100,127 +241,153 @@ def create_work_order(work):
         "Expected Repair Date": work.get("Expected Repair Date", ""),
         "Actual Repair Date": work.get("Actual Repair Date", ""),
         "Image": work.get("Image", ""),
+        "Thumbnail": work.get("Thumbnail", ""),
         "Comment": work.get("Comment", ""),
         "Safety related": work.get("Safety related", ""),
         "Quality related": work.get("Quality related", "")
     }
-    data["records"].append(new_record)
-    save_data("work order records.json", data)
-    return new_record 
+    return (tx or backend).append("work order records.json", new_record)
    
 
-def update_work_order(work_id, updated_data):
-    data = load_data("work order records.json")
-    for record in data["records"]:
-        if record["id"] == work_id:
-            record.update(updated_data)
-            save_data("work order records.json", data)
-            return record
-    return None
-
-def create_completed_work_order(completed):
-    data = load_data("completed work order.json")
+def update_work_order(work_id, updated_data, tx=None):
+    return (tx or backend).update_by_id("work order records.json", work_id, updated_data)
+
+def create_completed_work_order(completed, tx=None):
     new_record = {
-        "id": completed.get("id", str(len(data["completed"]) + 1)),
-        "location": completed.get("location", ""),
-        "element": completed.get("element", ""),
+        "id": completed.get("id", ""),
+        "Work Order ID": completed.get("Work Order ID", ""),
+        "Location": completed.get("Location", ""),
+        "Element": completed.get("Element", ""),
         "Detector Name": completed.get("Detector Name", ""),
         "Date": completed.get("Date",""),
         "Rating": completed.get("Rating", ""),
         "Responsible Person": completed.get("Responsible Person", ""),
         "Expected Repair Date": completed.get("Expected Repair Date", ""),
         "Actual Repair Date": completed.get("Actual Repair Date", ""),
-        "image": completed.get("image", ""),
-        "comment": completed.get("comment", ""),
+        "Image": completed.get("Image", ""),
+        "Thumbnail": completed.get("Thumbnail", ""),
+        "Comment": completed.get("Comment", ""),
         "Safety related": completed.get("Safety related", ""),
         "Quality related": completed.get("Quality related", "")
     }
-    data["completed"].append(new_record)
-    save_data("completed work order.json", data)
-    return new_record
-
-def update_completed_work_order(completed_id, updated_data):
-    data = load_data("completed work order.json")
-    for record in data["completed"]:
-        if record["id"] == completed_id:
-            record.update(updated_data)
-            save_data("completed work order.json", data)
-            return record
-    return None
-
-def create_change_log_entry(entry):
-    data = load_data("change log.json")
+    return (tx or backend).append("completed work order.json", new_record)
+
+def update_completed_work_order(completed_id, updated_data, tx=None):
+    return (tx or backend).update_by_id("completed work order.json", completed_id, updated_data)
+
+def create_change_log_entry(entry, tx=None):
     new_entry = {
-        "id": str(len(data["logs"]) + 1),
+        "id": "",
+        "Event ID": entry.get("Event ID", ""),
         "Modifier Name": entry.get("Modifier Name", ""),
         "Modification Date": entry.get("Modification Date"),
         "Modification Type": entry.get("Modification Type", ""),
         "New Date": entry.get("New Date", "")
     }
-    data["logs"].append(new_entry)
-    save_data("change log.json", data)
-    return new_entry
-
-
-
-def load_work_order():
-    data = gb.load_data("work order records.json")
-    if data:
-        df = pd.DataFrame(data["records"])
-        for col in ['Date', 'Expected Repair Date', 'Actual Repair Date']:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors='coerce')
-        return df
-    return pd.DataFrame(columns=[
-        'id', 'Location', 'Element', 'Detector Name', 
-        'Date', 'Rating', 'Responsible Person', 
-        'Expected Repair Date', 'Actual Repair Date', 'Image', 'Comment', 'Safety related','Quality related'
-    ])
-
-def load_check_list():
-    data = gb.load_data("check list.json")
-    if data:
-        return pd.DataFrame(data["check"])
-    return pd.DataFrame(columns=[
-        'id', 'Location', 'Element', 
-        'Detector Name', 'Date','Rating','Comment'
-    ])
-
-
-
-def load_completed_work_order():
-    data = gb.load_data("completed work order.json")
-    if data:
-        return pd.DataFrame(data["completed"])
-    return pd.DataFrame(columns=[
-        'id', 'modifierName', 'modificationDate', 
-        'modificationType', 'newDate'
-    ])
-
-
-def load_change_log():
-    data = gb.load_data("change_log.json")
-    if data:
-        return pd.DataFrame(data["logs"])
-    return pd.DataFrame(columns=[
-        'id', 'Location', 'Element', 'Detector Name', 
-        'Date', 'Rating', 'Responsible Person', 
-        'Expected Repair Date', 'Actual Repair Date', 'Image', 'Comment', 'Safety related','Quality related'
-    ])
-
-# Initialize session state
-if 'check_list_df' not in st.session_state:
-    st.session_state.check_list_df = load_check_list()
-
-if 'work_order_df' not in st.session_state:
-    st.session_state.work_order_df = load_work_order()
-
-if 'ompleted_work_df' not in st.session_state:
-    st.session_state.ompleted_work_df = load_completed_work_order()
-
-if 'log_df' not in st.session_state:
-    st.session_state.log_df = load_change_log()
-
+    return (tx or backend).append("change log.json", new_entry)
+
+
+# Inspections
+# A rating of 0 or N/A is recorded on the checklist, 1-3 opens a work order
+def inspection_entry(location, answers):
+    date = datetime.now(egypt_tz).strftime("%Y-%m-%d %H:%M:%S")
+    if answers['Rating'] not in [1, 2, 3]:
+        check_row = {
+            'Location': location,
+            'Element': answers['Element'],
+            'Detector Name': answers['Detector Name'],
+            'Date': date,
+            'Rating': answers['Rating'],
+            'Comment': answers['Comment']}
+        return check_row, None, None
+    order = {
+        'Location': location,
+        'Element': answers['Element'],
+        'Detector Name': answers['Detector Name'],
+        'Date': date,
+        'Rating': answers['Rating'],
+        'Comment': answers['Comment'],
+        'Responsible Person': answers['Responsible Person'],
+        'Expected Repair Date': '',
+        'Actual Repair Date': '',
+        'Image': '',
+        'Thumbnail': '',
+        'Safety related': 'Yes' if answers['Safety related'] else 'No',
+        'Quality related': 'Yes' if answers['Quality related'] else 'No'
+    }
+    image_bytes = answers['Image'].getvalue() if answers['Image'] is not None else None
+    return None, order, image_bytes
+
+# Background submissions
+# Runs in a submission thread: no st.* calls in here
+def persist_entries(progress, message, entries):
+    # All records and images of the entries go out as one commit
+    with transaction(message) as tx:
+        for number, (check_row, order, image_bytes) in enumerate(entries):
+            if check_row is not None:
+                create_checklist_record(check_row, tx)
+                continue
+            if image_bytes is not None:
+                progress(f"Processing image of {order['Element']}", number / len(entries))
+                variants = images.make_variants(BytesIO(image_bytes))
+                order['Image'] = put_image(variants["display"], "display", tx)
+                order['Thumbnail'] = put_image(variants["thumbs"], "thumbs", tx)
+            create_work_order(order, tx)
+        progress("Saving records", 0.9)
+        # Committing clears the staged ops
+        ops = list(tx.ops)
+    # file path -> ids of the records saved in it; ids are per collection
+    saved = {}
+    for op, result in zip(ops, tx.results):
+        if op[0] == "append":
+            saved.setdefault(op[1], []).append(str(result["id"]))
+    return saved
+
+def submit_entries(label, entries):
+    # Returns at once with a ticket; the uploads and the commit happen in the background
+    return submission_queue.submit(label, persist_entries, f"Record {label}", entries)
+
+
+# Bulk import: every valid row of a sheet in one commit, ids allocated together
+def import_records(file_path, records):
+    with transaction(f"Import {len(records)} records into {file_path}") as tx:
+        tx.extend(file_path, records)
+    return len(records)
+
+
+# Archival: work orders with an Actual Repair Date move to the completed
+# collection so the work order file only holds open work
+def archive_closed_work_orders(progress=None, min_age_days=0):
+    cutoff = datetime.now(egypt_tz).replace(tzinfo=None) - timedelta(days=min_age_days)
+    closed = []
+    for order in backend.iter_records("work order records.json"):
+        repaired = kpis.parse_date(order.get("Actual Repair Date") or "")
+        # Orders still queued without an id wait for the next run
+        if order.get("id") and repaired is not None and repaired <= cutoff:
+            closed.append(order)
+    if not closed:
+        return 0
+    if progress:
+        progress(f"Archiving {len(closed)} work orders", 0.5)
+    # Copied and removed in one commit, so an order is never in both or neither.
+    # The completed collection allocates its own ids; the order's is kept as
+    # its Work Order ID, which the change log refers to.
+    with transaction(f"Archive {len(closed)} closed work orders") as tx:
+        for order in closed:
+            create_completed_work_order({**order, "id": "", "Work Order ID": order["id"]}, tx)
+        tx.remove_by_ids("work order records.json", [order["id"] for order in closed])
+    return len(closed)
+
+def schedule_archival():
+    # Queues the archival at most once every ARCHIVE_INTERVAL_HOURS (0 turns it
+    # off), for orders repaired more than ARCHIVE_AFTER_DAYS ago
+    interval = st.secrets.get("ARCHIVE_INTERVAL_HOURS", 24) * 3600
+    schedule = get_archive_schedule()
+    with schedule["lock"]:
+        if not interval or time.time() - schedule["last_run"] < interval:
+            return
+        schedule["last_run"] = time.time()
+    submission_queue.submit("Archive closed work orders", archive_closed_work_orders, st.secrets.get("ARCHIVE_AFTER_DAYS", 7))
 
 
 checklist_items = {
@@ -273,32 +440,34 @@ checklist_items = {
 
 repair_personnel = ['shehab', 'sameh', 'kaleed', 'yasser', 'masry',"zeinab",'wael']
 
+locations = ['Admin indoor', 'QC lab & Sampling room', 'Processing', 'Receiving area & Reject room',
+             'Technical corridor', 'Packaging', 'Warehouse', 'Utilities & Area Surround',
+             'Outdoor & security gates', 'Electric rooms', 'Waste WTP & Incinerator',
+             'Service Building & Garden Store', 'Pumps & Gas Rooms']
 
-def get_next_event_id():
-    if st.session_state.work_order_df.empty or 'event id' not in st.session_state.work_order_df.columns:
-        return 'Work Order 1'
-
-    event_ids = st.session_state.work_order_df['event id'].dropna().tolist()
-
-    if not event_ids:
-        return 'Work Order 1'
+import_collections = {
+    'Checklist records': "check list.json",
+    'Work orders': "work order records.json",
+    'Completed work orders': "completed work order.json",
+}
 
-    try:
-        last_id = event_ids[-1]
-        if isinstance(last_id, str):
-            last_num = int(last_id.split(' ')[-1])
-        else:
-            last_num = 0
-    except (ValueError, IndexError):
-        last_num = 0
+search_collections = {
+    'Work orders': "work order records.json",
+    'Completed work orders': "completed work order.json",
+    'Checklist records': "check list.json",
+    'Change log': "change log.json",
+}
 
-    next_num = last_num + 1
-    return f'Work Order {next_num}'
 
-page = st.sidebar.radio('Select page', ['Event Logging', 'Work Shop Order', 'View Change Log','Clear data'])
+page = st.sidebar.radio('Select page', ['Event Logging', 'Work Shop Order', 'Dashboard', 'View Change Log', 'Import', 'Clear data', 'Diagnostics'])
+render_started = time.perf_counter()
+render_calls = metrics.calls()
+gb.sync_storage(st.secrets.get("SYNC_SECONDS", 10))
+gb.schedule_archival()
 
 if page == 'Event Logging':
-    work_order = load_check_list()
+    # One tree listing revalidates both collections before the tables query them
+    gb.load_snapshot(["check list.json", "work order records.json"])
     col1, col2 = st.columns([2, 0.5])
     with col1:
         st.markdown("""
@@ -307,24 +476,27 @@ if page == 'Event Logging':
                 </h2>
                 """, unsafe_allow_html=True)
     with col2:
-        st.button("Update page",key='Update 2')
+        if st.button("Update page",key='Update 2'):
+            gb.sync_storage()
         search_keyword = st.session_state.get('search_keyword', '')
         search_keyword = st.text_input("Enter keyword to search:", search_keyword)
         search_button = st.button("Search")
-        search_option = 'All Columns'    
-    def search_in_dataframe(df_Material, keyword, option):
-        if option == 'All Columns':
-            result = df_Material[df_Material.apply(lambda row: row.astype(str).str.contains(keyword, case=False).any(), axis=1)]
-        else:
-            result = df_Material[df_Material[option].astype(str).str.contains(keyword, case=False)]
-        return result
+        search_option = st.selectbox('Search in', list(search_collections))
+        search_file = search_collections[search_option]
+        with st.expander("Filters"):
+            filter_fields = ['Location', 'Element', 'Responsible Person'] if search_file != "change log.json" else ['Event ID', 'Modifier Name']
+            search_filters = {
+                field: st.multiselect(field, gb.search_engine.options(search_file, field), key=f'search_filter_{field}')
+                for field in filter_fields}
+            date_from = st.text_input('From date (YYYY-MM-DD)', key='search_date_from')
+            date_to = st.text_input('To date (YYYY-MM-DD)', key='search_date_to')
     if st.session_state.get('refreshed', False):
         st.session_state.search_keyword = ''
         st.session_state.refreshed = False
-    if search_button and search_keyword:
+    if search_button and (search_keyword or any(search_filters.values()) or date_from or date_to):
         st.session_state.search_keyword = search_keyword
-        search_results = search_in_dataframe(st.session_state.work_order_df, search_keyword, search_option)
-        st.write(f"Search results for '{search_keyword}'in{search_option}:")
+        search_results = schema.frame(search_file, gb.search_engine.search(search_file, search_keyword, search_filters, date_from, date_to))
+        st.write(f"Search results for '{search_keyword}' in {search_option}:")
         st.dataframe(search_results, width=1000, height=200)
     st.session_state.refreshed = True
 
@@ -332,10 +504,6 @@ if page == 'Event Logging':
     col1, col2 = st.columns([2, 6])
     with col1:
         st.markdown(f"<h3 style='color:black; font-size:30px;'>Select Location:</h3>", unsafe_allow_html=True)
-        locations = ['Admin indoor', 'QC lab & Sampling room', 'Processing', 'Receiving area & Reject room',
-                     'Technical corridor', 'Packaging', 'Warehouse', 'Utilities & Area Surround',
-                     'Outdoor & security gates', 'Electric rooms', 'Waste WTP & Incinerator',
-                     'Service Building & Garden Store', 'Pumps & Gas Rooms']
     
         selected_location = st.selectbox('Choose form these areas',locations)
         if selected_location:
@@ -346,8 +514,11 @@ if page == 'Event Logging':
         )
 
     
+    # Inspection mode collects every category and submits them together
+    inspection_mode = st.checkbox('Submit the whole inspection at once', key=f"inspection_mode_{selected_location}")
     col1, col2 = st.columns([3,3])
     with col1:
+        inspection = []
         for category, items in checklist_items.items():
             st.markdown(f"<h3 style='color:green; font-size:30px;'>{category}.</h3>", unsafe_allow_html=True)
             for item in items:
@@ -368,67 +539,31 @@ if page == 'Event Logging':
             else:
                 risk_value = None
                 Quality_value = None
+            answers = {
+                'Element': category,
+                'Rating': Rating,
+                'Detector Name': Event_Detector_Name,
+                'Comment': comment,
+                'Responsible Person': responsible_person,
+                'Safety related': risk_value,
+                'Quality related': Quality_value,
+                'Image': uploaded_file}
             button_key = f"add_{category}_{selected_location}"
-            
-            if st.button(f'Add', key=button_key):
-                    length = len(st.session_state.checklist_df)
-                    if Rating in [0, 'N/A']:
-                        event_id = 'check'
-                        new_check_row = {
-                            'id': event_id,
-                            'location': selected_location,
-                            'Rating': Rating,
-                            'Element': category,
-                            'Event Detector Name': Event_Detector_Name,
-                            'Date': datetime.now(egypt_tz).strftime("%Y-%m-%d %H:%M:%S"),
-                            'comment': comment}
-                        
-                        gb.create_checklist_record(new_check_row)
-                        st.session_state.check_list_df = load_check_list()
-                        st.success(f"Event recorded successfully! '{category}'!")
-                    else:
-                        event_id = 'work_order' + str(length + 1)
-                    image_path = ""
-                    if uploaded_file is not None:
-                        try:
-                            image = Image.open(uploaded_file)
-                            if image.mode == "RGBA":
-                                image = image.convert("RGB")
-                            max_size = (800, 600)
-                            image.thumbnail(max_size)
-                            image_buffer = BytesIO()
-                            image.save(image_buffer, format="JPEG")
-                            image_data = image_buffer.getvalue()
-                            ext=uploaded_file.name.split('.')[-1]
-                            image_name = f"{event_id}.txt"
-                            image_path = gb.save_image(image_data, image_name)
-                            if image_path:
-                                st.success(f"Image saved successfully as {image_name}")
-                            else:
-                                st.error("Failed to save the image")
-                        except Exception as e:
-                            st.error(f"An error occurred while saving the image: {str(e)}")
-                            image_path = ""
-                                
-                    new_order = {
-                        'id': event_id,
-                        'Location': selected_location,
-                        'Element': category,
-                        'Event Detector Name': Event_Detector_Name,
-                        'Date': datetime.now(egypt_tz).strftime("%Y-%m-%d %H:%M:%S"),
-                        'Rating': Rating,
-                        'Comment': comment,
-                        'Responsible Person': responsible_person,
-                        'Expected Repair Date': '',
-                        'Actual Repair Date': '',
-                        'Image': image_path,
-                        'Safety related': 'Yes' if risk_value else 'No',
-                        'Quality related': 'Yes' if Quality_value else 'No'
-                    }
-                    
-                    gb.create_work_order(new_order)
-                    st.session_state.work_order_df = load_work_order()
-                    st.success(f"Event recorded successfully! '{category}'!") 
+
+            if inspection_mode:
+                inspection.append(answers)
+            elif st.button(f'Add', key=button_key):
+                    entry = gb.inspection_entry(selected_location, answers)
+                    ticket = gb.submit_entries(f"{category} ({selected_location})", [entry])
+                    st.session_state.setdefault('submission_tickets', []).append(ticket)
+                    st.success(f"Event accepted! '{category}' is being saved in the background.") 
+
+        if inspection_mode and st.button('Submit inspection', key=f"submit_inspection_{selected_location}"):
+            entries = [gb.inspection_entry(selected_location, answers) for answers in inspection]
+            ticket = gb.submit_entries(f"inspection of {selected_location}", entries)
+            st.session_state.setdefault('submission_tickets', []).append(ticket)
+            orders = sum(order is not None for _, order, _ in entries)
+            st.success(f"Inspection accepted! {len(entries)} categories ({orders} work orders) are being saved in one commit.")
     
     with col2:
         st.markdown("""
@@ -449,43 +584,19 @@ if page == 'Event Logging':
                 </h2>
                 """, unsafe_allow_html=True)
         
-        latest_data = gb.load_data("check list.json")
-        if latest_data and "check" in latest_data:
-            df = pd.DataFrame(latest_data["check"])
-            st.dataframe(df)
-            csv_buffer = io.StringIO()
-            df.to_csv(csv_buffer, index=False)
-            csv_data = csv_buffer.getvalue()
-            # Download button
-            st.download_button(
-                    label="Download Checklist as CSV",
-                    data=csv_data,
-                    file_name='checklist_records.csv',
-                    mime='text/csv',
-                   key='download_checklist')
+        record_table("check list.json", 'checklist_table', ['Location', 'Element', 'Detector Name', 'Rating'])
+        gb.export_downloads("Checklist records", ["check list.json"], 'download_checklist')
         st.markdown("""
             <h2 style='text-align: center; font-size: 30px; color: #A52A2A;'>
                 Facility Maintenance:
             </h2>
             """, unsafe_allow_html=True)
         
-        work_data = gb.load_data("work order records.json")
-        if work_data and "records" in work_data:
-            df = pd.DataFrame(work_data["records"])
-            st.dataframe(df)
-            csv_buffer = io.StringIO()
-            df.to_csv(csv_buffer, index=False)
-            csv_data = csv_buffer.getvalue()
-            # Download button
-            st.download_button(
-                    label="Download Checklist as CSV",
-                    data=csv_data,
-                    file_name='checklist_records.csv',
-                    mime='text/csv',
-                   key='download_work_data')
-
-        else:
-            st.write("No checklist data available.")
+        record_table("work order records.json", 'work_order_table',
+                     ['Location', 'Element', 'Responsible Person', 'Rating'])
+        gb.export_downloads("Work orders", ["work order records.json"], 'download_work_data')
+        # One workbook with a sheet per collection
+        gb.export_downloads("All records", list(storage.COLLECTIONS), 'download_all')
 
 
 if page == 'Work Shop Order':
@@ -500,12 +611,21 @@ if page == 'Work Shop Order':
 
     # الجزء الأول: لاختيار رقم الحدث وإدخال اسم المعدل
     with col1:
-        if not st.session_state.work_order_df.empty:
+        if gb.query_records("work order records.json", limit=0)[0]:
             selected_names = st.multiselect('Select Responsible Person(s)', repair_personnel)
             
-            filtered_events = st.session_state.work_order_df[st.session_state.work_order_df['Responsible Person'].isin(selected_names)]
+            # Only the selected people's orders are read into the DataFrame
+            filtered_events = schema.frame("work order records.json", gb.query_records(
+                "work order records.json", {'Responsible Person': selected_names})[1] if selected_names else [])
 
             if not filtered_events.empty:
+                # Warm the image cache for every event the supervisor may flip to
+                preview_columns = [column for column in ['Thumbnail', 'Image'] if column in filtered_events.columns]
+                if preview_columns:
+                    previews = filtered_events[preview_columns].replace('', pd.NA).bfill(axis=1).iloc[:, 0]
+                    gb.prefetch_images(previews.dropna().tolist())
+                gb.export_downloads("Selected work orders", ["work order records.json"], 'download_selected',
+                                    {'Responsible Person': selected_names})
                 event_ids = filtered_events['id'].tolist()
                 selected_event_id = st.selectbox('Select Event ID', event_ids)
 
@@ -524,38 +644,40 @@ if page == 'Work Shop Order':
 
                     
                     if update_start_button:
-                        if selected_event_id in st.session_state.work_order_df['id'].values:
+                        if selected_event_id in event_ids:
                             updated_data = {
                                 'Expected Repair Date': Expected_repair_Date.strftime("%Y-%m-%d %H:%M:%S")
                             }
-                            gb.update_work_order(selected_event_id, updated_data)
-                            st.success('Expected repair Date Updated successfully')
-                            
                             new_log_entry = {
-                                'event id': selected_event_id,
-                                'modifierName': modifier_name,
-                                'modificationDate': datetime.now(egypt_tz).strftime("%Y-%m-%d %H:%M:%S"),
-                                'modificationType': 'update Expected repair Date',
-                                'newDate': Expected_repair_Date.strftime("%Y-%m-%d %H:%M:%S")
+                                'Event ID': selected_event_id,
+                                'Modifier Name': modifier_name,
+                                'Modification Date': datetime.now(egypt_tz).strftime("%Y-%m-%d %H:%M:%S"),
+                                'Modification Type': 'update Expected repair Date',
+                                'New Date': Expected_repair_Date.strftime("%Y-%m-%d %H:%M:%S")
                             }
-                            gb.create_change_log_entry(new_log_entry)
+                            # The work order and its change-log entry go out as one commit
+                            with gb.transaction(f"Update Expected repair Date of {selected_event_id}") as tx:
+                                gb.update_work_order(selected_event_id, updated_data, tx)
+                                gb.create_change_log_entry(new_log_entry, tx)
+                            st.success('Expected repair Date Updated successfully')
 
                     if update_end_button:
-                        if selected_event_id in st.session_state.work_order_df['id'].values:
+                        if selected_event_id in event_ids:
                             updated_data = {
                                 'Actual Repair Date': Actual_Repair_Date.strftime("%Y-%m-%d %H:%M:%S")
                             }
-                            gb.update_work_order(selected_event_id, updated_data)
-                            st.success('Actual Repair Date Updated successfully')
-                            
                             new_log_entry = {
-                                'event id': selected_event_id,
-                                'modifierName': modifier_name,
-                                'modificationDate': datetime.now(egypt_tz).strftime("%Y-%m-%d %H:%M:%S"),
-                                'modificationType': 'update Actual Repair Date',
-                                'newDate': Actual_Repair_Date.strftime("%Y-%m-%d %H:%M:%S")
+                                'Event ID': selected_event_id,
+                                'Modifier Name': modifier_name,
+                                'Modification Date': datetime.now(egypt_tz).strftime("%Y-%m-%d %H:%M:%S"),
+                                'Modification Type': 'update Actual Repair Date',
+                                'New Date': Actual_Repair_Date.strftime("%Y-%m-%d %H:%M:%S")
                             }
-                            gb.create_change_log_entry(new_log_entry)
+                            # The work order and its change-log entry go out as one commit
+                            with gb.transaction(f"Update Actual Repair Date of {selected_event_id}") as tx:
+                                gb.update_work_order(selected_event_id, updated_data, tx)
+                                gb.create_change_log_entry(new_log_entry, tx)
+                            st.success('Actual Repair Date Updated successfully')
                             
             else:
                 st.warning("No events found for the selected person(s).")
@@ -568,20 +690,27 @@ if page == 'Work Shop Order':
                 
                 # عرض تفاصيل الحدث ك DataFrame
                 st.dataframe(selected_event)
+
+                # The event's own change log entries, from the history index
+                timeline = gb.history_engine.timeline(selected_event['id'].values[0])
+                if timeline:
+                    st.write('Change history:')
+                    st.dataframe(schema.frame("change log.json", timeline))
     
-                # Display the image if it exists
-                image_path = selected_event['image'].iloc[0]
+                # Display the image if it exists, starting with the thumbnail
+                image_path = selected_event.get('Image', pd.Series([''])).fillna('').iloc[0]
+                thumbnail_path = selected_event.get('Thumbnail', pd.Series([''])).fillna('').iloc[0]
                 if image_path:
                     try:
-                        # Get the encoded image content from GitHub 
-                        image_content = gb.repo.get_contents(image_path)
-                        decoded_image_data = base64.b64decode(image_content.decoded_content)
+                        show_full = not thumbnail_path or st.checkbox('Show full-size image', key=f'full_image_{selected_event["id"].values[0]}')
+                        # Get the image content from the storage backend
+                        decoded_image_data = gb.load_image(image_path if show_full else thumbnail_path)
                         
                         # Open the image using PIL
                         image = Image.open(BytesIO(decoded_image_data))
                              
                         # Display the image
-                        st.image(image, caption=f'Image for Event {selected_event["id"].values[0]}', use_column_width=True)
+                        st.image(image, caption=f'Image for Event {selected_event["id"].values[0]}', use_column_width=show_full)
                     
                     except Exception as e:
                         st.warning(f"Error loading image: {str(e)}")
@@ -596,63 +725,180 @@ if page == 'Work Shop Order':
             </h2>
             """, unsafe_allow_html=True)
         
-            completed_data = gb.load_data("completed work order.json")
-            if completed_data and "completed" in completed_data:
-                df = pd.DataFrame(completed_data["completed"])
-                st.dataframe(df)
-                csv_buffer = io.StringIO()
-                df.to_csv(csv_buffer, index=False)
-                csv_data = csv_buffer.getvalue()
-                # Download button
-                st.download_button(
-                        label="Download completed_data as CSV",
-                        data=csv_data,
-                        file_name='completed_data.csv',
-                        mime='text/csv'
-                    )
+            # The archive grows without bound, so it is only read when asked for
+            if st.checkbox('Show completed work orders', key='show_completed'):
+                record_table("completed work order.json", 'completed_table',
+                             ['Location', 'Element', 'Responsible Person', 'Rating'])
+                gb.export_downloads("Completed work orders", ["completed work order.json"], 'download_completed')
+
+
+elif page == 'Dashboard':
+    st.title('Maintenance Dashboard')
+    kpi = gb.kpi_engine.view()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric('Open work orders', kpi['open_total'])
+    col2.metric('Safety related open', kpi['safety_open'])
+    col3.metric('Quality related open', kpi['quality_open'])
+    mttr = kpi['mean_time_to_repair_days']
+    col4.metric('Mean time to repair', 'n/a' if mttr is None else f"{mttr:.1f} days", help=f"Over {kpi['repairs']} repairs")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader('Backlog per location')
+        st.bar_chart(pd.Series(kpi['backlog_by_location'], dtype='int64').sort_values(ascending=False))
+    with col2:
+        st.subheader('Open orders per responsible person')
+        st.bar_chart(pd.Series(kpi['open_by_person'], dtype='int64').sort_values(ascending=False))
 
 
 elif page == 'View Change Log':
     st.title('View Change Log')
-    change_log = load_change_log()
-    st.write(change_log)
-
-    df = pd.DataFrame(change_log)
-    csv_buffer = io.StringIO()
-    df.to_csv(csv_buffer, index=False)
-    csv_data = csv_buffer.getvalue()
-    # Download button
-    st.download_button(
-            label="Download Checklist as CSV",
-            data=csv_data,
-            file_name='checklist_records.csv',
-            mime='text/csv'
-        )
+    event_id = st.text_input('Event ID', key='change_log_event')
+    if event_id:
+        st.dataframe(schema.frame("change log.json", gb.history_engine.timeline(event_id.strip())))
+    else:
+        record_table("change log.json", 'change_log_table', ['Event ID', 'Modifier Name', 'Modification Type'])
+    gb.export_downloads("Change log", ["change log.json"], 'download_change_log')
+
+
+elif page == 'Import':
+    st.title('Import Records')
+    st.write('Rows of a CSV or Excel sheet, with a header row naming the columns of the records '
+             '(Location, Element, Date, Rating, ...). Nothing is saved until the check passes and you import.')
+    target = st.selectbox('Import into', list(import_collections))
+    uploaded_sheet = st.file_uploader('Spreadsheet', type=['csv', 'xlsx'], key='import_file')
+    if uploaded_sheet is not None:
+        file_path = import_collections[target]
+        try:
+            sheet = imports.read_table(uploaded_sheet.name, uploaded_sheet.getvalue())
+            records, report = imports.prepare(file_path, sheet, {
+                'Location': locations, 'Element': list(checklist_items), 'Responsible Person': repair_personnel})
+        except Exception as e:
+            st.warning(f"Error reading the file: {str(e)}")
+        else:
+            # Dry run: what would be imported, and why the other rows would not
+            col1, col2, col3 = st.columns(3)
+            col1.metric('Rows', report['rows'])
+            col2.metric('Ready to import', report['valid'])
+            col3.metric('Rejected', report['rows'] - report['valid'])
+            if report['missing_columns']:
+                st.error(f"Missing columns: {', '.join(report['missing_columns'])}")
+            if report['ignored_columns']:
+                st.info(f"Ignored columns: {', '.join(report['ignored_columns'])}")
+            if not report['errors'].empty:
+                st.write('Problems:')
+                st.dataframe(report['errors'])
+            if records:
+                st.dataframe(schema.frame(file_path, records[:50]))
+                if st.button(f"Import {len(records)} rows into {target}", key='import_confirm'):
+                    try:
+                        count = gb.import_records(file_path, records)
+                        st.success(f'{count} records imported in one commit')
+                    except Exception as e:
+                        st.warning(f"Error importing records: {str(e)}")
 
 
 # Page 4: Clear Data
 elif page == 'Clear data':
     st.title('Clear Data')
 
+    archive = st.checkbox('Archive the current data before clearing', value=True)
+
     if st.button('Clear Checklist Data'):
-        gb.save_data("checklist.json", {"records": []})
-        st.session_state.checklist_df = load_checklist_data()
-        st.success('Checklist data cleared!')
-        # Delete all files in the images folder
+        # The checklist and every image go in a single commit; work orders stay
         try:
-            contents = gb.repo.get_dir_contents("images")
-            for content_file in contents:
-                gb.repo.delete_file(
-                    content_file.path,
-                    "Deleting image file",
-                    content_file.sha
-                )
+            archived = gb.purge_data(["check list.json"], ["images"], archive)
             st.success('Checklist data and all images cleared!')
+            if archived:
+                st.info(f'Previous data archived as {archived}')
+        except Exception as e:
+            st.warning(f"Error clearing data: {str(e)}")
+
+    if st.button('Archive closed work orders now'):
+        # Every order with an Actual Repair Date, however recent
+        try:
+            archived_count = gb.archive_closed_work_orders()
+            st.success(f'{archived_count} closed work orders moved to the completed work orders')
         except Exception as e:
-            st.warning(f"Error clearing images: {str(e)}")
-            st.success('Checklist data cleared, but there was an issue clearing images.')
+            st.warning(f"Error archiving work orders: {str(e)}")
 
     if st.button('Clear Log Data'):
-        gb.save_data("change_log.json", {"logs": []})
-        st.session_state.log_df = load_change_log()
-        st.success('Log data cleared!')
+        try:
+            archived = gb.purge_data(["change log.json"], [], archive)
+            st.success('Log data cleared!')
+            if archived:
+                st.info(f'Previous data archived as {archived}')
+        except Exception as e:
+            st.warning(f"Error clearing data: {str(e)}")
+
+
+elif page == 'Diagnostics':
+    st.title('Diagnostics')
+    snapshot = metrics.snapshot()
+    col1, col2, col3 = st.columns(3)
+    col1.metric('GitHub calls', sum(stats['count'] for name, stats in snapshot['operations'].items() if name.startswith('github.')))
+    if snapshot['rate_limit']:
+        col2.metric('Rate limit remaining', f"{snapshot['rate_limit']['remaining']} / {snapshot['rate_limit']['limit']}")
+        col3.metric('Rate limit resets', datetime.fromtimestamp(snapshot['rate_limit']['reset'], egypt_tz).strftime("%H:%M:%S"))
+    else:
+        col2.metric('Rate limit remaining', 'unknown')
+    st.caption(f"Since {datetime.fromtimestamp(snapshot['since'], egypt_tz).strftime('%Y-%m-%d %H:%M:%S')}")
+
+    st.subheader('Operations')
+    operations = pd.DataFrame.from_dict(snapshot['operations'], orient='index').drop(columns='histogram', errors='ignore')
+    if not operations.empty:
+        st.dataframe(operations.sort_values('total_ms', ascending=False))
+        latency = st.selectbox('Latency histogram of', sorted(snapshot['operations']))
+        st.bar_chart(pd.Series(snapshot['operations'][latency]['histogram']))
+
+    st.subheader('Caches')
+    st.dataframe(pd.DataFrame.from_dict(snapshot['caches'], orient='index'))
+
+    st.subheader('Page renders')
+    st.dataframe(pd.DataFrame.from_dict(snapshot['renders'], orient='index'))
+
+    col1, col2 = st.columns(2)
+    col1.download_button('Download metrics as JSON', metrics.dump(), file_name='metrics.json', mime='application/json')
+    if col2.button('Reset metrics'):
+        metrics.reset()
+
+
+# Progress of this session's background submissions
+tickets = st.session_state.get('submission_tickets', [])
+if tickets:
+    st.sidebar.markdown("### Submissions")
+    for ticket in tickets[-10:]:
+        status = gb.submission_queue.status(ticket)
+        if status is None:
+            continue
+        if status['state'] == 'failed':
+            st.sidebar.error(f"{status['label']}: {status['error']}")
+        elif status['state'] == 'done':
+            # Records still in the outbox show a provisional queued-... id until they reach the remote store
+            names = {file_path: name for name, file_path in search_collections.items()}
+            saved = '; '.join(f"{names.get(file_path, file_path)} {', '.join(ids)}" for file_path, ids in status['result'].items())
+            st.sidebar.success(f"{status['label']}: saved as {saved}")
+        else:
+            st.sidebar.progress(status['progress'], text=f"{status['label']}: {status['step']}")
+    pending = gb.submission_queue.pending(tickets)
+    if pending:
+        st.sidebar.button('Refresh status', key='refresh_submissions')
+
+# Writes journaled locally that have not reached the remote store yet
+if hasattr(gb.backend, 'pending_writes'):
+    queued, sync_error = gb.backend.pending_writes()
+    if queued:
+        st.sidebar.info(f"{queued} change(s) waiting to sync")
+        if sync_error:
+            st.sidebar.warning(f"Sync is retrying: {sync_error}")
+    # Changes the remote store kept rejecting, set aside so the rest could sync
+    dead_letters = gb.backend.dead_letters()
+    if dead_letters:
+        st.sidebar.error(f"{len(dead_letters)} change(s) could not be synced")
+        with st.sidebar.expander("Changes not synced"):
+            for seq, message, error in dead_letters:
+                st.write(f"**{message}**: {error}")
+        if st.sidebar.button('Retry them', key='requeue_dead_letters'):
+            gb.backend.requeue_dead_letters()
+
+metrics.record_render(page, time.perf_counter() - render_started, metrics.calls() - render_calls)
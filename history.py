@@ -0,0 +1,125 @@
+import bisect
+import itertools
+import threading
+from collections import defaultdict
+from instrumentation import metrics
+
+CHANGE_LOG = "change log.json"
+DATE_FIELD = "Modification Date"
+
+
+class ChangeHistory:
+    # The change log indexed by Event ID and by modifier, each list kept in
+    # Modification Date order, plus a sorted date column for ranges. A
+    # timeline is read straight from its list, whatever the size of the log.
+
+    def __init__(self):
+        self.events = defaultdict(list)  # event id -> [(date, seq, entry)]
+        self.modifiers = defaultdict(list)  # modifier name -> [(date, seq, entry)]
+        self.dates = []  # [(date, seq, entry)]
+        self.entries = {}  # entry id -> entry
+        self.sequence = itertools.count()
+
+    def add(self, entry):
+        # seq keeps entries of the same date in the order they were logged
+        item = (str(entry.get(DATE_FIELD) or ""), next(self.sequence), entry)
+        if entry.get("id"):
+            self.entries[str(entry["id"])] = entry
+        if entry.get("Event ID") not in (None, ""):
+            bisect.insort(self.events[str(entry["Event ID"])], item)
+        if entry.get("Modifier Name"):
+            bisect.insort(self.modifiers[str(entry["Modifier Name"])], item)
+        if item[0]:
+            bisect.insort(self.dates, item)
+
+    def rename(self, old, new):
+        # A queued entry or work order got its real id; entries are updated in
+        # place, so every list holding them follows
+        if old in self.entries:
+            self.entries[new] = self.entries.pop(old)
+            self.entries[new]["id"] = new
+        items = self.events.pop(old, [])
+        for _, _, entry in items:
+            entry["Event ID"] = new
+        if items:
+            self.events[new] = sorted(self.events.get(new, []) + items)
+
+    def timeline(self, event_id):
+        return [entry for _, _, entry in self.events.get(str(event_id), [])]
+
+    def by_modifier(self, name, limit=None):
+        # Most recent first
+        items = self.modifiers.get(str(name), [])
+        return [entry for _, _, entry in reversed(items[-limit:] if limit else items)]
+
+    def between(self, date_from=None, date_to=None):
+        # date_to is inclusive: "2026-10-18" covers the whole day
+        low = bisect.bisect_left(self.dates, (str(date_from or ""),))
+        high = bisect.bisect_right(self.dates, (str(date_to or "\uffff") + "\uffff",))
+        return [entry for _, _, entry in self.dates[low:high]]
+
+
+class HistoryEngine:
+    # One ChangeHistory for the whole process, built from the change log on
+    # first use and extended from the backend's write notifications as
+    # entries are logged. Rebuilt when the log changed another way (an entry
+    # edited, the log cleared, another process writing).
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.history = None
+        self.version = None
+        self.lock = threading.Lock()
+        backend.subscribe(self._on_write)
+
+    def timeline(self, event_id):
+        history = self._history()
+        with self.lock:
+            return history.timeline(event_id)
+
+    def by_modifier(self, name, limit=None):
+        history = self._history()
+        with self.lock:
+            return history.by_modifier(name, limit)
+
+    def between(self, date_from=None, date_to=None):
+        history = self._history()
+        with self.lock:
+            return history.between(date_from, date_to)
+
+    def _history(self):
+        version = self.backend.version(CHANGE_LOG)
+        with self.lock:
+            if self.history is not None and self.version == version:
+                metrics.hit("change history")
+                return self.history
+        metrics.miss("change history")
+        history = ChangeHistory()
+        for entry in self.backend.iter_records(CHANGE_LOG):
+            history.add(entry)
+        with self.lock:
+            self.history = history
+            self.version = version
+        return history
+
+    def _on_write(self, kind, file_path, record):
+        # A renamed work order may be referred to by entries, so renames of
+        # any collection apply
+        if file_path != CHANGE_LOG and kind != "rename":
+            return
+        with self.lock:
+            if self.history is None:
+                return
+            if kind == "rename":
+                self.history.rename(*record)
+            elif kind == "append":
+                self.history.add(record)
+            else:
+                self.history = None
+                return
+        if file_path != CHANGE_LOG:
+            return
+        version = self.backend.version(CHANGE_LOG)
+        with self.lock:
+            if self.history is not None:
+                self.version = version
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image
+from instrumentation import metrics
+
+# Variants generated at upload; the work order records the path of each
+DISPLAY_SIZE = (800, 600)
+THUMBNAIL_SIZE = (200, 150)
+VARIANTS = {"display": DISPLAY_SIZE, "thumbs": THUMBNAIL_SIZE}
+
+
+def to_jpeg(image, max_size, quality=85):
+    image = image.copy()
+    image.thumbnail(max_size)
+    image_buffer = BytesIO()
+    image.save(image_buffer, format="JPEG", quality=quality)
+    return image_buffer.getvalue()
+
+
+def make_variants(uploaded_file):
+    # variant -> raw JPEG bytes
+    image = Image.open(uploaded_file)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return {variant: to_jpeg(image, size) for variant, size in VARIANTS.items()}
+
+
+def content_path(variant, image_data):
+    # Content-addressed: identical images share one file
+    return f"images/{variant}/{hashlib.sha256(image_data).hexdigest()}.jpg"
+
+
+def is_legacy(image_path):
+    # Images stored before the binary store were base64 text in images/<name>.txt
+    return image_path.endswith(".txt")
+
+
+def is_immutable(image_path):
+    # Content-addressed paths never change, so they need no version check
+    return image_path.startswith(("images/display/", "images/thumbs/"))
+
+
+class ImageCache:
+    # Two-level LRU of image bytes keyed by path and blob SHA: a small memory
+    # tier in front of a larger disk tier, each evicting least recently used
+    # entries once its byte budget is exceeded. Files in the disk tier survive
+    # restarts.
+
+    def __init__(self, directory, max_disk_bytes=200 * 2 ** 20, max_memory_bytes=32 * 2 ** 20):
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self.memory = OrderedDict()  # key -> bytes
+        self.memory_bytes = 0
+        self.disk = OrderedDict()  # key -> size
+        self.disk_bytes = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="image-prefetch")
+        os.makedirs(directory, exist_ok=True)
+        entries = [entry for entry in os.scandir(directory) if entry.is_file() and not entry.name.endswith(".tmp")]
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            self.disk[entry.name] = entry.stat().st_size
+            self.disk_bytes += entry.stat().st_size
+
+    def get(self, image_path, version, fetch):
+        key = hashlib.sha256(f"{image_path}@{version}".encode()).hexdigest()
+        with self.lock:
+            if key in self.memory:
+                metrics.hit("image memory")
+                self.memory.move_to_end(key)
+                return self.memory[key]
+            metrics.miss("image memory")
+            on_disk = key in self.disk
+            if on_disk:
+                self.disk.move_to_end(key)
+        if on_disk:
+            try:
+                with open(os.path.join(self.directory, key), "rb") as f:
+                    image_data = f.read()
+                os.utime(os.path.join(self.directory, key))
+            except OSError:
+                image_data = None
+            if image_data is not None:
+                metrics.hit("image disk")
+                self._remember(key, image_data)
+                return image_data
+        metrics.miss("image disk")
+        image_data = fetch(image_path)
+        self._store(key, image_data)
+        self._remember(key, image_data)
+        return image_data
+
+    def contains(self, image_path, version):
+        key = hashlib.sha256(f"{image_path}@{version}".encode()).hexdigest()
+        with self.lock:
+            return key in self.memory or key in self.disk
+
+    def prefetch(self, requests, fetch):
+        # requests: (path, version) pairs; misses are fetched in the background
+        for image_path, version in requests:
+            if not self.contains(image_path, version):
+                self.executor.submit(self.get, image_path, version, fetch)
+
+    def _remember(self, key, image_data):
+        with self.lock:
+            if key not in self.memory:
+                self.memory[key] = image_data
+                self.memory_bytes += len(image_data)
+            while self.memory_bytes > self.max_memory_bytes and len(self.memory) > 1:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_bytes -= len(evicted)
+
+    def _store(self, key, image_data):
+        path = os.path.join(self.directory, key)
+        # Write then rename so a reader never sees a partial file
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(image_data)
+        os.replace(temp_path, path)
+        evicted = []
+        with self.lock:
+            if key not in self.disk:
+                self.disk[key] = len(image_data)
+                self.disk_bytes += len(image_data)
+            while self.disk_bytes > self.max_disk_bytes and len(self.disk) > 1:
+                old_key, size = self.disk.popitem(last=False)
+                self.disk_bytes -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(os.path.join(self.directory, old_key))
+            except OSError:
+                pass
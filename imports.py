@@ -0,0 +1,84 @@
+import io
+import pandas as pd
+import schema
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Collections a spreadsheet can be imported into -> columns every row needs
+REQUIRED = {
+    "check list.json": ['Location', 'Element', 'Date', 'Rating'],
+    "work order records.json": ['Location', 'Element', 'Date', 'Rating'],
+    "completed work order.json": ['Location', 'Element', 'Date', 'Rating', 'Actual Repair Date'],
+}
+RATINGS = {0, 1, 2, 3}
+FLAG_VALUES = {'yes': 'Yes', 'y': 'Yes', 'true': 'Yes', '1': 'Yes',
+               'no': 'No', 'n': 'No', 'false': 'No', '0': 'No', '': ''}
+
+
+def read_table(name, data):
+    # Every cell is read as text; the columns are typed by prepare()
+    if name.lower().endswith((".xlsx", ".xlsm")):
+        return pd.read_excel(io.BytesIO(data), dtype=str, keep_default_na=False, engine="openpyxl").fillna("")
+    return pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False)
+
+
+def column_key(name):
+    return "".join(str(name).lower().replace("_", " ").split())
+
+
+def prepare(file_path, df, allowed=None):
+    # Maps, validates and normalizes a whole sheet at once. allowed maps a
+    # field to the values it may take. Returns (records ready to store,
+    # report); ids are left to the collection's allocator.
+    columns = {column_key(column): column for column in schema.COLUMNS[file_path] if column != 'id'}
+    mapping = {}
+    for source in df.columns:
+        # The first header naming a column wins, any other is ignored
+        if column_key(source) in columns and columns[column_key(source)] not in mapping.values():
+            mapping[source] = columns[column_key(source)]
+    report = {
+        "rows": len(df),
+        "ignored_columns": [str(source) for source in df.columns if source not in mapping],
+        "missing_columns": [column for column in REQUIRED[file_path] if column not in mapping.values()],
+        "errors": pd.DataFrame(columns=['Row', 'Column', 'Problem']),
+        "valid": 0,
+    }
+    if report["missing_columns"]:
+        return [], report
+
+    df = df[list(mapping)].rename(columns=mapping).astype(str).apply(lambda column: column.str.strip())
+    problems = []
+
+    def flag(mask, column, problem):
+        # Row numbers as the spreadsheet shows them, below the header
+        problems.append(pd.DataFrame({'Row': df.index[mask.to_numpy(dtype=bool)] + 2, 'Column': column, 'Problem': problem}))
+
+    for column in REQUIRED[file_path]:
+        flag(df[column] == "", column, "missing")
+    for column in df.columns:
+        if schema.DTYPES.get(column) == schema.DATETIME:
+            dates = pd.to_datetime(df[column], errors="coerce", format="ISO8601")
+            flag((df[column] != "") & dates.isna(), column, "not a YYYY-MM-DD date")
+            df[column] = dates.dt.strftime(DATE_FORMAT).fillna("")
+        elif schema.DTYPES.get(column) == schema.BOOLEAN:
+            flags = df[column].str.lower().map(FLAG_VALUES)
+            flag(flags.isna(), column, "not Yes or No")
+            df[column] = flags.fillna("")
+    # Ratings are stored as numbers, or 'N/A'
+    numbers = pd.to_numeric(df['Rating'], errors="coerce")
+    not_applicable = df['Rating'].str.upper() == 'N/A'
+    flag((df['Rating'] != "") & ~not_applicable & ~numbers.isin(RATINGS), 'Rating', "not 0-3 or N/A")
+    ratings = numbers.where(numbers.isin(RATINGS)).astype("Int64").astype(object)
+    ratings = ratings.where(ratings.notna(), 'N/A')
+    for column, values in (allowed or {}).items():
+        if column in df.columns:
+            flag((df[column] != "") & ~df[column].isin(list(values)), column, "unknown value")
+
+    errors = pd.concat(problems, ignore_index=True).sort_values(['Row', 'Column'], ignore_index=True)
+    valid = ~df.index.isin(errors['Row'] - 2)
+    df = df.assign(Rating=ratings)[valid]
+    # Every schema column is present, so imported records look like created ones
+    missing = [column for column in columns.values() if column not in df.columns]
+    df = df.assign(**{column: "" for column in missing})[list(columns.values())]
+    report["errors"] = errors
+    report["valid"] = len(df)
+    return [{"id": "", **record} for record in df.to_dict("records")], report
@@ -0,0 +1,192 @@
+import functools
+import json
+import logging
+import threading
+import time
+
+# Upper bounds (milliseconds) of the latency histogram buckets; the last
+# bucket holds everything slower
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+# Repository methods that upload a file body -> position of the body argument
+UPLOADS = {"create_file": 2, "update_file": 2, "create_git_blob": 0}
+
+
+def percentile(histogram, fraction):
+    # Upper bound of the bucket holding the given fraction of the calls
+    total = sum(histogram)
+    if not total:
+        return 0
+    seen = 0
+    for bound, count in zip(BUCKETS_MS + (float("inf"),), histogram):
+        seen += count
+        if seen >= fraction * total:
+            return bound
+    return float("inf")
+
+
+def payload_size(value):
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode())
+    return 0
+
+
+class Metrics:
+    # Process-wide counters: per operation call counts, errors, bytes and a
+    # latency histogram; hits and misses per cache; GitHub calls per page
+    # render; and the remaining GitHub rate-limit budget.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rate_limit_source = None
+        self.logger = None
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.operations = {}  # name -> stats
+            self.caches = {}  # name -> [hits, misses]
+            self.renders = {}  # page -> stats
+
+    def record(self, name, seconds, size=0, error=False):
+        bucket = next((i for i, bound in enumerate(BUCKETS_MS) if seconds * 1000 <= bound), len(BUCKETS_MS))
+        with self.lock:
+            stats = self.operations.setdefault(name, {
+                "count": 0, "errors": 0, "bytes": 0, "seconds": 0.0, "histogram": [0] * (len(BUCKETS_MS) + 1)})
+            stats["count"] += 1
+            stats["errors"] += error
+            stats["bytes"] += size
+            stats["seconds"] += seconds
+            stats["histogram"][bucket] += 1
+
+    def timed(self, name, size=None):
+        # Decorator; size(result, args) gives the bytes the call moved
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    result = function(*args, **kwargs)
+                except Exception:
+                    self.record(name, time.perf_counter() - start, error=True)
+                    raise
+                self.record(name, time.perf_counter() - start, size(result, args) if size else 0)
+                return result
+            return wrapper
+        return decorate
+
+    def hit(self, cache):
+        with self.lock:
+            self.caches.setdefault(cache, [0, 0])[0] += 1
+
+    def miss(self, cache):
+        with self.lock:
+            self.caches.setdefault(cache, [0, 0])[1] += 1
+
+    def calls(self, prefix="github."):
+        with self.lock:
+            return sum(stats["count"] for name, stats in self.operations.items() if name.startswith(prefix))
+
+    def record_render(self, page, seconds, github_calls):
+        # Calls made by background threads during the render are counted too
+        with self.lock:
+            stats = self.renders.setdefault(page, {"count": 0, "seconds": 0.0, "github_calls": 0, "max_github_calls": 0})
+            stats["count"] += 1
+            stats["seconds"] += seconds
+            stats["github_calls"] += github_calls
+            stats["max_github_calls"] = max(stats["max_github_calls"], github_calls)
+
+    def watch_rate_limit(self, github_client):
+        # Read from the headers of the last response, so checking costs no call
+        requester = getattr(github_client, "requester", None)
+        if requester is not None:
+            self.rate_limit_source = lambda: (*requester.rate_limiting, requester.rate_limiting_resettime)
+
+    def snapshot(self):
+        rate_limit = None
+        if self.rate_limit_source is not None:
+            remaining, limit, reset = self.rate_limit_source()
+            if limit >= 0:
+                rate_limit = {"remaining": remaining, "limit": limit, "reset": reset}
+        with self.lock:
+            return {
+                "since": self.started,
+                "uptime_seconds": round(time.time() - self.started, 1),
+                "operations": {
+                    name: {
+                        "count": stats["count"],
+                        "errors": stats["errors"],
+                        "bytes": stats["bytes"],
+                        "total_ms": round(stats["seconds"] * 1000, 1),
+                        "avg_ms": round(stats["seconds"] * 1000 / stats["count"], 2),
+                        "p50_ms": percentile(stats["histogram"], 0.5),
+                        "p95_ms": percentile(stats["histogram"], 0.95),
+                        "histogram": dict(zip([f"<={bound}ms" for bound in BUCKETS_MS] + ["slower"], stats["histogram"])),
+                    }
+                    for name, stats in self.operations.items()},
+                "caches": {
+                    name: {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None}
+                    for name, (hits, misses) in self.caches.items()},
+                "renders": {
+                    page: {
+                        "count": stats["count"],
+                        "avg_ms": round(stats["seconds"] * 1000 / stats["count"], 1),
+                        "avg_github_calls": round(stats["github_calls"] / stats["count"], 1),
+                        "max_github_calls": stats["max_github_calls"],
+                    }
+                    for page, stats in self.renders.items()},
+                "rate_limit": rate_limit,
+            }
+
+    def dump(self):
+        return json.dumps(self.snapshot(), indent=2, default=str)
+
+    def start_logging(self, interval):
+        # Writes the snapshot to the log as one JSON line every interval seconds
+        if self.logger is not None or not interval:
+            return
+
+        def log_forever():
+            while True:
+                time.sleep(interval)
+                logging.info("metrics %s", json.dumps(self.snapshot(), default=str))
+
+        self.logger = threading.Thread(target=log_forever, name="metrics-log", daemon=True)
+        self.logger.start()
+
+
+class InstrumentedRepo:
+    # Proxy of a PyGithub Repository recording every API method call as
+    # "github.<method>", with the bytes uploaded and downloaded
+
+    def __init__(self, repo, metrics, prefix="github"):
+        self._repo = repo
+        self._metrics = metrics
+        self._prefix = prefix
+
+    def __getattr__(self, name):
+        attribute = getattr(self._repo, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = attribute(*args, **kwargs)
+            except Exception:
+                self._metrics.record(f"{self._prefix}.{name}", time.perf_counter() - start, error=True)
+                raise
+            size = payload_size(getattr(result, "content", None))
+            if name in UPLOADS and len(args) > UPLOADS[name]:
+                size += payload_size(args[UPLOADS[name]])
+            self._metrics.record(f"{self._prefix}.{name}", time.perf_counter() - start, size)
+            if name == "get_git_ref":
+                # ref.edit() moves the branch: one more call per commit
+                return InstrumentedRepo(result, self._metrics, f"{self._prefix}.ref")
+            return result
+        return call
+
+
+metrics = Metrics()
@@ -0,0 +1,138 @@
+import itertools
+import threading
+from collections import Counter
+from datetime import datetime
+from instrumentation import metrics
+
+WORK_ORDERS = "work order records.json"
+COMPLETED = "completed work order.json"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(str(value)[:19], DATE_FORMAT)
+    except ValueError:
+        return None
+
+
+def contribution(file_path, record):
+    # What one work order adds to the aggregates: (location, responsible
+    # person, open, safety related, quality related, repair seconds or None)
+    repaired = parse_date(record.get("Actual Repair Date") or "")
+    reported = parse_date(record.get("Date") or "")
+    # Repair dates carry no time of day, so a repair on the day of the report
+    # counts as zero rather than the hours before the report
+    repair_seconds = max(0.0, (repaired - reported).total_seconds()) if repaired and reported else None
+    return (
+        record.get("Location") or "",
+        record.get("Responsible Person") or "",
+        file_path == WORK_ORDERS and not record.get("Actual Repair Date"),
+        record.get("Safety related") in ("Yes", True),
+        record.get("Quality related") in ("Yes", True),
+        repair_seconds,
+    )
+
+
+class KpiSummary:
+    # Running totals over the work orders. Each record's contribution is
+    # remembered so an update replaces it instead of rescanning anything;
+    # reading the KPIs only touches the per-location and per-person counters.
+
+    def __init__(self):
+        self.contributions = {}  # (file_path, id) -> contribution
+        self.backlog = Counter()  # location -> open orders
+        self.open_by_person = Counter()
+        self.open_total = 0
+        self.safety_open = 0
+        self.quality_open = 0
+        self.repair_seconds = 0.0
+        self.repairs = 0
+        self.anonymous = itertools.count()
+
+    def apply(self, file_path, record):
+        # Records queued without an id yet are counted as new
+        key = (file_path, str(record["id"]) if record.get("id") else f"queued-{next(self.anonymous)}")
+        if key in self.contributions:
+            self._add(self.contributions[key], -1)
+        self.contributions[key] = contribution(file_path, record)
+        self._add(self.contributions[key], 1)
+
+    def rename(self, file_path, old, new):
+        if (file_path, old) in self.contributions:
+            self.contributions[file_path, new] = self.contributions.pop((file_path, old))
+
+    def view(self):
+        return {
+            "open_total": self.open_total,
+            "backlog_by_location": {location: count for location, count in self.backlog.items() if count},
+            "open_by_person": {person: count for person, count in self.open_by_person.items() if count},
+            "safety_open": self.safety_open,
+            "quality_open": self.quality_open,
+            "mean_time_to_repair_days": self.repair_seconds / self.repairs / 86400 if self.repairs else None,
+            "repairs": self.repairs,
+        }
+
+    def _add(self, item, sign):
+        location, person, is_open, safety, quality, repair_seconds = item
+        if is_open:
+            self.backlog[location] += sign
+            self.open_by_person[person] += sign
+            self.open_total += sign
+            self.safety_open += sign * safety
+            self.quality_open += sign * quality
+        if repair_seconds is not None:
+            self.repair_seconds += sign * repair_seconds
+            self.repairs += sign
+
+
+class KpiEngine:
+    # Materialized KPIs for the whole process. Built from the work order
+    # collections on first use, then kept current from the backend's write
+    # notifications, so create_work_order, update_work_order and
+    # create_completed_work_order each cost one incremental update. Rebuilt
+    # only when a collection changed behind our back (another process).
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.summary = None
+        self.versions = None
+        self.lock = threading.Lock()
+        backend.subscribe(self._on_write)
+
+    def view(self):
+        versions = self._versions()
+        with self.lock:
+            if self.summary is not None and self.versions == versions:
+                metrics.hit("kpi summary")
+                return self.summary.view()
+        metrics.miss("kpi summary")
+        summary = KpiSummary()
+        for file_path in (WORK_ORDERS, COMPLETED):
+            for record in self.backend.iter_records(file_path):
+                summary.apply(file_path, record)
+        with self.lock:
+            self.summary = summary
+            self.versions = versions
+            return summary.view()
+
+    def _versions(self):
+        return tuple(self.backend.version(file_path) for file_path in (WORK_ORDERS, COMPLETED))
+
+    def _on_write(self, kind, file_path, record):
+        if file_path not in (WORK_ORDERS, COMPLETED):
+            return
+        with self.lock:
+            if self.summary is None:
+                return
+            if kind == "save":
+                self.summary = None
+                return
+            if kind == "rename":
+                self.summary.rename(file_path, *record)
+            else:
+                self.summary.apply(file_path, record)
+        versions = self._versions()
+        with self.lock:
+            if self.summary is not None:
+                self.versions = versions
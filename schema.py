@@ -0,0 +1,63 @@
+import pandas as pd
+
+CATEGORY = "category"
+DATETIME = "datetime64[ns]"
+BOOLEAN = "boolean"
+
+# file path -> columns of the collection's DataFrame, in display order
+COLUMNS = {
+    "check list.json": [
+        'id', 'Location', 'Element', 'Detector Name', 'Date', 'Rating', 'Comment'],
+    "work order records.json": [
+        'id', 'Location', 'Element', 'Detector Name', 'Date', 'Rating', 'Responsible Person',
+        'Expected Repair Date', 'Actual Repair Date', 'Image', 'Thumbnail', 'Comment',
+        'Safety related', 'Quality related'],
+    "completed work order.json": [
+        'id', 'Work Order ID', 'Location', 'Element', 'Detector Name', 'Date', 'Rating', 'Responsible Person',
+        'Expected Repair Date', 'Actual Repair Date', 'Image', 'Thumbnail', 'Comment',
+        'Safety related', 'Quality related'],
+    "change log.json": [
+        'id', 'Event ID', 'Modifier Name', 'Modification Date', 'Modification Type', 'New Date'],
+}
+
+# Columns not listed keep whatever dtype pandas infers
+DTYPES = {
+    'Location': CATEGORY,
+    'Element': CATEGORY,
+    'Detector Name': CATEGORY,
+    'Responsible Person': CATEGORY,
+    'Rating': CATEGORY,
+    'Modifier Name': CATEGORY,
+    'Modification Type': CATEGORY,
+    'Date': DATETIME,
+    'Expected Repair Date': DATETIME,
+    'Actual Repair Date': DATETIME,
+    'Modification Date': DATETIME,
+    'New Date': DATETIME,
+    'Safety related': BOOLEAN,
+    'Quality related': BOOLEAN,
+}
+
+# Stored flag values; anything else loads as missing
+FLAGS = {'Yes': True, 'No': False, True: True, False: False}
+
+
+def convert(series, dtype):
+    if dtype == DATETIME:
+        return pd.to_datetime(series, errors='coerce')
+    if dtype == BOOLEAN:
+        return series.map(FLAGS).astype(BOOLEAN)
+    # Ratings mix numbers and 'N/A', so categories are kept as text
+    return series.where(series.isna(), series.astype(str)).astype(CATEGORY)
+
+
+def frame(file_path, records):
+    # Typed DataFrame of a collection's records: every schema column is
+    # present (missing ones empty), extra fields are kept after them
+    df = pd.DataFrame.from_records(records)
+    columns = COLUMNS[file_path]
+    df = df.reindex(columns=columns + [column for column in df.columns if column not in columns])
+    for column in df.columns:
+        if column in DTYPES:
+            df[column] = convert(df[column], DTYPES[column])
+    return df
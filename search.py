@@ -0,0 +1,193 @@
+import bisect
+import re
+import threading
+from collections import defaultdict
+from instrumentation import metrics
+from storage import DATE_FIELDS
+
+TOKEN = re.compile(r"[0-9a-z]+")
+
+
+def tokenize(value):
+    return TOKEN.findall(str(value).lower())
+
+
+def record_tokens(record):
+    # One regex pass over the concatenated field values
+    return set(tokenize(" ".join(map(str, record.values()))))
+
+
+class SearchIndex:
+    # Inverted index over one collection: token -> record positions, plus
+    # postings per (field, value) for the filters and a sorted date column for
+    # range queries. Records are added or replaced one at a time.
+
+    def __init__(self, date_field="Date"):
+        self.date_field = date_field
+        self.records = []
+        self.positions = {}  # id -> position
+        self.tokens = defaultdict(set)
+        self.sorted_tokens = None  # built lazily for prefix matching
+        self.values = defaultdict(lambda: defaultdict(set))  # field -> value -> positions
+        self.dates = []  # sorted (date, position)
+
+    def build(self, records):
+        # Bulk load: the date column is sorted once at the end
+        dates = self.dates
+        self.dates = None
+        for record in records:
+            self.add(record)
+        self.dates = dates
+        self.dates.extend(
+            (str(record.get(self.date_field)), position)
+            for position, record in enumerate(self.records) if record.get(self.date_field))
+        self.dates.sort()
+
+    def add(self, record):
+        position = len(self.records)
+        self.records.append(record)
+        self.positions.setdefault(str(record.get("id")), position)
+        self._index(record, position)
+
+    def update(self, record):
+        position = self.positions.get(str(record.get("id")))
+        if position is None:
+            self.add(record)
+            return
+        self._remove(position)
+        self.records[position] = record
+        self._index(record, position)
+
+    def rename(self, old, new):
+        # A queued record got its real id: it and the records referring to it
+        # (an Event ID) are reindexed with the new value
+        affected = set().union(*(postings.get(old, set()) for postings in self.values.values()))
+        for position in sorted(affected):
+            self._remove(position)
+            self.records[position] = {field: new if str(value) == old else value
+                                      for field, value in self.records[position].items()}
+            self._index(self.records[position], position)
+        if old in self.positions:
+            self.positions[new] = self.positions.pop(old)
+
+    def search(self, keyword="", filters=None, date_from=None, date_to=None, limit=None):
+        # Every keyword word must match the start of a token of the record
+        # (the last one may be partial); filters map a field to accepted values
+        candidates = []
+        for word in tokenize(keyword):
+            candidates.append(self._prefix(word))
+        for field, accepted in (filters or {}).items():
+            if accepted:
+                postings = self.values.get(field, {})
+                candidates.append(set().union(*(postings.get(str(value), set()) for value in accepted)))
+        if date_from or date_to:
+            low = bisect.bisect_left(self.dates, (str(date_from or ""),))
+            # date_to is inclusive: "2026-10-18" covers the whole day
+            high = bisect.bisect_right(self.dates, (str(date_to or "\uffff") + "\uffff",))
+            candidates.append({position for _, position in self.dates[low:high]})
+        if candidates:
+            candidates.sort(key=len)
+            positions = set(candidates[0]).intersection(*candidates[1:])
+        else:
+            positions = range(len(self.records))
+        positions = sorted(positions)
+        if limit is not None:
+            positions = positions[:limit]
+        return [self.records[position] for position in positions]
+
+    def options(self, field):
+        return sorted(value for value, positions in self.values.get(field, {}).items() if positions and value)
+
+    def _prefix(self, word):
+        if self.sorted_tokens is None:
+            self.sorted_tokens = sorted(self.tokens)
+        matches = set()
+        start = bisect.bisect_left(self.sorted_tokens, word)
+        for token in self.sorted_tokens[start:]:
+            if not token.startswith(word):
+                break
+            matches |= self.tokens[token]
+        return matches
+
+    def _index(self, record, position):
+        tokens = self.tokens
+        for token in record_tokens(record):
+            if token not in tokens:
+                self.sorted_tokens = None
+            tokens[token].add(position)
+        for field, value in record.items():
+            self.values[field][str(value)].add(position)
+        date = str(record.get(self.date_field) or "")
+        if date and self.dates is not None:
+            bisect.insort(self.dates, (date, position))
+
+    def _remove(self, position):
+        record = self.records[position]
+        for token in record_tokens(record):
+            self.tokens[token].discard(position)
+        for field, value in record.items():
+            self.values[field][str(value)].discard(position)
+        date = str(record.get(self.date_field) or "")
+        if date:
+            index = bisect.bisect_left(self.dates, (date, position))
+            if index < len(self.dates) and self.dates[index] == (date, position):
+                del self.dates[index]
+
+
+class SearchEngine:
+    # One index per collection for the whole process. An index is built from
+    # the backend on first use, kept current from the backend's write
+    # notifications and rebuilt when the collection changed behind our back
+    # (another process wrote to it).
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.indexes = {}  # file_path -> (index, version)
+        self.lock = threading.Lock()
+        backend.subscribe(self._on_write)
+
+    def index(self, file_path):
+        version = self.backend.version(file_path)
+        with self.lock:
+            entry = self.indexes.get(file_path)
+            if entry is not None and entry[1] == version:
+                metrics.hit("search index")
+                return entry[0]
+        metrics.miss("search index")
+        index = SearchIndex(DATE_FIELDS.get(file_path, "Date"))
+        index.build(self.backend.iter_records(file_path))
+        with self.lock:
+            self.indexes[file_path] = (index, version)
+        return index
+
+    def search(self, file_path, keyword="", filters=None, date_from=None, date_to=None, limit=None):
+        index = self.index(file_path)
+        with self.lock:
+            return index.search(keyword, filters, date_from, date_to, limit)
+
+    def options(self, file_path, field):
+        index = self.index(file_path)
+        with self.lock:
+            return index.options(field)
+
+    def _on_write(self, kind, file_path, record):
+        if kind == "rename":
+            # References to the record may sit in any collection
+            with self.lock:
+                for index, _ in self.indexes.values():
+                    index.rename(*record)
+        with self.lock:
+            entry = self.indexes.get(file_path)
+            if entry is None:
+                return
+            if kind == "save":
+                del self.indexes[file_path]
+                return
+            if kind == "append":
+                entry[0].add(record)
+            elif kind != "rename":
+                entry[0].update(record)
+        version = self.backend.version(file_path)
+        with self.lock:
+            if file_path in self.indexes:
+                self.indexes[file_path] = (self.indexes[file_path][0], version)
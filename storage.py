@@ -0,0 +1,2135 @@
+import base64
+from collections import deque
+import copy
+import gzip
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from github import Github, GithubException, InputGitTreeElement, RateLimitExceededException
+from instrumentation import InstrumentedRepo, metrics
+
+# Compare-and-swap writes that lose a race are retried for up to this many
+# seconds, the pause between tries doubling from RETRY_DELAY to RETRY_MAX_DELAY
+WRITE_BUDGET = 30
+RETRY_DELAY = 0.05
+RETRY_MAX_DELAY = 2
+# stale blob SHA on update_file, file created meanwhile on create_file,
+# ref moved on a non-forced ref update. GitHub answers 422 to invalid
+# requests too, so a 422 is a conflict only when its message says one of these.
+CONFLICT_STATUSES = (409, 422)
+CONFLICT_MESSAGES = ("fast forward", "does not match", "sha")
+# Outbox flushing: transactions per remote commit, backoff bounds (seconds),
+# how often an idle flusher looks for work, when a claim is considered abandoned
+OUTBOX_BATCH = 20
+OUTBOX_MIN_DELAY = 1
+OUTBOX_MAX_DELAY = 300
+OUTBOX_IDLE_CHECK = 30
+OUTBOX_CLAIM_TIMEOUT = 600
+# A transaction the remote keeps rejecting is set aside after this many tries
+OUTBOX_MAX_ATTEMPTS = 5
+# GitHub rejecting the request itself, which sending it again cannot fix
+REJECTED_STATUSES = (400, 413, 422)
+# A batch whose send failed is looked for in at most this many commits made
+# since it was sent (less OUTBOX_CLOCK_SKEW seconds) before it is sent again
+OUTBOX_REPLAY_DEPTH = 100
+OUTBOX_CLOCK_SKEW = 300
+# How long (seconds) the real id of a flushed queued record is remembered
+OUTBOX_ID_TTL = 86400
+
+# file path -> key of the record list inside the document
+COLLECTIONS = {
+    "check list.json": "check",
+    "change log.json": "logs",
+    "work order records.json": "records",
+    "completed work order.json": "completed",
+}
+# Field the date range of a query applies to
+DATE_FIELDS = {
+    "check list.json": "Date",
+    "work order records.json": "Date",
+    "completed work order.json": "Date",
+    "change log.json": "Modification Date",
+}
+# Compact collection files: gzip of minified JSON starting with this header
+COMPACT_FORMAT = "facility-table"
+COMPACT_VERSION = 1
+GZIP_MAGIC = b"\x1f\x8b"
+# Hunk header of a unified diff: @@ -old_start,old_count +new_start,new_count @@
+HUNK = re.compile(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+# Provisional id of a record still in the outbox: queued-<outbox seq>-<number>
+PROVISIONAL = re.compile(r'"(queued-(\d+)-\d+)"')
+# What SQLite treats as a number when sorting (see sort_key)
+NUMERIC = re.compile(r"[0-9][0-9.]*")
+
+
+def default_data(file_path):
+    return {COLLECTIONS[file_path]: []}
+
+
+def first_free_id(ids):
+    # Allocator start for collections written before ids were allocated here
+    ids = list(ids)
+    numeric = [int(record_id) for record_id in ids if str(record_id).isdigit()]
+    return max(numeric + [len(ids)]) + 1
+
+
+def allocate_id(meta):
+    # Monotonic, never hands out an id that is already indexed (documents
+    # carry an index, sharded manifests start next_id past every stored id)
+    while str(meta["next_id"]) in meta.get("index", ()):
+        meta["next_id"] += 1
+    record_id = str(meta["next_id"])
+    meta["next_id"] += 1
+    return record_id
+
+
+def collection_meta(data, file_path):
+    # Id -> position index and allocator state kept in the document under
+    # "_meta". Rebuilt when the document was written without it or behind its
+    # back (the stored count no longer matches the records).
+    records = data.setdefault(COLLECTIONS[file_path], [])
+    meta = data.setdefault("_meta", {})
+    if meta.get("count") != len(records) or "index" not in meta:
+        index = {}
+        for position, record in enumerate(records):
+            index.setdefault(str(record.get("id")), position)
+        meta["index"] = index
+        meta["count"] = len(records)
+        meta["next_id"] = max(meta.get("next_id", 1), first_free_id(record.get("id") for record in records))
+    return meta
+
+
+def apply_op(data, op):
+    # Applies one staged append/extend/update/remove to a collection document
+    # in memory. Appended records without an id get one from the collection
+    # allocator; a remove returns the records it took out.
+    kind, file_path = op[0], op[1]
+    records = data.setdefault(COLLECTIONS[file_path], [])
+    meta = collection_meta(data, file_path)
+    if kind == "remove":
+        ids = set(map(str, op[2]))
+        removed = [record for record in records if str(record.get("id")) in ids]
+        if removed:
+            records[:] = [record for record in records if str(record.get("id")) not in ids]
+            # Reindexed on next use; the allocator is kept
+            del meta["index"]
+            collection_meta(data, file_path)
+        return removed
+    if kind in ("append", "extend"):
+        added = []
+        for record in (op[2] if kind == "extend" else [op[2]]):
+            record = dict(record)
+            if not record.get("id"):
+                record["id"] = allocate_id(meta)
+            elif str(record["id"]).isdigit():
+                # An id given by the caller is never allocated again
+                meta["next_id"] = max(meta["next_id"], int(record["id"]) + 1)
+            meta["index"].setdefault(str(record["id"]), len(records))
+            records.append(record)
+            added.append(record)
+        meta["count"] += len(added)
+        return added if kind == "extend" else added[0]
+    position = meta["index"].get(str(op[2]))
+    if position is not None and (position >= len(records) or records[position]["id"] != op[2]):
+        # Stale index: the document was edited without it
+        del meta["index"]
+        position = collection_meta(data, file_path)["index"].get(str(op[2]))
+    if position is None:
+        return None
+    records[position].update(op[3])
+    return records[position]
+
+
+def record_matcher(file_path, filters=None, date_from=None, date_to=None):
+    # Predicate for query: filters map a field to accepted values (an empty
+    # list accepts everything), dates are inclusive "YYYY-MM-DD" bounds
+    accepted = {field: set(map(str, values)) for field, values in (filters or {}).items() if values}
+    date_field = DATE_FIELDS.get(file_path, "Date")
+    low = str(date_from or "")
+    high = str(date_to or "\uffff") + "\uffff"
+
+    def match(record):
+        if not all(str(record.get(field)) in values for field, values in accepted.items()):
+            return False
+        if date_from or date_to:
+            date = str(record.get(date_field) or "")
+            return bool(date) and low <= date <= high
+        return True
+    return match
+
+
+def sort_key(value):
+    # Missing values first, then numbers (ids and ratings too when stored as
+    # text) by value, then text: the order SQLite gives the same query
+    if value is None:
+        return (0, 0.0, "")
+    text = str(value)
+    if NUMERIC.fullmatch(text):
+        try:
+            return (1, float(text), "")
+        except ValueError:
+            pass
+    return (2, 0.0, text)
+
+
+def page(records, sort=None, descending=False, offset=0, limit=None):
+    # (number of records, the ones from offset to offset + limit). With a
+    # limit only the first offset + limit are held, the rest are just counted.
+    if limit is None:
+        records = list(records)
+        if sort:
+            records.sort(key=lambda record: sort_key(record.get(sort)), reverse=descending)
+        return len(records), records[offset:]
+    seen = itertools.count()
+    records = (record for record, _ in zip(records, seen))
+    if sort:
+        pick = heapq.nlargest if descending else heapq.nsmallest
+        window = pick(offset + limit, records, key=lambda record: sort_key(record.get(sort)))[offset:]
+    else:
+        window = list(itertools.islice(records, offset, offset + limit))
+    deque(records, maxlen=0)
+    return next(seen), window
+
+
+def is_conflict(error):
+    if error.status not in CONFLICT_STATUSES:
+        return False
+    message = error.data.get("message", "") if isinstance(error.data, dict) else error.data
+    return error.status != 422 or any(hint in str(message).lower() for hint in CONFLICT_MESSAGES)
+
+
+def retry_on_conflict(operation, budget=WRITE_BUDGET, delay=RETRY_DELAY):
+    # Runs operation (which must re-read what it writes) until it stops losing
+    # compare-and-swap races or budget seconds are spent. The pauses grow
+    # exponentially and are fully jittered, so writers that collided once
+    # spread out instead of colliding again in step.
+    deadline = time.monotonic() + budget
+    for attempt in itertools.count():
+        try:
+            return operation()
+        except GithubException as e:
+            if not is_conflict(e):
+                raise
+            pause = random.uniform(0, min(RETRY_MAX_DELAY, delay * 2 ** attempt))
+            if time.monotonic() + pause > deadline:
+                raise
+            time.sleep(pause)
+
+
+def git_blob_sha(body):
+    # SHA git assigns to a blob with this content, so commits made through the
+    # Git Data API can refresh the document cache without reading back
+    if isinstance(body, str):
+        body = body.encode()
+    return hashlib.sha1(b"blob %d\0" % len(body) + body).hexdigest()
+
+
+class Transaction:
+    # Unit of work: stages appends (one by one or in bulk), updates, removals,
+    # whole-document saves, images and directory purges, then hands them to the backend to be written together as one commit.
+    # Used as a context manager it commits on a clean exit and drops the staged
+    # changes if the block raises.
+
+    def __init__(self, backend, message):
+        self.backend = backend
+        self.message = message
+        self.ops = []
+        self.results = []
+
+    def save(self, file_path, data):
+        self.ops.append(("save", file_path, data))
+
+    def append(self, file_path, record):
+        self.ops.append(("append", file_path, record))
+        return record
+
+    def extend(self, file_path, records):
+        self.ops.append(("extend", file_path, list(records)))
+        return records
+
+    def update_by_id(self, file_path, record_id, updated_data):
+        self.ops.append(("update", file_path, record_id, updated_data))
+        return updated_data
+
+    def remove_by_ids(self, file_path, record_ids):
+        self.ops.append(("remove", file_path, list(record_ids)))
+
+    def put_image(self, image_path, image_data):
+        self.ops.append(("image", image_path, image_data))
+        return image_path
+
+    def purge(self, directory):
+        # Removes the directory and everything under it
+        self.ops.append(("purge", directory))
+
+    def commit(self):
+        if self.ops:
+            self.results = self.backend.commit(self.ops, self.message)
+        self.ops = []
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.ops = []
+        return False
+
+
+class StorageBackend:
+    # Common interface of the storage engines. append and update_by_id fall back
+    # to a whole-document read-modify-write; engines override them when they can
+    # do better.
+
+    def load(self, file_path):
+        raise NotImplementedError
+
+    def save(self, file_path, data):
+        raise NotImplementedError
+
+    def iter_records(self, file_path):
+        yield from (self.load(file_path) or default_data(file_path))[COLLECTIONS[file_path]]
+
+    def append(self, file_path, record):
+        data = self.load(file_path) or default_data(file_path)
+        record = apply_op(data, ("append", file_path, record))
+        self.save(file_path, data)
+        return record
+
+    def extend(self, file_path, records):
+        # Bulk append, one write for all the records
+        data = self.load(file_path) or default_data(file_path)
+        records = apply_op(data, ("extend", file_path, list(records)))
+        self.save(file_path, data)
+        return records
+
+    def update_by_id(self, file_path, record_id, updated_data):
+        data = self.load(file_path) or default_data(file_path)
+        record = apply_op(data, ("update", file_path, record_id, updated_data))
+        if record is not None:
+            self.save(file_path, data)
+        return record
+
+    def remove_by_ids(self, file_path, record_ids):
+        # Returns the removed records
+        data = self.load(file_path) or default_data(file_path)
+        removed = apply_op(data, ("remove", file_path, list(record_ids)))
+        if removed:
+            self.save(file_path, data)
+        return removed
+
+    def query(self, file_path, filters=None, date_from=None, date_to=None, sort=None, descending=False,
+              offset=0, limit=None):
+        # One page of a collection: (number of matching records, the page).
+        # Engines push the filters down to where the records are stored.
+        match = record_matcher(file_path, filters, date_from, date_to)
+        return page(filter(match, self.iter_records(file_path)), sort, descending, offset, limit)
+
+    def distinct(self, file_path, field):
+        # Sorted non-empty values a field takes in a collection, as text
+        return sorted({str(record[field]) for record in self.iter_records(file_path)
+                       if record.get(field) not in (None, "")})
+
+    def load_snapshot(self, file_paths, max_workers=4):
+        # file path -> document (None if missing), the files loaded concurrently
+        file_paths = list(file_paths)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="snapshot") as executor:
+            return dict(zip(file_paths, executor.map(self.load, file_paths)))
+
+    def put_image(self, image_path, image_data):
+        raise NotImplementedError
+
+    def get_image(self, image_path):
+        raise NotImplementedError
+
+    def image_exists(self, image_path):
+        raise NotImplementedError
+
+    def image_version(self, image_path):
+        # Changes whenever the stored image does; None when it cannot change behind our back
+        return None
+
+    def clear_images(self):
+        raise NotImplementedError
+
+    def delete_directory(self, directory):
+        raise NotImplementedError
+
+    def archive(self, name):
+        # Keeps a snapshot of everything stored under the given name and
+        # returns where it can be found
+        raise NotImplementedError
+
+    def version(self, file_path):
+        # Opaque token that changes whenever the collection does
+        raise NotImplementedError
+
+    def sync(self, max_age=0):
+        # Catches up with writes made elsewhere, if this engine can fall behind
+        # them; returns the paths that changed
+        return []
+
+    def recent_messages(self, since, limit):
+        # Messages of the commits made after since, newest first; engines
+        # without a commit history have none
+        return []
+
+    def subscribe(self, listener):
+        # listener(kind, file_path, record) is called after every successful write
+        # to a collection; kind is "append", "update" or "save" (record None),
+        # which also stands for records being removed or appended in bulk.
+        # "rename" passes (provisional id, real id) for a queued record that
+        # reached the remote store: the record and any field referring to it,
+        # in whichever collection, now read with the real id.
+        self.listeners = [*getattr(self, "listeners", []), listener]
+
+    def _notify(self, ops, results):
+        for op, result in zip(ops, results):
+            if op[0] in ("image", "purge") or op[1] not in COLLECTIONS or (op[0] == "update" and result is None):
+                continue
+            if op[0] in ("remove", "extend"):
+                self._emit("save", op[1], None)
+            else:
+                self._emit(op[0], op[1], result)
+
+    def _emit(self, kind, file_path, record):
+        for listener in getattr(self, "listeners", []):
+            try:
+                listener(kind, file_path, record)
+            except Exception:
+                # Listeners maintain derived views; the write itself has succeeded
+                logging.exception("Storage listener failed for %s", file_path)
+
+    def transaction(self, message="Update records"):
+        return Transaction(self, message)
+
+    def commit(self, ops, message):
+        # Engines without multi-document writes apply the staged operations one by one
+        results = []
+        for op in ops:
+            if op[0] == "save":
+                results.append(self.save(op[1], op[2]))
+            elif op[0] == "append":
+                results.append(self.append(op[1], op[2]))
+            elif op[0] == "extend":
+                results.append(self.extend(op[1], op[2]))
+            elif op[0] == "update":
+                results.append(self.update_by_id(op[1], op[2], op[3]))
+            elif op[0] == "remove":
+                results.append(self.remove_by_ids(op[1], op[2]))
+            elif op[0] == "purge":
+                results.append(self.delete_directory(op[1]))
+            else:
+                results.append(self.put_image(op[1], op[2]))
+        return results
+
+
+class DocumentCache:
+    # Parsed files keyed by path together with the blob SHA they were read at,
+    # plus the directory listings (path -> blob SHA) used to validate them.
+    # A listing younger than ttl seconds is trusted as is; an older one is
+    # fetched again, which revalidates every cached file of the directory in
+    # one call.
+
+    def __init__(self, ttl=15):
+        self.ttl = ttl
+        self.entries = {}  # path -> (data, sha)
+        self.listings = {}  # directory -> [shas, checked_at]
+        self.lock = threading.Lock()
+
+    def get(self, path, sha):
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None or entry[1] != sha:
+                metrics.miss("documents")
+                return None
+            metrics.hit("documents")
+            return copy.deepcopy(entry[0])
+
+    def put(self, path, data, sha):
+        with self.lock:
+            self.entries[path] = (copy.deepcopy(data), sha)
+            listing = self.listings.get(path.rpartition("/")[0])
+            if listing is not None:
+                listing[0][path] = sha
+
+    def shas(self):
+        # path -> SHA of every cached copy
+        with self.lock:
+            return {path: entry[1] for path, entry in self.entries.items()}
+
+    def entry(self, path):
+        # (data, sha) of the cached copy, whatever SHA it was read at
+        with self.lock:
+            entry = self.entries.get(path)
+            return None if entry is None else (copy.deepcopy(entry[0]), entry[1])
+
+    def listed(self, path, sha):
+        # Records a file written without caching its content (images)
+        with self.lock:
+            listing = self.listings.get(path.rpartition("/")[0])
+            if listing is not None:
+                listing[0][path] = sha
+
+    def get_listing(self, directory):
+        with self.lock:
+            listing = self.listings.get(directory)
+            if listing is None or time.monotonic() - listing[1] > self.ttl:
+                metrics.miss("listings")
+                return None
+            metrics.hit("listings")
+            return dict(listing[0])
+
+    def revalidate(self, directory, shas):
+        # shas: path -> current blob SHA of every file listed in directory
+        with self.lock:
+            self.listings[directory] = [dict(shas), time.monotonic()]
+            for path, entry in list(self.entries.items()):
+                if path.rpartition("/")[0] == directory and shas.get(path) != entry[1]:
+                    del self.entries[path]
+
+    def purge(self, directory):
+        # Everything under directory is gone: its listings become empty
+        with self.lock:
+            for path in list(self.entries):
+                if path.startswith(f"{directory}/"):
+                    del self.entries[path]
+            for listed in self.listings:
+                if listed == directory or listed.startswith(f"{directory}/"):
+                    self.listings[listed] = [{}, time.monotonic()]
+
+    def invalidate(self, path=None):
+        with self.lock:
+            if path is None:
+                self.entries.clear()
+                self.listings.clear()
+                return
+            self.entries.pop(path, None)
+            listing = self.listings.get(path.rpartition("/")[0])
+            if listing is not None:
+                listing[0].pop(path, None)
+
+
+# One cache per repository for the whole process, shared across sessions and reruns
+_document_caches = {}
+
+
+def document_cache(repo_name, ttl=15):
+    if repo_name not in _document_caches:
+        _document_caches[repo_name] = DocumentCache(ttl)
+    return _document_caches[repo_name]
+
+
+def shard_dir(file_path):
+    # "work order records.json" -> "work order records"
+    return file_path.rpartition(".")[0]
+
+
+def current_shard(file_path):
+    return f"{shard_dir(file_path)}/{datetime.now(timezone.utc):%Y-%m}.jsonl"
+
+
+def record_shard(file_path, record):
+    # Shard of the month of the record's Date
+    month = str(record.get("Date", ""))[:7]
+    if len(month) == 7 and month[4] == "-" and (month[:4] + month[5:]).isdigit():
+        return f"{shard_dir(file_path)}/{month}.jsonl"
+    return current_shard(file_path)
+
+
+def to_table(records):
+    # Column names once, then one value list per record; a record lacking
+    # some of the columns lists them under "missing" so decoding is exact
+    columns = list(dict.fromkeys(key for record in records for key in record))
+    rows = []
+    missing = {}
+    for number, record in enumerate(records):
+        rows.append([record.get(column) for column in columns])
+        if len(record) != len(columns):
+            missing[str(number)] = [column for column in columns if column not in record]
+    return {"columns": columns, "rows": rows, "missing": missing}
+
+
+def from_table(table):
+    records = list(map(dict, map(zip, itertools.repeat(table["columns"]), table["rows"])))
+    for number, columns in table["missing"].items():
+        for column in columns:
+            del records[int(number)][column]
+    return records
+
+
+def encode_file(path, content, compact=False):
+    # compact only applies to whole-collection documents; the id index is
+    # left out of them and rebuilt on the first write after loading
+    if compact and path in COLLECTIONS:
+        document = dict(content)
+        records = document.pop(COLLECTIONS[path], [])
+        if "_meta" in document:
+            document["_meta"] = {key: value for key, value in document["_meta"].items() if key != "index"}
+        body = {"format": COMPACT_FORMAT, "version": COMPACT_VERSION, "key": COLLECTIONS[path],
+                "document": document, **to_table(records)}
+        # mtime=0 keeps the bytes, and so the blob SHA, a function of the content
+        return gzip.compress(json.dumps(body, separators=(",", ":")).encode(), mtime=0)
+    if path.endswith(".jsonl"):
+        return "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in content)
+    if path.endswith("/manifest.json"):
+        # Written on every sharded write, keep it compact
+        return json.dumps(content, separators=(",", ":"))
+    return json.dumps(content, indent=2)
+
+
+def apply_patch(text, patch):
+    # Applies a unified diff, as GitHub returns one per file, to text; None
+    # when the text is not the one the diff was taken from
+    old = text.splitlines(keepends=True)
+    new = []
+    cursor = 0
+    lines = patch.split("\n")
+    for number, line in enumerate(lines):
+        if line.startswith("@@"):
+            hunk = HUNK.match(line)
+            if hunk is None:
+                return None
+            # An empty old side ("-5,0") inserts after that line
+            start = int(hunk.group(1)) - (hunk.group(2) != "0")
+            if start < cursor:
+                return None
+            new.extend(old[cursor:start])
+            cursor = start
+            continue
+        if not line or line[0] not in " +-":
+            continue
+        ending = "" if number + 1 < len(lines) and lines[number + 1].startswith("\\") else "\n"
+        body = line[1:] + ending
+        if line[0] != "+":
+            if cursor >= len(old) or old[cursor] != body:
+                return None
+            cursor += 1
+        if line[0] != "-":
+            new.append(body)
+    new.extend(old[cursor:])
+    return "".join(new)
+
+
+def record_changes(before, after):
+    # (appended, updated, removed) records between two versions of a list
+    old = {str(record.get("id")): record for record in before}
+    new_ids = {str(record.get("id")) for record in after}
+    appended = [record for record in after if str(record.get("id")) not in old]
+    updated = [record for record in after if str(record.get("id")) in old and old[str(record.get("id"))] != record]
+    return appended, updated, [record for key, record in old.items() if key not in new_ids]
+
+
+def decode_file(path, raw):
+    # Reads compact and plain files alike, whatever the configured format
+    if raw[:2] == GZIP_MAGIC:
+        body = json.loads(gzip.decompress(raw))
+        if body.get("format") != COMPACT_FORMAT or body.get("version") != COMPACT_VERSION:
+            raise ValueError(f"{path} is stored in an unsupported format: {body.get('format')} {body.get('version')}")
+        data = body["document"]
+        data[body["key"]] = from_table(body)
+        return data
+    text = raw.decode()
+    if path.endswith(".jsonl"):
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    return json.loads(text)
+
+
+class GithubBackend(StorageBackend):
+    # Stores the collections in a GitHub repository. With the "single" layout
+    # every collection is one JSON document; with the "sharded" layout records
+    # are appended to the monthly JSONL shard of their Date ("work order
+    # records/2026-10.jsonl") listed in a manifest, so an insert rewrites only
+    # one small shard and older months hold history that is rarely read.
+    # A legacy whole-file document is still read as the oldest part of a
+    # sharded collection until the collection is next saved as a whole.
+    # With the "compact" file format collection documents are written as
+    # gzipped tables (see encode_file); files in either format are read.
+
+    def __init__(self, repo, cache=None, layout="single", file_format="json"):
+        self.repo = repo
+        self.cache = cache if cache is not None else document_cache(repo.full_name)
+        self.sharded = layout == "sharded"
+        self.compact = file_format == "compact"
+        self.synced = None  # [head commit SHA, when] of the last sync
+        self.part_indexes = {}  # shard or legacy document -> (blob SHA, id -> line)
+        self.image_tree = (None, {})  # (SHA of the images tree, directory -> {path: blob SHA})
+        self.sync_lock = threading.Lock()
+
+    def load(self, file_path):
+        if self.sharded and file_path in COLLECTIONS:
+            if self._read(file_path) is None and self._read(f"{shard_dir(file_path)}/manifest.json") is None:
+                return None
+            return {COLLECTIONS[file_path]: list(self.iter_records(file_path))}
+        return self._read(file_path)
+
+    def load_snapshot(self, file_paths, max_workers=4):
+        # One listing of the branch's root tree revalidates the cached copy of
+        # every requested file (and the shard directories) before the blobs
+        # that changed are downloaded in parallel
+        file_paths = list(file_paths)
+        root = {element.path: element for element in self.repo.get_git_tree(self.repo.default_branch).tree}
+        self.cache.revalidate("", {path: element.sha for path, element in root.items() if element.type == "blob"})
+        self._revalidate_images(root, "images")
+        if self.sharded:
+            directories = {shard_dir(file_path) for file_path in file_paths if file_path in COLLECTIONS}
+            trees = {directory: root[directory].sha for directory in directories
+                     if directory in root and root[directory].type == "tree"}
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="snapshot") as executor:
+                listings = dict(zip(trees, executor.map(self.repo.get_git_tree, trees.values())))
+            for directory in directories:
+                self.cache.revalidate(directory, {
+                    f"{directory}/{element.path}": element.sha
+                    for element in (listings[directory].tree if directory in listings else [])
+                    if element.type == "blob"})
+        return super().load_snapshot(file_paths, max_workers)
+
+    def iter_records(self, file_path):
+        # Yields the records of a collection part by part, fetching each shard
+        # only when the consumer gets to it
+        if not self.sharded:
+            yield from super().iter_records(file_path)
+            return
+        yield from self._iter_shards(file_path)
+
+    def query(self, file_path, filters=None, date_from=None, date_to=None, sort=None, descending=False,
+              offset=0, limit=None):
+        if not (self.sharded and (date_from or date_to) and DATE_FIELDS.get(file_path) == "Date"):
+            return super().query(file_path, filters, date_from, date_to, sort, descending, offset, limit)
+        # Shards are named after the month of their records' Date, so only the
+        # months in the range are read
+        records = self._iter_shards(file_path, str(date_from or "")[:7], str(date_to or "\uffff")[:7])
+        match = record_matcher(file_path, filters, date_from, date_to)
+        return page(filter(match, records), sort, descending, offset, limit)
+
+    def _iter_shards(self, file_path, first="", last="\uffff"):
+        # The legacy document is read whatever the months
+        legacy = self._read(file_path)
+        if legacy is not None:
+            yield from legacy.get(COLLECTIONS[file_path], [])
+        manifest = self._read(f"{shard_dir(file_path)}/manifest.json") or {"shards": {}}
+        for name in sorted(manifest["shards"]):
+            if first <= name[:7] <= last:
+                yield from self._read(f"{shard_dir(file_path)}/{name}") or []
+
+    # Every write below is a compare-and-swap on the blob SHA (contents API) or
+    # the branch head (Git Data API). A write that loses the race re-reads the
+    # current file, re-applies its operation and tries again.
+
+    def save(self, file_path, data):
+        if self.sharded and file_path in COLLECTIONS:
+            self.commit([("save", file_path, data)], f"Update {file_path}")
+            return
+
+        def attempt():
+            sha = self._listing(file_path.rpartition("/")[0], fresh_only=False).get(file_path)
+            new_data = data
+            if file_path in COLLECTIONS:
+                new_data = self._keep_allocator(file_path, data, None if sha is None else self._fetch(file_path, sha))
+            self._commit_document(file_path, new_data, sha)
+
+        retry_on_conflict(attempt)
+        self._notify([("save", file_path, data)], [None])
+
+    def append(self, file_path, record):
+        if self.sharded:
+            return self.commit([("append", file_path, record)], f"Append to {file_path}")[0]
+
+        known = self.cache.shas().get(file_path)
+
+        def attempt():
+            # Always revalidate first so the write never builds on a stale copy
+            data, sha = self._read_for_write(file_path)
+            new_record = apply_op(data, ("append", file_path, record))
+            self._commit_document(file_path, data, sha)
+            return new_record, sha
+
+        new_record, sha = retry_on_conflict(attempt)
+        self._notify([("append", file_path, record)], [new_record])
+        self._notify_overtaken(file_path, known, sha)
+        return new_record
+
+    def update_by_id(self, file_path, record_id, updated_data):
+        if self.sharded:
+            return self.commit([("update", file_path, record_id, updated_data)], f"Update {file_path}")[0]
+
+        known = self.cache.shas().get(file_path)
+
+        def attempt():
+            data, sha = self._read_for_write(file_path)
+            record = apply_op(data, ("update", file_path, record_id, updated_data))
+            if record is not None:
+                self._commit_document(file_path, data, sha)
+            return record, sha
+
+        record, sha = retry_on_conflict(attempt)
+        self._notify([("update", file_path, record_id, updated_data)], [record])
+        self._notify_overtaken(file_path, known, sha)
+        return record
+
+    def extend(self, file_path, records):
+        return self.commit([("extend", file_path, list(records))], f"Import into {file_path}")[0]
+
+    def remove_by_ids(self, file_path, record_ids):
+        return self.commit([("remove", file_path, list(record_ids))], f"Remove records from {file_path}")[0]
+
+    def put_image(self, image_path, image_data):
+        def attempt():
+            try:
+                sha = self.repo.get_contents(image_path).sha
+            except GithubException as e:
+                if e.status != 404:
+                    raise
+                sha = None
+            self.cache.listed(image_path, self._write(image_path, image_data, sha))
+
+        retry_on_conflict(attempt)
+        return image_path
+
+    def get_image(self, image_path):
+        return self.repo.get_contents(image_path).decoded_content
+
+    def image_exists(self, image_path):
+        # Answered from the cached image listing
+        return image_path in self._image_listing(image_path.rpartition("/")[0])
+
+    def image_version(self, image_path):
+        return self._image_listing(image_path.rpartition("/")[0]).get(image_path)
+
+    def clear_images(self, directory="images"):
+        self.delete_directory(directory)
+
+    def delete_directory(self, directory):
+        self.commit([("purge", directory)], f"Delete {directory}")
+
+    def archive(self, name):
+        # A tag on the current head keeps every file reachable after a purge.
+        # The head's short SHA keeps names unique; a tag that exists already
+        # is an error (422), not a conflict to retry.
+        ref = self.repo.get_git_ref(f"heads/{self.repo.default_branch}")
+        name = f"{name}-{ref.object.sha[:7]}"
+        self.repo.create_git_ref(f"refs/tags/{name}", ref.object.sha)
+        return f"tags/{name}"
+
+    def commit(self, ops, message):
+        # A file another writer changed since we cached it is folded into the
+        # commit; what the listeners hold of its collection is stale
+        known = self.cache.shas()
+        overtaken = set()
+        results = retry_on_conflict(lambda: self._commit_once(ops, message, known, overtaken))
+        self._notify(ops, results)
+        for file_path in sorted(overtaken):
+            self._notify([("save", file_path, None)], [None])
+        return results
+
+    def _notify_overtaken(self, file_path, known, sha):
+        # The write built on a copy another writer had changed since we cached it
+        if known not in (None, sha):
+            self._notify([("save", file_path, None)], [None])
+
+    def version(self, file_path):
+        if not (self.sharded and file_path in COLLECTIONS):
+            return self._listing(file_path.rpartition("/")[0]).get(file_path)
+        parts = sorted(self._listing(shard_dir(file_path)).items())
+        parts.append((file_path, self._listing("").get(file_path)))
+        return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+    def recent_messages(self, since, limit):
+        # Messages of the branch's commits made after since (a UNIX time),
+        # newest first and at most limit of them; listed a page at a time
+        commits = self.repo.get_commits(sha=self.repo.default_branch, since=datetime.fromtimestamp(since, timezone.utc))
+        return [commit.commit.message for commit in itertools.islice(commits, limit)]
+
+    def sync(self, max_age=0):
+        # Moves the cache forward to the branch head from the diff of the
+        # commits since the last sync, so another tablet's append costs about
+        # the bytes of the appended record. A cached file that the diff starts
+        # from is patched; the result is kept only if it hashes to the new blob
+        # SHA, anything else is downloaded on its next read as before. Records
+        # that changed are passed to the listeners, so derived views follow
+        # without a rebuild.
+        with self.sync_lock:
+            if self.synced is not None and time.monotonic() - self.synced[1] < max_age:
+                return []
+            head = self.repo.get_git_ref(f"heads/{self.repo.default_branch}").object.sha
+            base = None if self.synced is None else self.synced[0]
+            self.synced = [head, time.monotonic()]
+            if base is None or base == head:
+                return []
+            changed = []
+            for changed_file in self.repo.compare(base, head).files:
+                path = changed_file.filename
+                changed.append(path)
+                if changed_file.status in ("removed", "renamed"):
+                    self.cache.invalidate(getattr(changed_file, "previous_filename", None) or path)
+                if changed_file.status == "removed":
+                    continue
+                cached = self.cache.entry(path)
+                if cached is not None and cached[1] == changed_file.sha:
+                    # Our own commit: cached and notified when it was written
+                    continue
+                patched = None
+                if cached is not None and changed_file.patch and git_blob_sha(encode_file(path, cached[0])) == cached[1]:
+                    body = apply_patch(encode_file(path, cached[0]), changed_file.patch)
+                    if body is not None and git_blob_sha(body) == changed_file.sha:
+                        patched = decode_file(path, body.encode())
+                if patched is None:
+                    self.cache.listed(path, changed_file.sha)
+                    continue
+                self.cache.put(path, patched, changed_file.sha)
+                self._notify_changes(path, cached[0], patched)
+            return changed
+
+    def _notify_changes(self, path, before, after):
+        # Collection documents and shards; manifests and images are skipped
+        if path in COLLECTIONS:
+            file_path, before, after = path, before.get(COLLECTIONS[path], []), after.get(COLLECTIONS[path], [])
+        elif path.endswith(".jsonl"):
+            file_path = next((file_path for file_path in COLLECTIONS if shard_dir(file_path) == path.rpartition("/")[0]), None)
+        else:
+            file_path = None
+        if file_path is None:
+            return
+        appended, updated, removed = record_changes(before, after)
+        if removed:
+            self._notify([("save", file_path, None)], [None])
+            return
+        self._notify([("append", file_path, record) for record in appended] + [("update", file_path, None, None)] * len(updated),
+                     appended + updated)
+
+    def _commit_once(self, ops, message, known, overtaken):
+        # Writes every staged change as a single commit through blobs, trees and
+        # refs. Files are read at the head commit the new commit is parented
+        # on, and the ref is only fast-forwarded, so a concurrent writer makes
+        # the ref update fail instead of being overwritten.
+        ref = self.repo.get_git_ref(f"heads/{self.repo.default_branch}")
+        head = self.repo.get_git_commit(ref.object.sha)
+        files = {}  # path -> new content
+        deleted = set()
+        images = {}
+        purged = set()
+        listings = {}
+        results = []
+
+        def under(path, directories):
+            return any(path.startswith(f"{directory}/") for directory in directories)
+
+        def read(path):
+            if path in files:
+                return files[path]
+            if path in deleted or under(path, purged):
+                return None
+            return self._read_at(head, path, listings)
+
+        def blob(path):
+            # SHA of the file at head, None once this commit stages or drops it
+            if path in files or path in deleted or under(path, purged):
+                return None
+            return self._listing_at(head, path.rpartition("/")[0], listings).get(path)
+
+        for op in ops:
+            if op[0] == "image":
+                images[op[1]] = op[2].encode() if isinstance(op[2], str) else op[2]
+                results.append(op[1])
+            elif op[0] == "purge":
+                # The whole subtree goes in one tree entry, however many files it holds
+                if self._subtree(head.tree, op[1]) is not None:
+                    purged.add(op[1])
+                for staged in (files, images):
+                    for path in [path for path in staged if under(path, [op[1]])]:
+                        del staged[path]
+                results.append(None)
+            elif self.sharded and op[1] in COLLECTIONS:
+                results.append(self._apply_sharded(op, read, files, deleted, blob))
+            elif op[0] == "save":
+                previous = read(op[1]) if op[1] in COLLECTIONS else None
+                files[op[1]] = copy.deepcopy(op[2])
+                if op[1] in COLLECTIONS:
+                    files[op[1]] = self._keep_allocator(op[1], files[op[1]], previous)
+                results.append(None)
+            else:
+                files[op[1]] = read(op[1]) or default_data(op[1])
+                results.append(apply_op(files[op[1]], op))
+
+        elements = []
+        bodies = {}
+        for path, content in files.items():
+            bodies[path] = encode_file(path, content, self.compact)
+            if isinstance(bodies[path], bytes):
+                # Tree entries only take text content; binary bodies go up as blobs
+                blob = self.repo.create_git_blob(base64.b64encode(bodies[path]).decode(), "base64")
+                elements.append(InputGitTreeElement(path, "100644", "blob", sha=blob.sha))
+            else:
+                elements.append(InputGitTreeElement(path, "100644", "blob", content=bodies[path]))
+        for path in deleted - files.keys():
+            if not under(path, purged):
+                elements.append(InputGitTreeElement(path, "100644", "blob", sha=None))
+        for directory in purged:
+            elements.append(InputGitTreeElement(directory, "040000", "tree", sha=None))
+        for path, image_data in images.items():
+            blob = self.repo.create_git_blob(base64.b64encode(image_data).decode(), "base64")
+            elements.append(InputGitTreeElement(path, "100644", "blob", sha=blob.sha))
+        tree = self.repo.create_git_tree(elements, head.tree)
+        new_commit = self.repo.create_git_commit(message, tree, [head])
+        ref.edit(new_commit.sha)
+        with self.sync_lock:
+            # Made on top of the last synced head: the next sync diffs from
+            # here, against the copies this commit caches
+            if self.synced is not None and self.synced[0] == head.sha:
+                self.synced[0] = new_commit.sha
+        for path in files:
+            directory = path.rpartition("/")[0]
+            if known.get(path) not in (None, listings.get(directory, {}).get(path, known.get(path))):
+                overtaken.add(path if path in COLLECTIONS else next(
+                    (file_path for file_path in COLLECTIONS if shard_dir(file_path) == directory), path))
+        for path, content in files.items():
+            self.cache.put(path, content, git_blob_sha(bodies[path]))
+        for path in deleted - files.keys():
+            self.cache.invalidate(path)
+        for directory in purged:
+            self.cache.purge(directory)
+        for path, image_data in images.items():
+            self.cache.listed(path, git_blob_sha(image_data))
+        return results
+
+    def _apply_sharded(self, op, read, files, deleted, blob):
+        # The manifest carries the shard list (name -> record count), the record
+        # count and the allocator, so an append rewrites only its shard and a
+        # few bytes of manifest. Updates and removes find their records through
+        # the in-memory part indexes (see _part_index).
+        file_path = op[1]
+        directory = shard_dir(file_path)
+        manifest_path = f"{directory}/manifest.json"
+        manifest = self._sharded_meta(file_path, read(manifest_path) or {"shards": {}}, read)
+        if op[0] in ("append", "extend"):
+            # Records land in the shard of their Date, so archived ones go to their month
+            added = []
+            for record in (op[2] if op[0] == "extend" else [op[2]]):
+                shard = record_shard(file_path, record)
+                name = shard.rpartition("/")[2]
+                if shard not in files:
+                    files[shard] = read(shard) or []
+                records = files[shard]
+                record = dict(record)
+                if not record.get("id"):
+                    record["id"] = allocate_id(manifest)
+                elif str(record["id"]).isdigit():
+                    # An id given by the caller is never allocated again
+                    manifest["next_id"] = max(manifest["next_id"], int(record["id"]) + 1)
+                records.append(record)
+                manifest["shards"][name] = len(records)
+                added.append(record)
+            manifest["count"] += len(added)
+            files[manifest_path] = manifest
+            return added if op[0] == "extend" else added[0]
+        if op[0] == "update":
+            for part in self._parts(file_path, manifest):
+                line = self._part_index(file_path, part, blob(part), read).get(str(op[2]))
+                if line is not None:
+                    content = read(part)
+                    record = self._part_records(file_path, part, content)[line]
+                    record.update(op[3])
+                    files[part] = content
+                    return record
+            return None
+        if op[0] == "remove":
+            # Only the parts holding the records are rewritten
+            ids = set(map(str, op[2]))
+            removed = []
+            for part in self._parts(file_path, manifest):
+                if ids.isdisjoint(self._part_index(file_path, part, blob(part), read)):
+                    continue
+                content = read(part)
+                records = self._part_records(file_path, part, content)
+                removed.extend(record for record in records if str(record.get("id")) in ids)
+                records[:] = [record for record in records if str(record.get("id")) not in ids]
+                files[part] = content
+                if part != file_path:
+                    manifest["shards"][part.rpartition("/")[2]] = len(records)
+            manifest["count"] -= len(removed)
+            files[manifest_path] = manifest
+            return removed
+        # Whole-collection save: repartition every record and drop the legacy file
+        for name in manifest["shards"]:
+            deleted.add(f"{directory}/{name}")
+            files.pop(f"{directory}/{name}", None)
+        if read(file_path) is not None:
+            deleted.add(file_path)
+        files.pop(file_path, None)
+        manifest["shards"] = {}
+        ids = []
+        for record in op[2].get(COLLECTIONS[file_path], []):
+            shard = record_shard(file_path, record)
+            files.setdefault(shard, []).append(copy.deepcopy(record))
+            manifest["shards"][shard.rpartition("/")[2]] = len(files[shard])
+            ids.append(record.get("id"))
+        manifest["count"] = len(ids)
+        manifest["next_id"] = max(manifest.get("next_id", 1), first_free_id(ids))
+        files[manifest_path] = manifest
+        return None
+
+    def _sharded_meta(self, file_path, manifest, read):
+        # Counts the records and starts the allocator past every stored id when
+        # the manifest is new or the shards were written without it. The id
+        # index earlier manifests carried is dropped.
+        manifest.pop("index", None)
+        legacy = read(file_path)
+        legacy_records = [] if legacy is None else legacy.get(COLLECTIONS[file_path], [])
+        count = len(legacy_records) + sum(manifest["shards"].values())
+        if manifest.get("count") == count and "next_id" in manifest:
+            return manifest
+        ids = [record.get("id") for record in legacy_records]
+        for name in sorted(manifest["shards"]):
+            ids.extend(record.get("id") for record in read(f"{shard_dir(file_path)}/{name}") or [])
+        manifest["count"] = count
+        manifest["next_id"] = max(manifest.get("next_id", 1), first_free_id(ids))
+        return manifest
+
+    def _parts(self, file_path, manifest):
+        # Newest shard first, as edits mostly touch recent records; the legacy
+        # whole-file document last
+        return [f"{shard_dir(file_path)}/{name}" for name in sorted(manifest["shards"], reverse=True)] + [file_path]
+
+    def _part_records(self, file_path, part, content):
+        if part == file_path:
+            return [] if content is None else content.setdefault(COLLECTIONS[file_path], [])
+        return [] if content is None else content
+
+    def _part_index(self, file_path, part, sha, read):
+        # id -> line of one part, built from its records and kept by blob SHA,
+        # so an unchanged shard is indexed once and not even read to rule it
+        # out. Parts staged in the current commit (sha None) are indexed as is.
+        cached = self.part_indexes.get(part)
+        if sha is not None and cached is not None and cached[0] == sha:
+            return cached[1]
+        index = {}
+        for line, record in enumerate(self._part_records(file_path, part, read(part))):
+            index.setdefault(str(record.get("id")), line)
+        if sha is not None:
+            self.part_indexes[part] = (sha, index)
+        return index
+
+    def _keep_allocator(self, file_path, data, previous):
+        # A whole-document save must not rewind the allocator, or ids of
+        # deleted records would be handed out again
+        data = dict(data)
+        data.pop("_meta", None)
+        meta = collection_meta(data, file_path)
+        if previous is not None:
+            meta["next_id"] = max(meta["next_id"], collection_meta(previous, file_path)["next_id"])
+        return data
+
+    def _listing_at(self, head, directory, listings):
+        # path -> blob SHA of a directory as of the given commit. listings
+        # memoizes them within one commit.
+        if directory not in listings:
+            tree = head.tree if directory == "" else self._subtree(head.tree, directory)
+            listings[directory] = {} if tree is None else {
+                (f"{directory}/{element.path}" if directory else element.path): element.sha
+                for element in self.repo.get_git_tree(tree.sha).tree}
+            self.cache.revalidate(directory, listings[directory])
+        return listings[directory]
+
+    def _read_at(self, head, path, listings):
+        # File as of the given commit, downloaded only if the cached copy is stale
+        sha = self._listing_at(head, path.rpartition("/")[0], listings).get(path)
+        return None if sha is None else self._fetch(path, sha)
+
+    def _subtree(self, tree, directory):
+        for part in directory.split("/"):
+            entries = {element.path: element for element in self.repo.get_git_tree(tree.sha).tree}
+            if part not in entries or entries[part].type != "tree":
+                return None
+            tree = entries[part]
+        return tree
+
+    def _write(self, path, body, sha):
+        # sha is the blob the caller read: None means the file must not exist yet
+        if sha is None:
+            result = self.repo.create_file(path, f"Create {path}", body)
+        else:
+            result = self.repo.update_file(path, f"Update {path}", body, sha)
+        return result["content"].sha
+
+    def _commit_document(self, file_path, data, sha):
+        new_sha = self._write(file_path, encode_file(file_path, data, self.compact), sha)
+        self.cache.put(file_path, data, new_sha)
+
+    def _list_shas(self, directory):
+        try:
+            listing = self.repo.get_contents(directory)
+        except GithubException as e:
+            if e.status == 404:
+                return {}
+            raise
+        if not isinstance(listing, list):
+            listing = [listing]
+        return {content.path: content.sha for content in listing if content.type == "file"}
+
+    def _listing(self, directory, fresh_only=True):
+        # One listing call revalidates every cached file of the directory
+        shas = self.cache.get_listing(directory) if fresh_only else None
+        if shas is None:
+            shas = self._list_shas(directory)
+            self.cache.revalidate(directory, shas)
+        return shas
+
+    def _image_listing(self, directory):
+        # Image directories are listed from the git tree rather than the
+        # contents API, whose listings stop at 1000 files
+        shas = self.cache.get_listing(directory)
+        if shas is None:
+            root = {element.path: element for element in self.repo.get_git_tree(self.repo.default_branch).tree}
+            shas = self._revalidate_images(root, directory.split("/")[0], directory)
+        return shas
+
+    def _revalidate_images(self, root, top, directory=None):
+        # One recursive listing of the top tree revalidates every directory
+        # under it; it is only fetched again when the tree's SHA changes.
+        # Returns the listing of directory.
+        sha = root[top].sha if top in root and root[top].type == "tree" else None
+        if self.image_tree[0] != sha or top not in self.image_tree[1]:
+            listings = {top: {}}
+            if sha is not None:
+                for element in self.repo.get_git_tree(sha, recursive=True).tree:
+                    if element.type == "blob":
+                        path = f"{top}/{element.path}"
+                        listings.setdefault(path.rpartition("/")[0], {})[path] = element.sha
+            self.image_tree = (sha, listings)
+        listings = self.image_tree[1]
+        for listed, shas in listings.items():
+            self.cache.revalidate(listed, shas)
+        if directory is not None and directory not in listings:
+            self.cache.revalidate(directory, {})
+        return listings.get(directory, {})
+
+    def _fetch(self, path, sha):
+        # The file is downloaded only when its blob SHA has changed
+        data = self.cache.get(path, sha)
+        if data is None:
+            data = decode_file(path, base64.b64decode(self.repo.get_git_blob(sha).content))
+            self.cache.put(path, data, sha)
+        return data
+
+    def _read(self, path):
+        sha = self._listing(path.rpartition("/")[0]).get(path)
+        return None if sha is None else self._fetch(path, sha)
+
+    def _read_for_write(self, file_path):
+        sha = self._listing(file_path.rpartition("/")[0], fresh_only=False).get(file_path)
+        if sha is None:
+            return default_data(file_path), None
+        return self._fetch(file_path, sha), sha
+
+
+class SQLiteBackend(StorageBackend):
+    # Local engine for LAN deployments and offline use. Collection records are
+    # kept one row each so appends and updates never rewrite the whole document.
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # Other processes on the same file wait for the write lock instead of failing
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS documents (path TEXT PRIMARY KEY, body TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS records (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    path TEXT NOT NULL,
+                    id TEXT,
+                    body TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS records_path_id ON records (path, id);
+                CREATE TABLE IF NOT EXISTS images (path TEXT PRIMARY KEY, data BLOB NOT NULL);
+                CREATE TABLE IF NOT EXISTS sequences (path TEXT PRIMARY KEY, next_id INTEGER NOT NULL);
+                CREATE TABLE IF NOT EXISTS revisions (path TEXT PRIMARY KEY, revision INTEGER NOT NULL);
+            """)
+
+    def load(self, file_path):
+        with self.lock:
+            row = self.conn.execute("SELECT body FROM documents WHERE path = ?", (file_path,)).fetchone()
+            if row is None:
+                return None
+            data = json.loads(row[0])
+            if file_path in COLLECTIONS:
+                rows = self.conn.execute(
+                    "SELECT body FROM records WHERE path = ? ORDER BY seq", (file_path,)).fetchall()
+                data[COLLECTIONS[file_path]] = [json.loads(body) for body, in rows]
+        return data
+
+    def save(self, file_path, data):
+        self.commit([("save", file_path, data)], f"Update {file_path}")
+
+    def append(self, file_path, record):
+        return self.commit([("append", file_path, record)], f"Append to {file_path}")[0]
+
+    def update_by_id(self, file_path, record_id, updated_data):
+        return self.commit([("update", file_path, record_id, updated_data)], f"Update {file_path}")[0]
+
+    def extend(self, file_path, records):
+        return self.commit([("extend", file_path, list(records))], f"Import into {file_path}")[0]
+
+    def remove_by_ids(self, file_path, record_ids):
+        return self.commit([("remove", file_path, list(record_ids))], f"Remove records from {file_path}")[0]
+
+    def query(self, file_path, filters=None, date_from=None, date_to=None, sort=None, descending=False,
+              offset=0, limit=None):
+        # Filtered, sorted and paged by SQLite; only the page is decoded
+        where = ["path = ?"]
+        params = [file_path]
+        for field, values in (filters or {}).items():
+            if values:
+                where.append(f"CAST(json_extract(body, ?) AS TEXT) IN ({', '.join('?' * len(values))})")
+                params.extend([json_path(field), *map(str, values)])
+        if date_from or date_to:
+            where.append("json_extract(body, ?) BETWEEN ? AND ? AND json_extract(body, ?) != ''")
+            date_path = json_path(DATE_FIELDS.get(file_path, "Date"))
+            params.extend([date_path, str(date_from or ""), str(date_to or "\uffff") + "\uffff", date_path])
+        order = "seq"
+        order_params = []
+        if sort:
+            # Numeric text sorts as a number, matching sort_key
+            order = (f"CASE WHEN json_extract(body, ?) GLOB '[0-9]*' AND NOT json_extract(body, ?) GLOB '*[^0-9.]*' "
+                     f"THEN CAST(json_extract(body, ?) AS REAL) ELSE json_extract(body, ?) END "
+                     f"{'DESC' if descending else 'ASC'}, seq")
+            order_params = [json_path(sort)] * 4
+        condition = " AND ".join(where)
+        with self.lock:
+            total, = self.conn.execute(f"SELECT COUNT(*) FROM records WHERE {condition}", params).fetchone()
+            rows = self.conn.execute(
+                f"SELECT body FROM records WHERE {condition} ORDER BY {order} LIMIT ? OFFSET ?",
+                [*params, *order_params, -1 if limit is None else limit, offset]).fetchall()
+        return total, [json.loads(row[0]) for row in rows]
+
+    def distinct(self, file_path, field):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT CAST(json_extract(body, ?) AS TEXT) AS value FROM records "
+                "WHERE path = ? AND value IS NOT NULL AND value != ''", (json_path(field), file_path)).fetchall()
+        return sorted(row[0] for row in rows)
+
+    def put_image(self, image_path, image_data):
+        with self.lock, self.conn:
+            return self._put_image(image_path, image_data)
+
+    def commit(self, ops, message):
+        # All staged operations run inside one SQLite transaction
+        handlers = {"save": self._save, "append": self._append, "extend": self._extend,
+                    "update": self._update_by_id, "remove": self._remove_by_ids,
+                    "image": self._put_image, "purge": self._purge}
+        with self.lock, self.conn:
+            results = [handlers[op[0]](*op[1:]) for op in ops]
+            for path in {op[1] for op in ops if op[0] not in ("image", "purge")}:
+                self.conn.execute(
+                    "INSERT INTO revisions (path, revision) VALUES (?, 1) "
+                    "ON CONFLICT (path) DO UPDATE SET revision = revision + 1", (path,))
+        self._notify(ops, results)
+        return results
+
+    def version(self, file_path):
+        with self.lock:
+            row = self.conn.execute("SELECT revision FROM revisions WHERE path = ?", (file_path,)).fetchone()
+        return None if row is None else str(row[0])
+
+    def get_image(self, image_path):
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM images WHERE path = ?", (image_path,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(image_path)
+        return row[0]
+
+    def image_exists(self, image_path):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM images WHERE path = ?", (image_path,)).fetchone() is not None
+
+    def clear_images(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM images")
+
+    def delete_directory(self, directory):
+        self.commit([("purge", directory)], f"Delete {directory}")
+
+    def archive(self, name):
+        # Online copy of the whole database next to it
+        path = f"{self.db_path}.{name}"
+        if os.path.exists(path):
+            raise FileExistsError(f"Archive {path} already exists")
+        target = sqlite3.connect(path)
+        with self.lock:
+            self.conn.backup(target)
+        target.close()
+        return path
+
+    def _save(self, file_path, data):
+        data = dict(data)
+        data.pop("_meta", None)
+        records = data.pop(COLLECTIONS[file_path], []) if file_path in COLLECTIONS else []
+        self.conn.execute("DELETE FROM records WHERE path = ?", (file_path,))
+        self.conn.executemany(
+            "INSERT INTO records (path, id, body) VALUES (?, ?, ?)",
+            [(file_path, record.get("id"), json.dumps(record)) for record in records])
+        self._put_document(file_path, data)
+
+    def _append(self, file_path, record):
+        self.conn.execute("INSERT OR IGNORE INTO documents (path, body) VALUES (?, '{}')", (file_path,))
+        record = dict(record)
+        if not record.get("id"):
+            record["id"] = self._allocate_id(file_path)
+        self.conn.execute(
+            "INSERT INTO records (path, id, body) VALUES (?, ?, ?)",
+            (file_path, record.get("id"), json.dumps(record)))
+        return record
+
+    def _extend(self, file_path, records):
+        # Ids for the whole batch in one pass over the taken ones
+        self.conn.execute("INSERT OR IGNORE INTO documents (path, body) VALUES (?, '{}')", (file_path,))
+        taken = {record_id for record_id, in self.conn.execute("SELECT id FROM records WHERE path = ?", (file_path,))}
+        row = self.conn.execute("SELECT next_id FROM sequences WHERE path = ?", (file_path,)).fetchone()
+        next_id = row[0] if row is not None else first_free_id(taken)
+        added = []
+        for record in records:
+            record = dict(record)
+            if not record.get("id"):
+                while str(next_id) in taken:
+                    next_id += 1
+                record["id"] = str(next_id)
+                next_id += 1
+            taken.add(str(record["id"]))
+            added.append(record)
+        self.conn.executemany(
+            "INSERT INTO records (path, id, body) VALUES (?, ?, ?)",
+            [(file_path, record["id"], json.dumps(record)) for record in added])
+        self.conn.execute("INSERT OR REPLACE INTO sequences (path, next_id) VALUES (?, ?)", (file_path, next_id))
+        return added
+
+    def _allocate_id(self, file_path):
+        # The sequence row outlives whole-collection saves, so ids are never reused
+        row = self.conn.execute("SELECT next_id FROM sequences WHERE path = ?", (file_path,)).fetchone()
+        ids = [record_id for record_id, in self.conn.execute(
+            "SELECT id FROM records WHERE path = ?", (file_path,))] if row is None else []
+        next_id = row[0] if row is not None else first_free_id(ids)
+        while self.conn.execute(
+                "SELECT 1 FROM records WHERE path = ? AND id = ?", (file_path, str(next_id))).fetchone():
+            next_id += 1
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sequences (path, next_id) VALUES (?, ?)", (file_path, next_id + 1))
+        return str(next_id)
+
+    def _update_by_id(self, file_path, record_id, updated_data):
+        row = self.conn.execute(
+            "SELECT seq, body FROM records WHERE path = ? AND id = ? ORDER BY seq LIMIT 1",
+            (file_path, record_id)).fetchone()
+        if row is None:
+            return None
+        record = json.loads(row[1])
+        record.update(updated_data)
+        self.conn.execute("UPDATE records SET body = ? WHERE seq = ?", (json.dumps(record), row[0]))
+        return record
+
+    def _remove_by_ids(self, file_path, record_ids):
+        ids = list(map(str, record_ids))
+        placeholders = ", ".join("?" * len(ids))
+        rows = self.conn.execute(
+            f"SELECT body FROM records WHERE path = ? AND id IN ({placeholders}) ORDER BY seq", (file_path, *ids)).fetchall()
+        self.conn.execute(f"DELETE FROM records WHERE path = ? AND id IN ({placeholders})", (file_path, *ids))
+        return [json.loads(row[0]) for row in rows]
+
+    def _purge(self, directory):
+        prefix = f"{directory}/"
+        for table in ("documents", "images"):
+            self.conn.execute(f"DELETE FROM {table} WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+
+    def _put_image(self, image_path, image_data):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO images (path, data) VALUES (?, ?)", (image_path, bytes(image_data)))
+        return image_path
+
+    def _put_document(self, file_path, data):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO documents (path, body) VALUES (?, ?)", (file_path, json.dumps(data)))
+
+
+def json_path(field):
+    # SQLite JSON path of a top-level field, whatever characters its name has
+    return '$."%s"' % field.replace('"', '\\"')
+
+
+def retry_after(error):
+    # Seconds GitHub asks us to wait, None when the error is not a rate limit
+    if not isinstance(error, GithubException) or error.status not in (403, 429):
+        return None
+    headers = {key.lower(): value for key, value in (error.headers or {}).items()}
+    if "retry-after" in headers:
+        return float(headers["retry-after"])
+    if headers.get("x-ratelimit-remaining") == "0" and "x-ratelimit-reset" in headers:
+        return max(0.0, float(headers["x-ratelimit-reset"]) - time.time()) + 1
+    if isinstance(error, RateLimitExceededException) or "rate limit" in str(error).lower():
+        return 60.0
+    return None
+
+
+def overlay(data, op):
+    # Applies a queued write to a document being read. Appended records keep
+    # the id they were queued with (empty until the remote store allocates one).
+    if op[0] == "save":
+        data.clear()
+        data.update(copy.deepcopy(op[2]))
+        data.pop("_meta", None)
+        return None
+    records = data.setdefault(COLLECTIONS[op[1]], [])
+    if op[0] == "append":
+        records.append(dict(op[2]))
+        return records[-1]
+    if op[0] == "extend":
+        records.extend(dict(record) for record in op[2])
+        return records[len(records) - len(op[2]):]
+    if op[0] == "remove":
+        ids = set(map(str, op[2]))
+        removed = [record for record in records if str(record.get("id")) in ids]
+        records[:] = [record for record in records if str(record.get("id")) not in ids]
+        return removed
+    for record in records:
+        if str(record.get("id")) == str(op[2]):
+            record.update(op[3])
+            return record
+    return None
+
+
+class OutboxBackend(StorageBackend):
+    # Write-behind journal in front of a remote backend. Every write is first
+    # committed to a local SQLite file and returns at once; a background
+    # thread drains the journal to the remote store in batches, one remote
+    # commit per batch, backing off while the remote is unreachable or rate
+    # limited. Reads merge the queued writes over the remote data (or over the
+    # last copy read, when the remote cannot be reached), so queued records
+    # show up immediately. Queued records get a provisional id
+    # ("queued-<seq>-<number>") that later writes may refer to; it is replaced
+    # by the remote's id when the record is flushed. Each batch commit names
+    # its transactions in an "Outbox-Seq:" trailer, so a batch whose send
+    # failed after it landed is not written twice.
+
+    def __init__(self, remote, path, batch_size=OUTBOX_BATCH):
+        self.remote = remote
+        self.repo = getattr(remote, "repo", None)
+        self.batch_size = batch_size
+        # Several processes may share the file; each claims the batch it flushes
+        self.owner = uuid.uuid4().hex
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        # Held while a batch lands, from its remote commit until it leaves the
+        # queue, so a read never finds its writes in both places or in neither
+        self.landing = threading.Lock()
+        self.wakeup = threading.Event()
+        self.last_loaded = {}  # file_path -> last document read from the remote
+        # file_path -> (remote version after our last flush, version before it):
+        # a flush moves writes the listeners already have, which is no change
+        self.aliases = {}
+        self.written = {}  # file_path -> newest seq ever queued for it
+        # Set on the thread sending a batch: the remote's notifications for it
+        # repeat writes the listeners were told about when they were queued
+        self.sending = threading.local()
+        remote.subscribe(self._on_remote_write)
+        with self.lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    message TEXT NOT NULL,
+                    ops TEXT NOT NULL,
+                    owner TEXT,
+                    claimed_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT NOT NULL DEFAULT ''
+                );
+                CREATE TABLE IF NOT EXISTS outbox_paths (seq INTEGER NOT NULL, path TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS outbox_paths_path ON outbox_paths (path, seq);
+                CREATE TABLE IF NOT EXISTS outbox_images (seq INTEGER NOT NULL, path TEXT NOT NULL, data BLOB NOT NULL);
+                CREATE INDEX IF NOT EXISTS outbox_images_path ON outbox_images (path, seq);
+                CREATE TABLE IF NOT EXISTS outbox_dead (
+                    seq INTEGER PRIMARY KEY,
+                    message TEXT NOT NULL,
+                    ops TEXT NOT NULL,
+                    error TEXT NOT NULL,
+                    failed_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS outbox_ids (provisional TEXT PRIMARY KEY, id TEXT NOT NULL, mapped_at REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS outbox_journal (id TEXT NOT NULL);
+            """)
+            # Names this journal in commit trailers; seqs are only unique within it
+            if self.conn.execute("SELECT COUNT(*) FROM outbox_journal").fetchone()[0] == 0:
+                self.conn.execute("INSERT INTO outbox_journal (id) VALUES (?)", (uuid.uuid4().hex,))
+            self.journal, = self.conn.execute("SELECT id FROM outbox_journal").fetchone()
+        threading.Thread(target=self._flush_forever, name="outbox-flusher", daemon=True).start()
+
+    def load(self, file_path):
+        with self.landing:
+            return self._merge(file_path, self._read_remote(file_path))
+
+    def iter_records(self, file_path):
+        # The remote's records as it streams them (shard by shard), with the
+        # queued writes applied on the way. The flusher waits until the
+        # stream is consumed, so no batch lands in the middle of it.
+        with self.landing:
+            pending = self._pending(file_path)
+            if pending is None:
+                data = self._merge(file_path, self._read_remote(file_path)) or default_data(file_path)
+                yield from data[COLLECTIONS[file_path]]
+                return
+            appended, changes, removed = pending
+            try:
+                records = self.remote.iter_records(file_path)
+                first = list(itertools.islice(records, 1))
+            except Exception:
+                records = (self.last_loaded.get(file_path) or default_data(file_path))[COLLECTIONS[file_path]]
+                first = []
+            yield from self._overlaid(itertools.chain(first, records), changes, removed)
+            yield from appended
+
+    def query(self, file_path, filters=None, date_from=None, date_to=None, sort=None, descending=False,
+              offset=0, limit=None):
+        # The remote answers, filters pushed down and shards pruned; the queued
+        # writes are applied to its page. Records they edit or remove are
+        # fetched by id and placed again, so the page is read as many records
+        # deeper as there are of them.
+        with self.landing:
+            pending = self._pending(file_path)
+            if pending is not None:
+                try:
+                    return self._query_remote(file_path, pending, filters, date_from, date_to, sort, descending,
+                                              offset, limit)
+                except Exception:
+                    pass
+        # A queued save replaces the whole document, or the remote cannot be reached
+        return super().query(file_path, filters, date_from, date_to, sort, descending, offset, limit)
+
+    def distinct(self, file_path, field):
+        # The remote's values and those of the queued records; a value only
+        # removed or edited records had is listed until they are flushed
+        with self.landing:
+            pending = self._pending(file_path)
+            try:
+                values = None if pending is None else set(self.remote.distinct(file_path, field))
+            except Exception:
+                values = None
+        if values is None:
+            return super().distinct(file_path, field)
+        appended, changes, _ = pending
+        values.update(str(fields[field]) for fields in [*appended, *changes.values()]
+                      if fields.get(field) not in (None, ""))
+        return sorted(values)
+
+    def load_snapshot(self, file_paths, max_workers=4):
+        file_paths = list(file_paths)
+        with self.landing:
+            try:
+                snapshot = self.remote.load_snapshot(file_paths, max_workers)
+            except Exception:
+                snapshot = None
+            if snapshot is not None:
+                self.last_loaded.update(snapshot)
+                return {file_path: self._merge(file_path, data) for file_path, data in snapshot.items()}
+        return super().load_snapshot(file_paths, max_workers)
+
+    def save(self, file_path, data):
+        self.commit([("save", file_path, data)], f"Update {file_path}")
+
+    def append(self, file_path, record):
+        return self.commit([("append", file_path, record)], f"Add record to {file_path}")[0]
+
+    def update_by_id(self, file_path, record_id, updated_data):
+        return self.commit([("update", file_path, record_id, updated_data)], f"Update record {record_id}")[0]
+
+    def extend(self, file_path, records):
+        return self.commit([("extend", file_path, list(records))], f"Import into {file_path}")[0]
+
+    def remove_by_ids(self, file_path, record_ids):
+        return self.commit([("remove", file_path, list(record_ids))], f"Remove records from {file_path}")[0]
+
+    def put_image(self, image_path, image_data):
+        return self.commit([("image", image_path, image_data)], f"Upload {image_path}")[0]
+
+    def get_image(self, image_path):
+        queued = self._queued_image(image_path)
+        return queued if queued is not None else self.remote.get_image(image_path)
+
+    def image_exists(self, image_path):
+        if self._queued_image(image_path) is not None:
+            return True
+        try:
+            return self.remote.image_exists(image_path)
+        except Exception:
+            return False
+
+    def image_version(self, image_path):
+        try:
+            return self.remote.image_version(image_path)
+        except Exception:
+            return None
+
+    def clear_images(self):
+        self.delete_directory("images")
+
+    def delete_directory(self, directory):
+        self.commit([("purge", directory)], f"Delete {directory}")
+
+    def archive(self, name):
+        # The snapshot must include what is still queued: it is queued after
+        # it, and the flusher tags the remote once the writes before it landed
+        if self.pending_writes()[0] == 0:
+            return self.remote.archive(name)
+        self.commit([("archive", name)], f"Archive as {name}")
+        return f"{name} (once the queued changes are sent)"
+
+    def sync(self, max_age=0):
+        # Changes made by other writers reach the listeners through
+        # _on_remote_write
+        try:
+            return self.remote.sync(max_age)
+        except Exception:
+            return []
+
+    def _on_remote_write(self, kind, file_path, record):
+        # While a batch is sent only rebuilds pass: records removed or imported
+        # in bulk, or a file another writer changed underneath the batch
+        if kind == "save" or not getattr(self.sending, "active", False):
+            self._emit(kind, file_path, record)
+
+    def version(self, file_path):
+        # Changes with every write queued and with the remote, but not when a
+        # batch lands: reads show the same records before and after
+        remote = self._remote_version(file_path)
+        with self.lock:
+            queued = self.conn.execute("SELECT MAX(seq) FROM outbox_paths WHERE path = ?", (file_path,)).fetchone()[0]
+            self.written[file_path] = max(self.written.get(file_path, 0), queued or 0)
+            return f"{remote}+{self.written[file_path]}"
+
+    def _remote_version(self, file_path):
+        try:
+            remote = self.remote.version(file_path)
+        except Exception:
+            return "offline"
+        alias = self.aliases.get(file_path)
+        return alias[1] if alias and alias[0] == remote else remote
+
+    def commit(self, ops, message):
+        # References to queued records that were flushed meanwhile use their real id
+        stored = json.dumps([list(op[:2]) if op[0] == "image" else list(op) for op in ops])
+        resolved = self._resolve(stored)
+        if resolved != stored:
+            ops = [op if op[0] == "image" else tuple(body) for op, body in zip(ops, json.loads(resolved))]
+        with self.lock, self.conn:
+            seq = self.conn.execute("INSERT INTO outbox (message, ops) VALUES (?, '[]')", (message,)).lastrowid
+            numbers = itertools.count()
+
+            def provisional(record):
+                return dict(record) if record.get("id") else {**record, "id": f"queued-{seq}-{next(numbers)}"}
+
+            ops = [(op[0], op[1], provisional(op[2])) if op[0] == "append" else
+                   (op[0], op[1], [provisional(record) for record in op[2]]) if op[0] == "extend" else op for op in ops]
+            self.conn.execute("UPDATE outbox SET ops = ? WHERE seq = ?", (
+                json.dumps([list(op[:2]) if op[0] == "image" else list(op) for op in ops]), seq))
+            self.conn.executemany("INSERT INTO outbox_paths (seq, path) VALUES (?, ?)", self._paths(seq, ops))
+            self.conn.executemany(
+                "INSERT INTO outbox_images (seq, path, data) VALUES (?, ?, ?)",
+                [(seq, op[1], op[2].encode() if isinstance(op[2], str) else bytes(op[2])) for op in ops if op[0] == "image"])
+        results = []
+        for op in ops:
+            if op[0] == "image":
+                results.append(op[1])
+            elif op[0] == "update":
+                # The updated record as it will read once the write lands
+                results.append(self._record(op[1], op[2]))
+            elif op[0] in ("append", "extend"):
+                results.append(copy.deepcopy(op[2]))
+            else:
+                results.append(None)
+        self._notify(ops, results)
+        self.wakeup.set()
+        return results
+
+    def pending_writes(self):
+        # (queued transactions, error of the last failed flush)
+        with self.lock:
+            count, = self.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()
+            error = self.conn.execute("SELECT error FROM outbox WHERE error != '' ORDER BY seq LIMIT 1").fetchone()
+        return count, error[0] if error else ""
+
+    def dead_letters(self):
+        # [(seq, message, error)] of the transactions set aside as rejected
+        with self.lock:
+            return self.conn.execute("SELECT seq, message, error FROM outbox_dead ORDER BY seq").fetchall()
+
+    def requeue_dead_letters(self):
+        # Queues the set-aside transactions again, in their original order
+        with self.lock, self.conn:
+            rows = self.conn.execute("SELECT seq, message, ops FROM outbox_dead ORDER BY seq").fetchall()
+            for seq, message, body in rows:
+                self.conn.execute("INSERT INTO outbox (seq, message, ops) VALUES (?, ?, ?)", (seq, message, body))
+                self.conn.executemany("INSERT INTO outbox_paths (seq, path) VALUES (?, ?)", self._paths(seq, json.loads(body)))
+            self.conn.execute("DELETE FROM outbox_dead")
+        for file_path in sorted({path for seq, _, body in rows for _, path in self._paths(seq, json.loads(body))} & set(COLLECTIONS)):
+            self._emit("save", file_path, None)
+        self.wakeup.set()
+        return len(rows)
+
+    def drain(self):
+        # Flushes everything queued now; raises if the remote rejects a batch
+        with self.flush_lock:
+            while self._flush_batch():
+                pass
+
+    def _read_remote(self, file_path):
+        # The remote's document, or the last copy read when it cannot be reached
+        try:
+            data = self.remote.load(file_path)
+            self.last_loaded[file_path] = data
+        except Exception:
+            data = self.last_loaded.get(file_path)
+        return data
+
+    def _pending(self, file_path):
+        # The queued writes to a collection folded into what a read applies to
+        # the remote's records: (appended records, id -> edited fields, removed
+        # ids), or None when a queued save replaces the whole document
+        appended, changes, removed = [], {}, set()
+        for op in self._queued_ops(file_path):
+            if op[0] == "save":
+                return None
+            if op[0] in ("append", "extend"):
+                appended.extend(dict(record) for record in ([op[2]] if op[0] == "append" else op[2]))
+            elif op[0] == "remove":
+                ids = set(map(str, op[2]))
+                appended = [record for record in appended if str(record.get("id")) not in ids]
+                removed |= ids
+            else:
+                record = next((record for record in appended if str(record.get("id")) == str(op[2])), None)
+                if record is not None:
+                    record.update(op[3])
+                else:
+                    changes.setdefault(str(op[2]), {}).update(op[3])
+        return appended, changes, removed
+
+    def _overlaid(self, records, changes, removed):
+        for record in records:
+            record_id = str(record.get("id"))
+            if record_id not in removed:
+                yield {**record, **changes[record_id]} if record_id in changes else record
+
+    def _query_remote(self, file_path, pending, filters, date_from, date_to, sort, descending, offset, limit):
+        appended, changes, removed = pending
+        if not (appended or changes or removed):
+            return self.remote.query(file_path, filters, date_from, date_to, sort, descending, offset, limit)
+        match = record_matcher(file_path, filters, date_from, date_to)
+        touched = sorted(changes.keys() | removed)
+        before = []
+        if touched:
+            # Edits that leave the date alone cannot move a record into the range
+            moved = any(DATE_FIELDS.get(file_path, "Date") in fields for fields in changes.values())
+            _, before = self.remote.query(file_path, {"id": touched}, *((None, None) if moved else (date_from, date_to)))
+        counted = {str(record.get("id")) for record in before if match(record)}
+        after = {str(record.get("id")): record for record in self._overlaid(before, changes, removed) if match(record)}
+        extras = [record for record in appended if match(record)]
+        if sort:
+            # Edited records take their place by the sort key, like appended ones
+            extras = sorted([*after.values(), *extras], key=lambda record: sort_key(record.get(sort)), reverse=descending)
+            start = 0 if touched else max(0, offset - len(extras))
+        else:
+            # Edited records keep their place, appended ones come last
+            extras = [*(record for record_id, record in after.items() if record_id not in counted), *extras]
+            start = 0 if touched else offset
+        total, window = self.remote.query(file_path, filters, date_from, date_to, sort, descending, start,
+                                          None if limit is None else offset + limit + len(touched) - start)
+        end = None if limit is None else offset + limit
+        if sort:
+            kept = [record for record in window if str(record.get("id")) not in touched]
+            merged = heapq.merge(kept, extras, key=lambda record: sort_key(record.get(sort)), reverse=descending)
+            records = list(itertools.islice(merged, offset - start, None if end is None else end - start))
+            return total - len(counted) + len(extras), records
+        kept = [after.get(str(record.get("id"))) if str(record.get("id")) in touched else record for record in window]
+        kept = [record for record in kept if record is not None]
+        stored = total - len(counted - after.keys())
+        records = kept[offset - start:None if end is None else end - start]
+        records += extras[max(0, offset - stored):None if end is None else max(0, end - stored)]
+        return stored + len(extras), records
+
+    def _merge(self, file_path, data):
+        queued = self._queued_ops(file_path)
+        if not queued:
+            return data
+        data = copy.deepcopy(data) if data is not None else default_data(file_path)
+        for op in queued:
+            overlay(data, op)
+        return data
+
+    def _record(self, file_path, record_id):
+        # A record as reads show it, from the last copy read from the remote and
+        # the queued writes; the submit path never waits on the remote
+        record_id = str(record_id)
+        records = (self.last_loaded.get(file_path) or default_data(file_path)).get(COLLECTIONS[file_path], [])
+        records = [dict(record) for record in records if str(record.get("id")) == record_id]
+        if not records and not record_id.startswith("queued-"):
+            # Not read in full yet (pages and streams skip last_loaded); the
+            # remote serves it from its cache
+            try:
+                records = self.remote.query(file_path, {"id": [record_id]})[1]
+            except Exception:
+                pass
+        data = {COLLECTIONS[file_path]: records}
+        for op in self._queued_ops(file_path):
+            overlay(data, op)
+        return next((record for record in data[COLLECTIONS[file_path]] if str(record.get("id")) == record_id), None)
+
+    def _queued_ops(self, file_path):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT ops FROM outbox WHERE seq IN (SELECT seq FROM outbox_paths WHERE path = ?) ORDER BY seq",
+                (file_path,)).fetchall()
+        return [op for row in rows for op in json.loads(row[0]) if op[0] != "purge" and op[1] == file_path]
+
+    def _queued_image(self, image_path):
+        # Latest queued bytes of the image, unless a later purge removes them
+        parts = image_path.split("/")
+        directories = [f"{'/'.join(parts[:end])}/" for end in range(1, len(parts))]
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT seq, data FROM outbox_images WHERE path = ? ORDER BY seq DESC LIMIT 1", (image_path,)).fetchone()
+            if row is None:
+                return None
+            purged = self.conn.execute(
+                f"SELECT 1 FROM outbox_paths WHERE seq >= ? AND path IN ({', '.join('?' * len(directories))})",
+                (row[0], *directories)).fetchone() if directories else None
+        return None if purged else row[1]
+
+    def _paths(self, seq, ops):
+        # A purge is recorded as "<directory>/" so it never matches a file
+        return [(seq, f"{op[1]}/" if op[0] == "purge" else op[1]) for op in ops if op[0] not in ("image", "archive")]
+
+    def _resolve(self, body, seq=None):
+        # Replaces, in serialized ops, the provisional ids of flushed records
+        # with their real ones; ids the transaction seq creates are kept
+        provisional = {match.group(1) for match in PROVISIONAL.finditer(body) if match.group(2) != str(seq)}
+        if not provisional:
+            return body
+        with self.lock:
+            ids = dict(self.conn.execute(
+                f"SELECT provisional, id FROM outbox_ids WHERE provisional IN ({', '.join('?' * len(provisional))})",
+                list(provisional)).fetchall())
+        return PROVISIONAL.sub(lambda match: json.dumps(ids.get(match.group(1), match.group(1))), body)
+
+    def _batch(self, rows):
+        # The oldest transaction alone when it failed before, so a rejected one
+        # is found; otherwise up to the first transaction referring to a record
+        # queued earlier in the batch, which needs that record's real id
+        if rows[0][5]:
+            return rows[:1]
+        batch = []
+        for row in rows:
+            # An archive goes alone, between the writes around it
+            if any(op[0] == "archive" for op in json.loads(row[2])):
+                return batch or [row]
+            referenced = {int(match.group(2)) for match in PROVISIONAL.finditer(row[2])} - {row[0]}
+            if batch and referenced & {seq for seq, *_ in batch}:
+                break
+            batch.append(row)
+        return batch
+
+    def _landed(self, rows):
+        # The seqs of rows that a commit made since they were last sent carries
+        prefix = f"Outbox-Seq: {self.journal} "
+        since = min(claimed_at or 0 for _, _, _, _, claimed_at, _ in rows) - OUTBOX_CLOCK_SKEW
+        landed = set()
+        for message in self.remote.recent_messages(since, OUTBOX_REPLAY_DEPTH):
+            for line in message.splitlines():
+                if line.startswith(prefix):
+                    landed.update(int(seq) for seq in line[len(prefix):].split(","))
+        return landed & {row[0] for row in rows}
+
+    def _recover_ids(self, rows):
+        # Real ids of the records created by transactions that landed without
+        # their results coming back, found by content
+        wanted = {}  # file_path -> {provisional id: record without its id}
+        for seq, _, body, *_ in rows:
+            for op in json.loads(self._resolve(body, seq)):
+                for record in ([op[2]] if op[0] == "append" else op[2] if op[0] == "extend" else []):
+                    if str(record.get("id")).startswith(f"queued-{seq}-"):
+                        wanted.setdefault(op[1], {})[record["id"]] = {k: v for k, v in record.items() if k != "id"}
+        if not wanted:
+            return {}
+        ids = {}
+        for file_path, data in self.remote.load_snapshot(sorted(wanted)).items():
+            for stored in (data or default_data(file_path))[COLLECTIONS[file_path]]:
+                fields = {k: v for k, v in stored.items() if k != "id"}
+                for provisional, record in wanted[file_path].items():
+                    if fields == record:
+                        ids[provisional] = str(stored["id"])
+        return ids
+
+    def _flush_batch(self):
+        # Writes the oldest queued transactions to the remote as one commit and
+        # returns how many left the queue. Batches are taken strictly in order:
+        # nothing is claimed while an older transaction belongs to another
+        # process that is still flushing it. A transaction the remote keeps
+        # rejecting is set aside after OUTBOX_MAX_ATTEMPTS so the rest can go.
+        now = time.time()
+        with self.lock, self.conn:
+            rows = self.conn.execute(
+                "SELECT seq, message, ops, owner, claimed_at, attempts FROM outbox ORDER BY seq LIMIT ?",
+                (self.batch_size,)).fetchall()
+            if not rows or any(owner not in (None, self.owner) and claimed_at > now - OUTBOX_CLAIM_TIMEOUT
+                               for _, _, _, owner, claimed_at, _ in rows):
+                return 0
+            rows = self._batch(rows)
+            self.conn.executemany(
+                "UPDATE outbox SET owner = ?, claimed_at = ? WHERE seq = ?", [(self.owner, now, row[0]) for row in rows])
+            images = {}
+            for seq, path, data in self.conn.execute(
+                    f"SELECT seq, path, data FROM outbox_images WHERE seq IN ({', '.join('?' * len(rows))})",
+                    [row[0] for row in rows]):
+                images[seq, path] = data
+        ops = []
+        created = []  # (provisional id, op position, record position or None)
+        for seq, _, body, _, _, _ in rows:
+            for op in json.loads(self._resolve(body, seq)):
+                if op[0] == "image":
+                    op = ("image", op[1], images[seq, op[1]])
+                for number, record in enumerate([op[2]] if op[0] == "append" else op[2] if op[0] == "extend" else []):
+                    if str(record.get("id")).startswith(f"queued-{seq}-"):
+                        # The remote allocates the real id
+                        created.append((record["id"], len(ops), None if op[0] == "append" else number))
+                        record["id"] = ""
+                ops.append(tuple(op))
+        message = rows[0][1] if len(rows) == 1 else f"{rows[0][1]} and {len(rows) - 1} more queued changes"
+        message = f"{message}\n\nOutbox-Seq: {self.journal} {','.join(str(row[0]) for row in rows)}"
+        files = sorted({op[1] for op in ops if op[0] != "purge" and op[1] in COLLECTIONS})
+        with self.landing:
+            before = {file_path: self._remote_version(file_path) for file_path in files}
+            try:
+                # A batch sent before, or claimed by a process that died, may
+                # have landed even though no result came back
+                landed = set()
+                if any(owner is not None or attempts for _, _, _, owner, _, attempts in rows):
+                    landed = self._landed(rows)
+                if landed:
+                    rows = [row for row in rows if row[0] in landed]
+                    ids = self._recover_ids(rows)
+                    logging.warning("Outbox transactions %s had already landed, not sent again", sorted(landed))
+                else:
+                    self.sending.active = True
+                    try:
+                        if ops and ops[0][0] == "archive":
+                            results = [self.remote.archive(ops[0][1])]
+                            logging.info("Outbox archived the remote as %s", results[0])
+                        else:
+                            results = self.remote.commit(ops, message)
+                    finally:
+                        self.sending.active = False
+                    ids = {provisional: str(results[position]["id"] if number is None else results[position][number]["id"])
+                           for provisional, position, number in created}
+                    for file_path in files:
+                        try:
+                            self.aliases[file_path] = (self.remote.version(file_path), before[file_path])
+                        except Exception:
+                            pass
+            except Exception as e:
+                self._failed(rows, e)
+                if not (isinstance(e, GithubException) and e.status in REJECTED_STATUSES and not is_conflict(e)
+                        and len(rows) == 1 and rows[0][5] + 1 >= OUTBOX_MAX_ATTEMPTS):
+                    raise
+                self._set_aside(rows[0], e)
+                return 1
+            # Later writes return records from the copies read last, which must
+            # hold what just landed; the commit left the remote's cache current
+            for file_path in files:
+                if file_path in self.last_loaded:
+                    try:
+                        self.last_loaded[file_path] = self.remote.load(file_path)
+                    except Exception:
+                        pass
+            seqs = [(row[0],) for row in rows]
+            with self.lock, self.conn:
+                for table in ("outbox", "outbox_paths", "outbox_images"):
+                    self.conn.executemany(f"DELETE FROM {table} WHERE seq = ?", seqs)
+                # Claimed rows that had not landed go back to the queue as they were
+                self.conn.execute("UPDATE outbox SET owner = NULL WHERE owner = ?", (self.owner,))
+                self.conn.executemany("INSERT OR REPLACE INTO outbox_ids (provisional, id, mapped_at) VALUES (?, ?, ?)",
+                                      [(provisional, record_id, now) for provisional, record_id in ids.items()])
+                self.conn.execute("DELETE FROM outbox_ids WHERE mapped_at < ?", (now - OUTBOX_ID_TTL,))
+        # The listeners saw these writes when they were queued; only the ids
+        # the remote allocated are new. Records imported in bulk are reread:
+        # the remote announced them, unless the batch had landed before.
+        for file_path in sorted({ops[position][1] for provisional, position, number in created
+                                 if number is not None and provisional in ids and landed}):
+            self._emit("save", file_path, None)
+        for provisional, position, number in created:
+            if number is None and provisional in ids:
+                self._emit("rename", ops[position][1], (provisional, ids[provisional]))
+        return len(rows)
+
+    def _failed(self, rows, error):
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "UPDATE outbox SET owner = NULL, attempts = attempts + 1, error = ? WHERE seq = ?",
+                [(str(error), row[0]) for row in rows])
+
+    def _set_aside(self, row, error):
+        # Moves a rejected transaction to outbox_dead; its images stay so it can
+        # be queued again (requeue_dead_letters)
+        logging.error("Outbox transaction %s (%s) rejected %d times, set aside: %s",
+                      row[0], row[1], row[5] + 1, error)
+        with self.lock, self.conn:
+            self.conn.execute("INSERT INTO outbox_dead (seq, message, ops, error, failed_at) VALUES (?, ?, ?, ?, ?)",
+                              (row[0], row[1], row[2], str(error), time.time()))
+            for table in ("outbox", "outbox_paths"):
+                self.conn.execute(f"DELETE FROM {table} WHERE seq = ?", (row[0],))
+        # Reads no longer show its writes
+        for file_path in sorted({path for _, path in self._paths(row[0], json.loads(row[2]))} & set(COLLECTIONS)):
+            self._emit("save", file_path, None)
+
+    def _flush_forever(self):
+        delay = 0
+        while True:
+            if delay:
+                time.sleep(delay)
+            else:
+                self.wakeup.wait(OUTBOX_IDLE_CHECK)
+            self.wakeup.clear()
+            try:
+                self.drain()
+                delay = 0
+            except Exception as e:
+                wait = retry_after(e)
+                delay = wait if wait is not None else min(OUTBOX_MAX_DELAY, max(OUTBOX_MIN_DELAY, delay * 2))
+                logging.warning("Outbox flush failed, retrying in %.0fs: %s", delay, e)
+
+
+def get_backend(secrets):
+    # STORAGE_BACKEND = "github" (default) or "sqlite"
+    engine = secrets.get("STORAGE_BACKEND", "github")
+    if engine == "sqlite":
+        return SQLiteBackend(secrets.get("SQLITE_PATH", "facility.db"))
+    if engine == "github":
+        # lazy: starting up must not need the network when the outbox is in front
+        github_client = Github(secrets["GITHUB_TOKEN"])
+        metrics.watch_rate_limit(github_client)
+        repo = InstrumentedRepo(github_client.get_repo(secrets["REPO_NAME"], lazy=True), metrics)
+        backend = GithubBackend(repo, document_cache(secrets["REPO_NAME"], secrets.get("CACHE_TTL", 15)),
+                                secrets.get("STORAGE_LAYOUT", "single"), secrets.get("STORAGE_FORMAT", "json"))
+        # Writes are journaled locally first unless OUTBOX_PATH is set to ""
+        outbox_path = secrets.get("OUTBOX_PATH", "outbox.db")
+        return OutboxBackend(backend, outbox_path) if outbox_path else backend
+    raise ValueError(f"Unknown storage backend: {engine}")
@@ -0,0 +1,66 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SubmissionQueue:
+    # Accepts submissions immediately and persists them on a thread pool. Each
+    # submission gets a ticket whose status (queued, running, done, failed),
+    # current step and progress can be polled from the page.
+
+    def __init__(self, max_workers=4, keep=500):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="submission")
+        self.jobs = OrderedDict()  # ticket -> status
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.tickets = itertools.count(1)
+
+    def submit(self, label, job, *args):
+        # job(progress, *args) runs in the background; progress(step, fraction)
+        # reports how far it got and its return value becomes the result
+        ticket = str(next(self.tickets))
+        with self.lock:
+            self.jobs[ticket] = {
+                "ticket": ticket,
+                "label": label,
+                "state": "queued",
+                "step": "Waiting",
+                "progress": 0.0,
+                "result": None,
+                "error": "",
+                "submitted": time.time(),
+            }
+            self._trim()
+        self.executor.submit(self._run, ticket, job, args)
+        return ticket
+
+    def status(self, ticket):
+        with self.lock:
+            status = self.jobs.get(ticket)
+            return None if status is None else dict(status)
+
+    def pending(self, tickets):
+        return [ticket for ticket in tickets
+                if (self.status(ticket) or {}).get("state") in ("queued", "running")]
+
+    def _run(self, ticket, job, args):
+        self._update(ticket, state="running", step="Started")
+        try:
+            result = job(lambda step, fraction: self._update(ticket, step=step, progress=fraction), *args)
+        except Exception as e:
+            self._update(ticket, state="failed", step="Failed", error=str(e))
+        else:
+            self._update(ticket, state="done", step="Saved", progress=1.0, result=result)
+
+    def _update(self, ticket, **changes):
+        with self.lock:
+            if ticket in self.jobs:
+                self.jobs[ticket].update(changes)
+
+    def _trim(self):
+        # Forget the oldest finished submissions beyond keep
+        finished = [ticket for ticket, status in self.jobs.items() if status["state"] in ("done", "failed")]
+        for ticket in finished[:max(0, len(self.jobs) - self.keep)]:
+            del self.jobs[ticket]
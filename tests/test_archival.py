@@ -0,0 +1,34 @@
+import pytest
+import storage
+from fake_github import FakeRepository
+
+WORK_ORDERS = "work order records.json"
+COMPLETED = "completed work order.json"
+
+
+def order(repaired=""):
+    return {"id": "", "Location": "Processing", "Date": "2026-03-02 10:00:00", "Actual Repair Date": repaired}
+
+
+@pytest.mark.parametrize("layout", ["single", "sharded"])
+def test_archive_then_create(layout):
+    backend = storage.GithubBackend(FakeRepository(), storage.DocumentCache(), layout)
+    orders = backend.extend(WORK_ORDERS, [order(), order("2026-03-03 00:00:00"), order("2026-03-04 00:00:00")])
+    backend.append(COMPLETED, order("2026-03-01 00:00:00"))
+    # Staged the way archive_closed_work_orders stages it
+    with backend.transaction("Archive 2 closed work orders") as tx:
+        for closed in orders[1:]:
+            tx.append(COMPLETED, {**closed, "id": "", "Work Order ID": closed["id"]})
+        tx.remove_by_ids(WORK_ORDERS, [closed["id"] for closed in orders[1:]])
+    assert backend.append(WORK_ORDERS, order())["id"] == "4"
+    backend.append(COMPLETED, order("2026-03-05 00:00:00"))
+    completed = list(backend.iter_records(COMPLETED))
+    assert [record["id"] for record in completed] == ["1", "2", "3", "4"]
+    assert [record.get("Work Order ID") for record in completed] == [None, "2", "3", None]
+
+
+def test_explicit_ids_move_the_allocator_past_them():
+    backend = storage.GithubBackend(FakeRepository(), storage.DocumentCache())
+    backend.append(COMPLETED, {**order(), "id": "7"})
+    backend.remove_by_ids(COMPLETED, ["7"])
+    assert backend.append(COMPLETED, order())["id"] == "8"
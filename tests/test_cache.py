@@ -0,0 +1,52 @@
+import storage
+from fake_github import FakeRepository
+
+WORK_ORDERS = "work order records.json"
+
+
+def order(location="Processing"):
+    return {"id": "", "Location": location, "Date": "2026-03-02 10:00:00"}
+
+
+def test_unchanged_file_is_not_downloaded_again():
+    repo = FakeRepository()
+    storage.GithubBackend(repo, storage.DocumentCache()).append(WORK_ORDERS, order())
+    # ttl=0: every read lists the directory again
+    reader = storage.GithubBackend(repo, storage.DocumentCache(ttl=0))
+    assert len(reader.load(WORK_ORDERS)["records"]) == 1
+    blobs, listings = repo.calls["get_git_blob"], repo.calls["get_contents"]
+    assert len(reader.load(WORK_ORDERS)["records"]) == 1
+    assert repo.calls["get_git_blob"] == blobs
+    assert repo.calls["get_contents"] == listings + 1
+
+
+def test_changed_file_is_downloaded_once():
+    repo = FakeRepository()
+    writer = storage.GithubBackend(repo, storage.DocumentCache())
+    writer.append(WORK_ORDERS, order())
+    reader = storage.GithubBackend(repo, storage.DocumentCache(ttl=0))
+    reader.load(WORK_ORDERS)
+    writer.append(WORK_ORDERS, order("Warehouse"))
+    blobs = repo.calls["get_git_blob"]
+    assert [record["Location"] for record in reader.load(WORK_ORDERS)["records"]] == ["Processing", "Warehouse"]
+    reader.load(WORK_ORDERS)
+    assert repo.calls["get_git_blob"] == blobs + 1
+
+
+def test_fresh_listing_answers_without_any_call():
+    repo = FakeRepository()
+    storage.GithubBackend(repo, storage.DocumentCache()).append(WORK_ORDERS, order())
+    reader = storage.GithubBackend(repo, storage.DocumentCache(ttl=60))
+    reader.load(WORK_ORDERS)
+    calls = sum(repo.calls.values())
+    reader.load(WORK_ORDERS)
+    assert reader.version(WORK_ORDERS) == storage.git_blob_sha(repo._files()[WORK_ORDERS])
+    assert sum(repo.calls.values()) == calls
+
+
+def test_cached_copies_are_not_shared_with_callers():
+    cache = storage.DocumentCache()
+    cache.put(WORK_ORDERS, {"records": [order()]}, "abc")
+    cache.get(WORK_ORDERS, "abc")["records"].clear()
+    assert cache.get(WORK_ORDERS, "abc")["records"] == [order()]
+    assert cache.get(WORK_ORDERS, "def") is None
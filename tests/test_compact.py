@@ -0,0 +1,48 @@
+import gzip
+import json
+import pytest
+import storage
+from fake_github import FakeRepository
+
+WORK_ORDERS = "work order records.json"
+
+
+def test_table_round_trips_ragged_records():
+    records = [{"id": "1", "Location": "Processing", "Rating": 2},
+               {"id": "2", "Comment": None},
+               {}]
+    assert storage.from_table(storage.to_table(records)) == records
+
+
+def test_compact_file_round_trips():
+    data = {"records": [{"id": "1", "Location": "Processing"}, {"id": "2", "Rating": "N/A"}]}
+    body = storage.encode_file(WORK_ORDERS, data, compact=True)
+    assert body[:2] == storage.GZIP_MAGIC
+    # Same content, same bytes, so the blob SHA is stable
+    assert storage.encode_file(WORK_ORDERS, data, compact=True) == body
+    assert storage.decode_file(WORK_ORDERS, body) == data
+
+
+def test_compact_file_leaves_out_the_id_index():
+    data = {"records": [{"id": "1"}]}
+    storage.collection_meta(data, WORK_ORDERS)
+    decoded = storage.decode_file(WORK_ORDERS, storage.encode_file(WORK_ORDERS, data, compact=True))
+    assert "index" not in decoded["_meta"]
+    assert storage.collection_meta(decoded, WORK_ORDERS)["index"] == {"1": 0}
+
+
+def test_unknown_version_is_refused():
+    body = gzip.compress(json.dumps({"format": storage.COMPACT_FORMAT, "version": 99}).encode())
+    with pytest.raises(ValueError):
+        storage.decode_file(WORK_ORDERS, body)
+
+
+def test_either_format_reads_the_other():
+    repo = FakeRepository()
+    plain = storage.GithubBackend(repo, storage.DocumentCache(), "single", "json")
+    plain.append(WORK_ORDERS, {"id": "", "Location": "Processing"})
+    compact = storage.GithubBackend(repo, storage.DocumentCache(), "single", "compact")
+    assert compact.append(WORK_ORDERS, {"id": "", "Location": "Warehouse"})["id"] == "2"
+    assert repo._files()[WORK_ORDERS][:2] == storage.GZIP_MAGIC
+    reader = storage.GithubBackend(repo, storage.DocumentCache(), "single", "json")
+    assert [record["Location"] for record in reader.iter_records(WORK_ORDERS)] == ["Processing", "Warehouse"]
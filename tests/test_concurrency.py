@@ -0,0 +1,63 @@
+import threading
+import pytest
+import storage
+from fake_github import FakeRepository
+from github import GithubException
+
+WORK_ORDERS = "work order records.json"
+
+
+def test_concurrent_sharded_appends_all_land():
+    repo = FakeRepository(latency=0.02)
+    errors = []
+
+    def writer(number):
+        # Each writer has its own backend and cache, like separate processes
+        backend = storage.GithubBackend(repo, storage.DocumentCache(), "sharded")
+        try:
+            backend.append(WORK_ORDERS, {"id": "", "Location": f"writer {number}", "Date": "2026-03-02 10:00:00"})
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(number,)) for number in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    records = list(storage.GithubBackend(repo, storage.DocumentCache(), "sharded").iter_records(WORK_ORDERS))
+    assert sorted(record["Location"] for record in records) == sorted(f"writer {number}" for number in range(12))
+    assert len({record["id"] for record in records}) == 12
+
+
+def failing(error, times):
+    calls = []
+
+    def operation():
+        calls.append(error)
+        if len(calls) <= times:
+            raise error
+        return len(calls)
+    return operation, calls
+
+
+@pytest.mark.parametrize("error", [
+    GithubException(409, {"message": "is at 1a2b but expected 3c4d"}, None),
+    GithubException(422, {"message": "Update is not a fast forward"}, None),
+    GithubException(422, {"message": "Invalid request.\n\n\"sha\" wasn't supplied."}, None),
+])
+def test_conflicts_are_retried(error):
+    operation, calls = failing(error, 2)
+    assert storage.retry_on_conflict(operation, delay=0) == 3
+
+
+@pytest.mark.parametrize("error", [
+    GithubException(422, {"message": "Validation Failed"}, None),
+    GithubException(422, {"message": "Reference already exists"}, None),
+    GithubException(404, {"message": "Not Found"}, None),
+])
+def test_other_errors_are_not_retried(error):
+    operation, calls = failing(error, 2)
+    with pytest.raises(GithubException):
+        storage.retry_on_conflict(operation, delay=0)
+    assert len(calls) == 1
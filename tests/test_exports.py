@@ -0,0 +1,64 @@
+import storage
+from exports import Exporter
+
+WORK_ORDERS = "work order records.json"
+CHECKLIST = "check list.json"
+
+
+class CountingBackend(storage.SQLiteBackend):
+    def __init__(self, db_path):
+        super().__init__(db_path)
+        self.reads = 0
+
+    def iter_records(self, file_path):
+        self.reads += 1
+        return super().iter_records(file_path)
+
+
+def make_backend(tmp_path):
+    backend = CountingBackend(str(tmp_path / "data.db"))
+    backend.extend(WORK_ORDERS, [{"id": "", "Location": location, "Date": "2026-03-02 09:30:00"}
+                                 for location in ["Warehouse", "Office", "Warehouse"]])
+    return backend
+
+
+def test_same_export_is_served_from_the_cache(tmp_path):
+    backend = make_backend(tmp_path)
+    exporter = Exporter(backend)
+    data = exporter.export("csv", [WORK_ORDERS], {"Location": ["Warehouse"]})
+    assert data.decode().splitlines()[1:] == [
+        "1,Warehouse,,,2026-03-02 09:30:00,,,,,,,,,", "3,Warehouse,,,2026-03-02 09:30:00,,,,,,,,,"]
+    # Filter order and value order do not make a different export
+    assert exporter.cached("csv", [WORK_ORDERS], {"Location": ["Warehouse", "Warehouse"], "Rating": []})
+    assert exporter.export("csv", [WORK_ORDERS], {"Location": ["Warehouse"], "Element": []}) is data
+    assert backend.reads == 1
+
+
+def test_key_covers_format_filters_and_collections(tmp_path):
+    backend = make_backend(tmp_path)
+    exporter = Exporter(backend)
+    exporter.export("csv", [WORK_ORDERS])
+    assert not exporter.cached("xlsx", [WORK_ORDERS])
+    assert not exporter.cached("csv", [WORK_ORDERS], {"Location": ["Office"]})
+    assert not exporter.cached("xlsx", [WORK_ORDERS, CHECKLIST])
+    assert exporter.export("xlsx", [WORK_ORDERS, CHECKLIST]).startswith(b"PK")
+    assert exporter.cached("xlsx", [WORK_ORDERS, CHECKLIST])
+
+
+def test_write_makes_a_new_export(tmp_path):
+    backend = make_backend(tmp_path)
+    exporter = Exporter(backend)
+    before = exporter.export("csv", [WORK_ORDERS])
+    backend.update_by_id(WORK_ORDERS, "2", {"Location": "Packaging"})
+    assert not exporter.cached("csv", [WORK_ORDERS])
+    after = exporter.export("csv", [WORK_ORDERS])
+    assert b"Office" in before and b"Office" not in after
+    assert backend.reads == 2
+
+
+def test_oldest_export_is_dropped(tmp_path):
+    exporter = Exporter(make_backend(tmp_path), max_entries=2)
+    for location in ["Warehouse", "Office", "Packaging"]:
+        exporter.export("csv", [WORK_ORDERS], {"Location": [location]})
+    assert not exporter.cached("csv", [WORK_ORDERS], {"Location": ["Warehouse"]})
+    assert exporter.cached("csv", [WORK_ORDERS], {"Location": ["Packaging"]})
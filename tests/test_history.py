@@ -0,0 +1,72 @@
+import storage
+from history import ChangeHistory, HistoryEngine
+
+CHANGE_LOG = "change log.json"
+
+
+def entry(entry_id, event_id, modifier, date, kind="Expected Repair Date"):
+    return {"id": entry_id, "Event ID": event_id, "Modifier Name": modifier,
+            "Modification Date": date, "Modification Type": kind}
+
+
+def ids(entries):
+    return [entry["id"] for entry in entries]
+
+
+def history_of(*entries):
+    history = ChangeHistory()
+    for item in entries:
+        history.add(item)
+    return history
+
+
+def test_timeline_is_in_date_order_whatever_the_logging_order():
+    history = history_of(entry("1", "4", "Ana", "2026-03-05 10:00:00"),
+                         entry("2", "4", "Omar", "2026-03-02 10:00:00"),
+                         entry("3", "5", "Ana", "2026-03-03 10:00:00"),
+                         entry("4", "4", "Ana", "2026-03-05 10:00:00"))
+    # Entries of the same date keep the order they were logged in
+    assert ids(history.timeline("4")) == ["2", "1", "4"]
+    assert ids(history.timeline(5)) == ["3"]
+    assert history.timeline("6") == []
+
+
+def test_modifier_entries_most_recent_first():
+    history = history_of(*(entry(str(day), "4", "Ana", f"2026-03-0{day} 10:00:00") for day in [3, 1, 5, 2]))
+    assert ids(history.by_modifier("Ana")) == ["5", "3", "2", "1"]
+    assert ids(history.by_modifier("Ana", limit=2)) == ["5", "3"]
+    assert history.by_modifier("Omar") == []
+
+
+def test_between_includes_the_whole_last_day():
+    history = history_of(entry("1", "4", "Ana", "2026-03-01 10:00:00"),
+                         entry("2", "4", "Ana", "2026-03-02 23:59:59"),
+                         entry("3", "4", "Ana", "2026-03-03 00:00:00"),
+                         entry("4", "4", "Ana", ""))
+    assert ids(history.between("2026-03-02", "2026-03-02")) == ["2"]
+    assert ids(history.between(date_to="2026-03-02")) == ["1", "2"]
+    assert ids(history.between()) == ["1", "2", "3"]
+
+
+def test_rename_moves_the_timeline():
+    history = history_of(entry("tmp-1", "tmp-2", "Ana", "2026-03-01 10:00:00"),
+                         entry("3", "7", "Ana", "2026-03-02 10:00:00"))
+    history.rename("tmp-2", "7")
+    history.rename("tmp-1", "8")
+    assert ids(history.timeline("7")) == ["8", "3"]
+    assert [item["Event ID"] for item in history.timeline("7")] == ["7", "7"]
+    assert history.timeline("tmp-2") == []
+
+
+def test_engine_extends_on_append_and_rebuilds_on_edit(tmp_path):
+    backend = storage.SQLiteBackend(str(tmp_path / "data.db"))
+    backend.append(CHANGE_LOG, entry("", "4", "Ana", "2026-03-01 10:00:00"))
+    engine = HistoryEngine(backend)
+    assert ids(engine.timeline("4")) == ["1"]
+    history = engine.history
+    backend.append(CHANGE_LOG, entry("", "4", "Omar", "2026-02-27 10:00:00"))
+    assert ids(engine.timeline("4")) == ["2", "1"]
+    assert engine.history is history
+    backend.update_by_id(CHANGE_LOG, "1", {"Modifier Name": "Omar"})
+    assert ids(engine.by_modifier("Omar")) == ["1", "2"]
+    assert engine.history is not history
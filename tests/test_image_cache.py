@@ -0,0 +1,53 @@
+import hashlib
+import os
+from images import ImageCache
+
+
+def key(image_path, version="1"):
+    return hashlib.sha256(f"{image_path}@{version}".encode()).hexdigest()
+
+
+class Fetcher:
+    def __init__(self):
+        self.fetched = []
+
+    def __call__(self, image_path):
+        self.fetched.append(image_path)
+        return image_path.encode().ljust(100, b".")
+
+
+def test_memory_tier_evicts_the_least_recently_used(tmp_path):
+    fetch = Fetcher()
+    cache = ImageCache(str(tmp_path), max_disk_bytes=10_000, max_memory_bytes=250)
+    for name in ("a", "b"):
+        cache.get(name, "1", fetch)
+    cache.get("a", "1", fetch)  # b is now the least recently used
+    cache.get("c", "1", fetch)
+    assert set(cache.memory) == {key("a"), key("c")}
+    assert cache.memory_bytes == 200
+    # Evicted from memory, still on disk: no fetch
+    assert cache.get("b", "1", fetch) == fetch("b")
+    assert fetch.fetched == ["a", "b", "c", "b"]
+
+
+def test_disk_tier_evicts_and_deletes_files(tmp_path):
+    fetch = Fetcher()
+    cache = ImageCache(str(tmp_path), max_disk_bytes=250, max_memory_bytes=0)
+    for name in ("a", "b", "c"):
+        cache.get(name, "1", fetch)
+    assert sorted(os.listdir(tmp_path)) == sorted([key("b"), key("c")])
+    assert cache.disk_bytes == 200
+    assert not cache.contains("a", "1")
+    cache.get("a", "1", fetch)
+    assert fetch.fetched == ["a", "b", "c", "a"]
+
+
+def test_new_version_is_fetched_and_disk_survives_restart(tmp_path):
+    fetch = Fetcher()
+    ImageCache(str(tmp_path)).get("a", "1", fetch)
+    cache = ImageCache(str(tmp_path))
+    assert cache.contains("a", "1") and cache.disk_bytes == 100
+    cache.get("a", "1", fetch)
+    cache.get("a", "2", fetch)
+    assert fetch.fetched == ["a", "a"]
+
@@ -0,0 +1,32 @@
+import storage
+from fake_github import FakeRepository
+
+
+def backend(repo):
+    return storage.GithubBackend(repo, storage.DocumentCache())
+
+
+def test_images_are_listed_from_the_git_tree():
+    repo = FakeRepository()
+    paths = [f"images/{variant}/{number}.jpg" for variant in ("display", "thumbs") for number in range(1200)]
+    backend(repo).commit([("image", path, path.encode()) for path in paths], "Upload images")
+    reader = backend(repo)
+    calls = repo.calls.copy()
+    # More files than a contents API listing returns, found with two tree reads
+    assert all(reader.image_exists(path) for path in paths)
+    assert not reader.image_exists("images/display/missing.jpg")
+    assert reader.image_version(paths[-1]) == storage.git_blob_sha(paths[-1].encode())
+    assert repo.calls["get_contents"] == calls["get_contents"]
+    assert repo.calls["get_git_tree"] - calls["get_git_tree"] == 2
+
+
+def test_written_and_purged_images():
+    repo = FakeRepository()
+    writer = backend(repo)
+    assert not writer.image_exists("images/display/a.jpg")
+    writer.put_image("images/display/a.jpg", b"a")
+    assert writer.image_exists("images/display/a.jpg")
+    assert backend(repo).image_exists("images/display/a.jpg")
+    writer.clear_images()
+    assert not writer.image_exists("images/display/a.jpg")
+    assert not backend(repo).image_exists("images/display/a.jpg")
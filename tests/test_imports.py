@@ -0,0 +1,54 @@
+import imports
+import schema
+
+CHECKLIST = "check list.json"
+WORK_ORDERS = "work order records.json"
+
+CSV = b"""location,Element,date,Rating,Safety_related,Notes
+Warehouse,Lights,2026-03-02,2,yes,first
+Office,Floors,03/02/2026,1,no,bad date
+,Lights,2026-03-04,N/A,,no location
+Warehouse,Floors,2026-03-05,7,maybe,bad rating and flag
+Warehouse,Outlets,2026-03-06 08:15,n/a,N,
+"""
+
+
+def problems(report):
+    return [tuple(row) for row in report["errors"].itertuples(index=False)]
+
+
+def test_rows_are_validated_together():
+    records, report = imports.prepare(WORK_ORDERS, imports.read_table("orders.csv", CSV))
+    assert report["rows"] == 5
+    assert report["ignored_columns"] == ["Notes"]
+    assert problems(report) == [
+        (3, "Date", "not a YYYY-MM-DD date"),
+        (4, "Location", "missing"),
+        (5, "Rating", "not 0-3 or N/A"),
+        (5, "Safety related", "not Yes or No"),
+    ]
+    assert report["valid"] == len(records) == 2
+
+
+def test_valid_rows_are_normalized_to_the_schema():
+    records, _ = imports.prepare(WORK_ORDERS, imports.read_table("orders.csv", CSV))
+    first, last = records
+    assert list(first) == ["id"] + [column for column in schema.COLUMNS[WORK_ORDERS] if column != "id"]
+    assert (first["id"], first["Date"], first["Rating"], first["Safety related"]) == ("", "2026-03-02 00:00:00", 2, "Yes")
+    assert (last["Date"], last["Rating"], last["Safety related"], last["Comment"]) == \
+        ("2026-03-06 08:15:00", "N/A", "No", "")
+
+
+def test_missing_required_columns_stop_the_import():
+    records, report = imports.prepare(CHECKLIST, imports.read_table("check.csv", b"Location,Date\nOffice,2026-03-02\n"))
+    assert records == []
+    assert report["missing_columns"] == ["Element", "Rating"]
+    assert report["valid"] == 0
+
+
+def test_values_outside_the_allowed_choices_are_reported():
+    data = b"Location,Element,Date,Rating\nWarehouse,Lights,2026-03-02,1\nRoof,Lights,2026-03-02,1\n"
+    records, report = imports.prepare(CHECKLIST, imports.read_table("check.csv", data),
+                                      allowed={"Location": ["Warehouse", "Office"]})
+    assert problems(report) == [(3, "Location", "unknown value")]
+    assert [record["Location"] for record in records] == ["Warehouse"]
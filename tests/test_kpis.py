@@ -0,0 +1,19 @@
+import kpis
+
+
+def test_same_day_repair_is_not_negative():
+    record = {"id": "1", "Date": "2026-03-02 09:30:00", "Actual Repair Date": "2026-03-02 00:00:00"}
+    assert kpis.contribution(kpis.COMPLETED, record)[5] == 0
+
+
+def test_repair_seconds():
+    record = {"id": "1", "Date": "2026-03-02 00:00:00", "Actual Repair Date": "2026-03-04 00:00:00"}
+    assert kpis.contribution(kpis.COMPLETED, record)[5] == 2 * 86400
+
+
+def test_mean_time_to_repair_over_same_day_repairs():
+    summary = kpis.KpiSummary()
+    summary.apply(kpis.COMPLETED, {"id": "1", "Date": "2026-03-02 15:00:00", "Actual Repair Date": "2026-03-02 00:00:00"})
+    summary.apply(kpis.COMPLETED, {"id": "2", "Date": "2026-03-02 00:00:00", "Actual Repair Date": "2026-03-03 00:00:00"})
+    assert summary.repairs == 2
+    assert summary.view()["mean_time_to_repair_days"] == 0.5
@@ -0,0 +1,184 @@
+import threading
+import pytest
+import storage
+from fake_github import FakeRef, FakeRepository
+from github import GithubException
+from history import HistoryEngine
+from kpis import KpiEngine
+from search import SearchEngine
+
+WORK_ORDERS = "work order records.json"
+CHANGE_LOG = "change log.json"
+
+
+@pytest.fixture
+def repo():
+    return FakeRepository()
+
+
+@pytest.fixture
+def outbox(repo, tmp_path, monkeypatch):
+    # The tests flush by hand
+    monkeypatch.setattr(storage.OutboxBackend, "_flush_forever", lambda self: None)
+    return storage.OutboxBackend(storage.GithubBackend(repo, storage.DocumentCache()), str(tmp_path / "outbox.db"))
+
+
+def stored(repo, file_path=WORK_ORDERS):
+    return list(storage.GithubBackend(repo, storage.DocumentCache()).iter_records(file_path))
+
+
+def order(location="Processing"):
+    return {"id": "", "Location": location, "Date": "2026-03-02 10:00:00"}
+
+
+def test_queued_record_reads_back_then_flushes(outbox, repo):
+    record = outbox.append(WORK_ORDERS, order())
+    assert record["id"].startswith("queued-")
+    assert outbox.load(WORK_ORDERS)["records"] == [record]
+    outbox.drain()
+    assert [record["id"] for record in stored(repo)] == ["1"]
+    assert [record["id"] for record in outbox.load(WORK_ORDERS)["records"]] == ["1"]
+    assert outbox.pending_writes() == (0, "")
+
+
+def test_update_of_a_queued_record_is_kept(outbox, repo):
+    record = outbox.append(WORK_ORDERS, order())
+    assert outbox.update_by_id(WORK_ORDERS, record["id"], {"Location": "Warehouse"})["Location"] == "Warehouse"
+    outbox.drain()
+    assert [(record["id"], record["Location"]) for record in stored(repo)] == [("1", "Warehouse")]
+
+
+def test_references_to_a_queued_record_get_its_real_id(outbox, repo):
+    record = outbox.append(WORK_ORDERS, order())
+    outbox.drain()
+    # Written after the flush with the id the page still showed
+    with outbox.transaction("Update the order") as tx:
+        tx.update_by_id(WORK_ORDERS, record["id"], {"Location": "Warehouse"})
+        tx.append(CHANGE_LOG, {"id": "", "Event ID": record["id"], "Modifier Name": "sameh"})
+    outbox.drain()
+    assert stored(repo)[0]["Location"] == "Warehouse"
+    assert stored(repo, CHANGE_LOG)[0]["Event ID"] == "1"
+
+
+def test_engines_follow_a_flush_without_rebuilding(outbox, monkeypatch):
+    search, history, kpis = SearchEngine(outbox), HistoryEngine(outbox), KpiEngine(outbox)
+    search.index(WORK_ORDERS), search.index(CHANGE_LOG), history.timeline("1"), kpis.view()
+    rebuilt = []
+    monkeypatch.setattr(outbox, "iter_records", lambda file_path: rebuilt.append(file_path) or iter([]))
+    record = outbox.append(WORK_ORDERS, order("Warehouse"))
+    outbox.append(CHANGE_LOG, {"id": "", "Event ID": record["id"], "Modification Date": "2026-03-02 10:00:00"})
+    outbox.drain()
+    assert [record["id"] for record in search.search(WORK_ORDERS, "warehouse")] == ["1"]
+    assert [entry["id"] for entry in search.search(CHANGE_LOG, filters={"Event ID": ["1"]})] == ["1"]
+    assert [entry["Event ID"] for entry in history.timeline("1")] == ["1"]
+    # An update flushed on its own leaves the version as the engines saw it
+    outbox.update_by_id(WORK_ORDERS, "1", {"Location": "Processing"})
+    outbox.drain()
+    assert search.search(WORK_ORDERS, "warehouse") == []
+    assert kpis.view()["backlog_by_location"] == {"Processing": 1}
+    assert rebuilt == []
+
+
+@pytest.mark.parametrize("layout", ["single", "sharded"])
+def test_pages_apply_the_queue_without_loading_documents(repo, tmp_path, monkeypatch, layout):
+    monkeypatch.setattr(storage.OutboxBackend, "_flush_forever", lambda self: None)
+    remote = storage.GithubBackend(repo, storage.DocumentCache(), layout)
+    outbox = storage.OutboxBackend(remote, str(tmp_path / "outbox.db"))
+    remote.extend(WORK_ORDERS, [{"id": "", "Location": ["Processing", "Warehouse"][number % 2],
+                                 "Date": f"2026-0{1 + number % 3}-{10 + number} 10:00:00"} for number in range(12)])
+    outbox.append(WORK_ORDERS, order("Warehouse"))
+    outbox.update_by_id(WORK_ORDERS, "3", {"Location": "Processing", "Date": "2026-01-01 10:00:00"})
+    outbox.update_by_id(WORK_ORDERS, "4", {"Location": "Warehouse"})
+    outbox.remove_by_ids(WORK_ORDERS, ["6"])
+    expected = outbox.load(WORK_ORDERS)["records"]
+    if layout == "sharded":
+        # Shards are read one by one (and pruned by date), never stitched
+        monkeypatch.setattr(remote, "load", lambda file_path: pytest.fail("stitched the whole collection"))
+    assert list(outbox.iter_records(WORK_ORDERS)) == expected
+    for filters, date_from, date_to in [(None, None, None), ({"Location": ["Warehouse"]}, None, None),
+                                        (None, "2026-01-01", "2026-01-31")]:
+        match = storage.record_matcher(WORK_ORDERS, filters, date_from, date_to)
+        for sort, descending in [("Date", False), ("Date", True), ("id", True)]:
+            for offset, limit in [(0, 3), (2, 4), (5, 20), (0, None)]:
+                assert outbox.query(WORK_ORDERS, filters, date_from, date_to, sort, descending, offset, limit) == \
+                    storage.page(filter(match, expected), sort, descending, offset, limit)
+    assert outbox.query(WORK_ORDERS, offset=9, limit=5) == storage.page(expected, offset=9, limit=5)
+    assert outbox.distinct(WORK_ORDERS, "Location") == ["Processing", "Warehouse"]
+
+
+def test_update_does_not_read_the_remote(outbox, repo):
+    outbox.append(WORK_ORDERS, order())
+    outbox.drain()
+    outbox.load(WORK_ORDERS)
+    calls = sum(repo.calls.values())
+    assert outbox.update_by_id(WORK_ORDERS, "1", {"Location": "Warehouse"})["Location"] == "Warehouse"
+    assert sum(repo.calls.values()) == calls
+
+
+def test_batch_that_landed_is_not_sent_again(outbox, repo, monkeypatch):
+    # The commit lands but the ref update's response is lost
+    edit = FakeRef.edit
+
+    def edit_then_fail(self, sha, force=False):
+        edit(self, sha, force)
+        monkeypatch.setattr(FakeRef, "edit", edit)
+        raise GithubException(502, {"message": "Bad Gateway"}, None)
+
+    monkeypatch.setattr(FakeRef, "edit", edit_then_fail)
+    record = outbox.append(WORK_ORDERS, order())
+    with pytest.raises(GithubException):
+        outbox.drain()
+    outbox.drain()
+    outbox.drain()
+    assert [record["id"] for record in stored(repo)] == ["1"]
+    assert outbox.pending_writes()[0] == 0
+    # The provisional id still reaches the record, recovered from the landed commit
+    outbox.update_by_id(WORK_ORDERS, record["id"], {"Location": "Warehouse"})
+    outbox.drain()
+    assert [(record["id"], record["Location"]) for record in stored(repo)] == [("1", "Warehouse")]
+
+
+def test_read_while_a_batch_lands(outbox, monkeypatch):
+    outbox.append(WORK_ORDERS, order())
+    load = outbox.remote.load
+    flushes = []
+
+    def load_then_flush(file_path):
+        # The batch is flushed right after the remote was read
+        data = load(file_path)
+        if not flushes:
+            flushes.append(threading.Thread(target=outbox.drain))
+            flushes[0].start()
+            flushes[0].join(0.5)
+        return data
+
+    monkeypatch.setattr(outbox.remote, "load", load_then_flush)
+    assert [record["Location"] for record in outbox.load(WORK_ORDERS)["records"]] == ["Processing"]
+    flushes[0].join()
+    assert [record["id"] for record in outbox.load(WORK_ORDERS)["records"]] == ["1"]
+
+
+def test_rejected_transaction_is_set_aside(outbox, repo, monkeypatch):
+    commit = outbox.remote.commit
+
+    def validate(ops, message):
+        if any(op[0] == "append" and op[2]["Location"] == "" for op in ops):
+            raise GithubException(422, {"message": "Validation Failed"}, None)
+        return commit(ops, message)
+
+    monkeypatch.setattr(outbox.remote, "commit", validate)
+    outbox.append(WORK_ORDERS, order(""))
+    outbox.append(WORK_ORDERS, order("Warehouse"))
+    for _ in range(storage.OUTBOX_MAX_ATTEMPTS - 1):
+        with pytest.raises(GithubException):
+            outbox.drain()
+    # The last attempt sets it aside and the rest goes out
+    outbox.drain()
+    assert [record["Location"] for record in stored(repo)] == ["Warehouse"]
+    assert [(message, error) for _, message, error in outbox.dead_letters()] == \
+        [(f"Add record to {WORK_ORDERS}", '422 {"message": "Validation Failed"}')]
+    assert outbox.pending_writes()[0] == 0
+    # Queued again, it is retried in its place
+    assert outbox.requeue_dead_letters() == 1
+    assert outbox.dead_letters() == []
+    assert [record["Location"] for record in outbox.load(WORK_ORDERS)["records"]] == ["Warehouse", ""]
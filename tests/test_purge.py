@@ -0,0 +1,74 @@
+import pytest
+import storage
+from fake_github import FakeRepository
+from github import GithubException
+
+WORK_ORDERS = "work order records.json"
+CHECKLIST = "check list.json"
+
+
+def backend(repo):
+    return storage.GithubBackend(repo, storage.DocumentCache())
+
+
+def order(location="Processing"):
+    return {"id": "", "Location": location, "Date": "2026-03-02 10:00:00"}
+
+
+def test_archives_of_different_heads_get_different_tags():
+    repo = FakeRepository()
+    writer = backend(repo)
+    writer.append(WORK_ORDERS, order())
+    first = writer.archive("archive-20261018-101500")
+    writer.append(WORK_ORDERS, order())
+    second = writer.archive("archive-20261018-101500")
+    assert first != second
+    assert {f"refs/{first}", f"refs/{second}"} <= repo.refs.keys()
+
+
+def test_archiving_a_head_twice_fails_at_once():
+    repo = FakeRepository()
+    writer = backend(repo)
+    writer.archive("archive-20261018-101500")
+    with pytest.raises(GithubException) as error:
+        writer.archive("archive-20261018-101500")
+    assert error.value.status == 422
+    assert repo.calls["create_git_ref"] == 2
+
+
+def test_outbox_archive_waits_for_the_queue_in_the_background(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage.OutboxBackend, "_flush_forever", lambda self: None)
+    repo = FakeRepository()
+    outbox = storage.OutboxBackend(backend(repo), str(tmp_path / "outbox.db"))
+    outbox.append(WORK_ORDERS, order())
+    calls = sum(repo.calls.values())
+    assert outbox.archive("archive-20261018-101500").endswith("(once the queued changes are sent)")
+    with outbox.transaction("Clear the work orders") as tx:
+        tx.save(WORK_ORDERS, storage.default_data(WORK_ORDERS))
+    assert sum(repo.calls.values()) == calls
+    outbox.drain()
+    tag, = [ref for ref in repo.refs if ref.startswith("refs/tags/archive-20261018-101500-")]
+    # The tag holds the queued order; the head has it cleared
+    archived = repo.commits[repo.refs[tag]].files[WORK_ORDERS]
+    assert [record["id"] for record in storage.decode_file(WORK_ORDERS, archived)["records"]] == ["1"]
+    assert list(backend(repo).iter_records(WORK_ORDERS)) == []
+
+
+def test_clearing_the_checklist_and_images_is_one_commit():
+    # Staged the way purge_data stages the clear button
+    repo = FakeRepository()
+    writer = backend(repo)
+    writer.append(WORK_ORDERS, order())
+    writer.append(CHECKLIST, order())
+    writer.put_image("images/display/a.jpg", b"jpeg")
+    writer.put_image("images/thumbs/a.jpg", b"jpg")
+    assert writer.image_exists("images/display/a.jpg")
+    commits = repo.calls["create_git_commit"]
+    with writer.transaction("Clear check list.json, images") as tx:
+        tx.save(CHECKLIST, storage.default_data(CHECKLIST))
+        tx.purge("images")
+    assert repo.calls["create_git_commit"] == commits + 1
+    assert not any(path.startswith("images/") for path in repo._files())
+    assert not writer.image_exists("images/display/a.jpg")
+    assert list(writer.iter_records(CHECKLIST)) == []
+    assert len(list(writer.iter_records(WORK_ORDERS))) == 1
@@ -0,0 +1,53 @@
+import storage
+from fake_github import FakeRepository
+
+WORK_ORDERS = "work order records.json"
+
+
+def order(month, location="Processing", rating=""):
+    return {"id": "", "Location": location, "Rating": rating, "Date": f"2026-{month:02d}-05 10:00:00"}
+
+
+def sharded(records):
+    repo = FakeRepository()
+    storage.GithubBackend(repo, storage.DocumentCache(), "sharded").extend(WORK_ORDERS, records)
+    # A reader with a cold cache
+    return storage.GithubBackend(repo, storage.DocumentCache(), "sharded")
+
+
+def test_page_windows_match_a_full_sort():
+    records = [{"id": str(number), "Rating": rating} for number, rating in enumerate(["9", "", "10", "n/a", "2.5", "10"])]
+    everything = sorted(records, key=lambda record: storage.sort_key(record["Rating"]))
+    for descending in [False, True]:
+        ordered = everything[::-1] if descending else everything
+        for offset, limit in [(0, 2), (2, 3), (5, 4), (8, 1)]:
+            count, window = storage.page(iter(records), "Rating", descending, offset, limit)
+            assert count == 6
+            assert [record["Rating"] for record in window] == \
+                [record["Rating"] for record in ordered[offset:offset + limit]]
+
+
+def test_unsorted_page_keeps_stored_order():
+    records = [{"id": str(number)} for number in range(10)]
+    assert storage.page(iter(records), offset=3, limit=4) == (10, records[3:7])
+    assert storage.page(iter(records), offset=8) == (10, records[8:])
+
+
+def test_date_range_reads_only_the_months_in_it(monkeypatch):
+    backend = sharded([order(month, location) for month in range(1, 7) for location in ["Warehouse", "Office"]])
+    fetched = []
+    fetch = backend._fetch
+    monkeypatch.setattr(backend, "_fetch", lambda path, sha: fetched.append(path) or fetch(path, sha))
+    count, records = backend.query(WORK_ORDERS, {"Location": ["Office"]}, "2026-02-01", "2026-03-31",
+                                   sort="Date", descending=True, limit=1)
+    assert count == 2
+    assert [record["Date"][:7] for record in records] == ["2026-03"]
+    assert {path for path in fetched if path.endswith(".jsonl")} == {"work order records/2026-02.jsonl", "work order records/2026-03.jsonl"}
+
+
+def test_filters_are_applied_before_paging():
+    backend = sharded([order(1 + number % 3, ["Warehouse", "Office"][number % 2], str(number)) for number in range(12)])
+    count, records = backend.query(WORK_ORDERS, {"Location": ["Warehouse"]}, sort="Rating", offset=2, limit=2)
+    assert count == 6
+    assert [record["Rating"] for record in records] == ["4", "6"]
+    assert backend.distinct(WORK_ORDERS, "Location") == ["Office", "Warehouse"]
@@ -0,0 +1,41 @@
+import pandas as pd
+import schema
+
+# pandas picks the resolution
+is_datetime = pd.api.types.is_datetime64_dtype
+
+WORK_ORDERS = "work order records.json"
+CHANGE_LOG = "change log.json"
+
+
+def test_columns_are_typed():
+    df = schema.frame(WORK_ORDERS, [
+        {"id": "1", "Location": "Warehouse", "Rating": 9, "Date": "2026-03-02 09:30:00",
+         "Expected Repair Date": "not a date", "Safety related": "Yes", "Quality related": "No"},
+        {"id": "2", "Location": "Office", "Rating": "N/A", "Date": "2026-03-04 00:00:00",
+         "Safety related": "", "Quality related": True}])
+    assert df["Location"].dtype == "category"
+    # Numeric and text ratings share one text category
+    assert list(df["Rating"]) == ["9", "N/A"]
+    assert is_datetime(df["Date"])
+    assert df["Date"][1] == pd.Timestamp("2026-03-04")
+    assert df["Expected Repair Date"].isna().all()
+    assert df["Safety related"].dtype == schema.BOOLEAN
+    assert df["Safety related"][0] == True  # noqa: E712
+    assert df["Safety related"].isna()[1]
+    assert list(df["Quality related"]) == [False, True]
+
+
+def test_every_schema_column_is_present_in_order():
+    df = schema.frame(CHANGE_LOG, [{"Modifier Name": "Ana", "id": "1", "Note": "moved"}])
+    assert list(df.columns) == schema.COLUMNS[CHANGE_LOG] + ["Note"]
+    assert is_datetime(df["New Date"])
+    assert df["New Date"].isna().all()
+    assert df["Modification Type"].dtype == "category"
+
+
+def test_empty_collection_keeps_the_columns():
+    df = schema.frame(WORK_ORDERS, [])
+    assert df.empty
+    assert list(df.columns) == schema.COLUMNS[WORK_ORDERS]
+    assert is_datetime(df["Actual Repair Date"])
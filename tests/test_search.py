@@ -0,0 +1,76 @@
+import storage
+from search import SearchEngine, SearchIndex
+
+WORK_ORDERS = "work order records.json"
+
+
+def ids(records):
+    return [record["id"] for record in records]
+
+
+def index_of(*records):
+    index = SearchIndex()
+    index.build(records)
+    return index
+
+
+def test_keywords_match_token_prefixes():
+    index = index_of({"id": "1", "Element": "Lights", "Location": "Warehouse"},
+                     {"id": "2", "Element": "Light Switch", "Location": "Office"},
+                     {"id": "3", "Element": "Floors", "Location": "Warehouse"})
+    assert ids(index.search("ligh")) == ["1", "2"]
+    assert ids(index.search("light ware")) == ["1"]
+    assert index.search("roof") == []
+
+
+def test_filters_and_inclusive_date_range():
+    index = index_of({"id": "1", "Location": "Warehouse", "Date": "2026-03-01 09:00:00"},
+                     {"id": "2", "Location": "Office", "Date": "2026-03-02 17:00:00"},
+                     {"id": "3", "Location": "Warehouse", "Date": "2026-03-03 08:00:00"})
+    assert ids(index.search(filters={"Location": ["Warehouse"]})) == ["1", "3"]
+    assert ids(index.search(date_from="2026-03-02", date_to="2026-03-03")) == ["2", "3"]
+    assert ids(index.search(filters={"Location": ["Warehouse"]}, date_to="2026-03-02")) == ["1"]
+
+
+def test_added_record_is_searchable():
+    index = index_of({"id": "1", "Element": "Lights", "Date": "2026-03-02 00:00:00"})
+    index.add({"id": "2", "Element": "Lighting", "Date": "2026-03-01 00:00:00"})
+    assert ids(index.search("light")) == ["1", "2"]
+    assert ids(index.search(date_to="2026-03-01")) == ["2"]
+    assert index.options("Element") == ["Lighting", "Lights"]
+
+
+def test_update_drops_the_old_values():
+    index = index_of({"id": "1", "Element": "Lights", "Status": "Open", "Date": "2026-03-02 00:00:00"})
+    index.update({"id": "1", "Element": "Floors", "Status": "Closed", "Date": "2026-03-05 00:00:00"})
+    assert index.search("lights") == []
+    assert ids(index.search("floors")) == ["1"]
+    assert index.search(filters={"Status": ["Open"]}) == []
+    assert index.options("Status") == ["Closed"]
+    assert index.search(date_to="2026-03-02") == []
+    assert ids(index.search(date_from="2026-03-05")) == ["1"]
+
+
+def test_rename_moves_the_record_and_its_references():
+    index = index_of({"id": "tmp-1", "Element": "Lights"},
+                     {"id": "7", "Event ID": "tmp-1", "Modification": "Created"})
+    index.rename("tmp-1", "4")
+    assert index.search(filters={"id": ["tmp-1"]}) == []
+    assert ids(index.search(filters={"Event ID": ["4"]})) == ["7"]
+    index.update({"id": "4", "Element": "Floors"})
+    assert [record["Element"] for record in index.search(filters={"id": ["4"]})] == ["Floors"]
+
+
+def test_engine_follows_backend_writes(tmp_path):
+    backend = storage.SQLiteBackend(str(tmp_path / "records.db"))
+    backend.extend(WORK_ORDERS, [{"id": "", "Element": "Lights", "Status": "Open"}])
+    engine = SearchEngine(backend)
+    assert ids(engine.search(WORK_ORDERS, "lights")) == ["1"]
+    index = engine.index(WORK_ORDERS)
+    backend.append(WORK_ORDERS, {"id": "", "Element": "Floors", "Status": "Open"})
+    backend.update_by_id(WORK_ORDERS, "1", {"Status": "Closed"})
+    # Kept current from the notifications rather than rebuilt
+    assert engine.index(WORK_ORDERS) is index
+    assert ids(engine.search(WORK_ORDERS, filters={"Status": ["Open"]})) == ["2"]
+    backend.save(WORK_ORDERS, {storage.COLLECTIONS[WORK_ORDERS]: []})
+    assert engine.search(WORK_ORDERS) == []
@@ -0,0 +1,95 @@
+import json
+import storage
+from fake_github import FakeRepository
+
+WORK_ORDERS = "work order records.json"
+MANIFEST = "work order records/manifest.json"
+
+
+def backend(repo):
+    return storage.GithubBackend(repo, storage.DocumentCache(), "sharded")
+
+
+def order(month, **fields):
+    return {"id": "", "Location": "Processing", "Date": f"2026-{month:02d}-05 10:00:00", **fields}
+
+
+def manifest(repo):
+    return json.loads(repo._files()[MANIFEST])
+
+
+def test_manifest_holds_no_index():
+    repo = FakeRepository()
+    writer = backend(repo)
+    writer.extend(WORK_ORDERS, [order(1 + number % 3) for number in range(30)])
+    size = len(repo._files()[MANIFEST])
+    writer.append(WORK_ORDERS, order(2))
+    assert manifest(repo) == {"shards": {"2026-01.jsonl": 10, "2026-02.jsonl": 11, "2026-03.jsonl": 10},
+                              "count": 31, "next_id": 32}
+    # An append changes counts, not the size of the manifest
+    assert abs(len(repo._files()[MANIFEST]) - size) <= 1
+
+
+def test_update_and_remove_find_records_in_any_shard():
+    repo = FakeRepository()
+    writer = backend(repo)
+    first, second, third = writer.extend(WORK_ORDERS, [order(1), order(2), order(3)])
+    # Another process, with nothing cached, edits what the first one wrote
+    other = backend(repo)
+    assert other.update_by_id(WORK_ORDERS, first["id"], {"Location": "Warehouse"})["Location"] == "Warehouse"
+    assert other.update_by_id(WORK_ORDERS, "404", {"Location": "Warehouse"}) is None
+    assert other.remove_by_ids(WORK_ORDERS, [second["id"], "404"]) == [second]
+    records = {record["id"]: record for record in backend(repo).iter_records(WORK_ORDERS)}
+    assert records[first["id"]]["Location"] == "Warehouse"
+    assert set(records) == {first["id"], third["id"]}
+    assert manifest(repo)["shards"]["2026-02.jsonl"] == 0
+    assert manifest(repo)["count"] == 2
+
+
+def test_ids_are_never_reused():
+    repo = FakeRepository()
+    writer = backend(repo)
+    records = writer.extend(WORK_ORDERS, [order(1), order(1), order(2, id="40")])
+    writer.remove_by_ids(WORK_ORDERS, [records[1]["id"]])
+    assert writer.append(WORK_ORDERS, order(3))["id"] == "41"
+
+
+def test_update_sees_records_staged_in_the_same_commit():
+    repo = FakeRepository()
+    writer = backend(repo)
+    results = writer.commit([("append", WORK_ORDERS, order(4)),
+                             ("update", WORK_ORDERS, "1", {"Location": "Packaging"})], "Append and edit")
+    assert results[1]["Location"] == "Packaging"
+    assert [record["Location"] for record in writer.iter_records(WORK_ORDERS)] == ["Packaging"]
+
+
+def test_manifest_with_an_index_is_migrated():
+    repo = FakeRepository()
+    repo.create_file("work order records/2026-01.jsonl", "seed",
+                     "".join(json.dumps(order(1, id=str(number))) + "\n" for number in (1, 2, 7)))
+    repo.create_file(MANIFEST, "seed", json.dumps({"shards": {"2026-01.jsonl": 3}, "count": 3,
+                                                   "index": {"1": ["2026-01.jsonl", 0], "2": ["2026-01.jsonl", 1],
+                                                             "7": ["2026-01.jsonl", 2]}}))
+    writer = backend(repo)
+    assert writer.append(WORK_ORDERS, order(1))["id"] == "8"
+    assert writer.update_by_id(WORK_ORDERS, "7", {"Location": "Warehouse"})["Location"] == "Warehouse"
+    assert manifest(repo) == {"shards": {"2026-01.jsonl": 4}, "count": 4, "next_id": 9}
+
+
+def test_legacy_document_is_read_and_edited():
+    repo = FakeRepository()
+    repo.create_file(WORK_ORDERS, "seed", json.dumps({"records": [order(1, id="1"), order(1, id="2")]}))
+    writer = backend(repo)
+    assert writer.append(WORK_ORDERS, order(5))["id"] == "3"
+    assert writer.update_by_id(WORK_ORDERS, "2", {"Location": "Warehouse"})["Location"] == "Warehouse"
+    assert json.loads(repo._files()[WORK_ORDERS])["records"][1]["Location"] == "Warehouse"
+    assert [record["id"] for record in writer.iter_records(WORK_ORDERS)] == ["1", "2", "3"]
+
+
+def test_whole_collection_save_repartitions():
+    repo = FakeRepository()
+    writer = backend(repo)
+    writer.extend(WORK_ORDERS, [order(1), order(2)])
+    writer.save(WORK_ORDERS, {"records": [order(6, id="5")]})
+    assert manifest(repo) == {"shards": {"2026-06.jsonl": 1}, "count": 1, "next_id": 6}
+    assert not any(path.startswith("work order records/2026-01") for path in repo._files())
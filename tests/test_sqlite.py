@@ -0,0 +1,44 @@
+import pytest
+import storage
+
+WORK_ORDERS = "work order records.json"
+CHANGE_LOG = "change log.json"
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = storage.SQLiteBackend(str(tmp_path / "data.db"))
+    backend.extend(WORK_ORDERS, [
+        {"id": "", "Location": location, "Rating": rating, "Date": f"2026-0{month}-1{day} 10:00:00"}
+        for month, day, location, rating in [(1, 2, "Warehouse", "9"), (2, 1, "Processing", "10"), (1, 5, "Processing", ""),
+                                             (3, 3, "Warehouse", "2.5"), (2, 7, "Packaging", "n/a"), (1, 1, "Warehouse", "10")]])
+    return backend
+
+
+@pytest.mark.parametrize("sort", [None, "Rating", "Date", "id"])
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("filters, date_from, date_to", [
+    (None, None, None), ({"Location": ["Warehouse", "Packaging"]}, None, None), (None, "2026-01-01", "2026-02-11"),
+    ({"Location": ["Processing"]}, "2026-02-01", None), ({"Location": []}, None, "2026-01-12")])
+def test_query_matches_the_generic_implementation(backend, sort, descending, filters, date_from, date_to):
+    for offset, limit in [(0, None), (0, 2), (1, 3), (5, 10)]:
+        assert backend.query(WORK_ORDERS, filters, date_from, date_to, sort, descending, offset, limit) == \
+            storage.StorageBackend.query(backend, WORK_ORDERS, filters, date_from, date_to, sort, descending, offset, limit)
+
+
+def test_numbers_stored_as_text_sort_as_numbers(backend):
+    backend.append(WORK_ORDERS, {"id": "", "Location": "Warehouse"})
+    _, records = backend.query(WORK_ORDERS, sort="Rating")
+    # Missing first, then numbers, then text (the empty string is text)
+    assert [record.get("Rating") for record in records] == [None, "2.5", "9", "10", "10", "", "n/a"]
+
+
+def test_filters_compare_as_text(backend):
+    backend.append(CHANGE_LOG, {"id": "", "Event ID": 3, "Modifier Name": "sameh"})
+    assert backend.query(CHANGE_LOG, {"Event ID": ["3"]})[0] == 1
+    assert backend.query(WORK_ORDERS, {"id": [2, "4"]}, limit=0) == (2, [])
+
+
+def test_distinct(backend):
+    assert backend.distinct(WORK_ORDERS, "Location") == ["Packaging", "Processing", "Warehouse"]
+    assert backend.distinct(WORK_ORDERS, "Rating") == ["10", "2.5", "9", "n/a"]
@@ -0,0 +1,101 @@
+import threading
+import time
+import storage
+from fake_github import FakeRepository
+from submissions import SubmissionQueue
+
+CHECKLIST = "check list.json"
+WORK_ORDERS = "work order records.json"
+
+
+def finished(queue, ticket, timeout=5):
+    deadline = time.monotonic() + timeout
+    while queue.pending([ticket]):
+        assert time.monotonic() < deadline, "submission still pending"
+        time.sleep(0.01)
+    return queue.status(ticket)
+
+
+def test_done_submission_keeps_its_result():
+    queue = SubmissionQueue()
+
+    def job(progress, value):
+        progress("Saving records", 0.9)
+        return {"work order records.json": [value]}
+    status = finished(queue, queue.submit("inspection", job, "4"))
+    assert (status["state"], status["step"], status["progress"]) == ("done", "Saved", 1.0)
+    assert status["result"] == {"work order records.json": ["4"]}
+
+
+def test_failed_submission_reports_its_error():
+    queue = SubmissionQueue()
+
+    def job(progress):
+        progress("Processing image", 0.5)
+        raise ValueError("cannot identify image file")
+    status = finished(queue, queue.submit("inspection", job))
+    assert (status["state"], status["step"], status["error"]) == ("failed", "Failed", "cannot identify image file")
+    assert status["progress"] == 0.5 and status["result"] is None
+
+
+def test_running_submission_shows_its_step():
+    queue = SubmissionQueue()
+    started, release = threading.Event(), threading.Event()
+
+    def job(progress):
+        progress("Uploading images", 0.25)
+        started.set()
+        release.wait(5)
+    ticket = queue.submit("inspection", job)
+    started.wait(5)
+    status = queue.status(ticket)
+    assert (status["state"], status["step"], status["progress"]) == ("running", "Uploading images", 0.25)
+    assert queue.pending([ticket, "unknown"]) == [ticket]
+    release.set()
+    assert finished(queue, ticket)["state"] == "done"
+    assert queue.status("unknown") is None
+
+
+def test_only_finished_submissions_are_forgotten():
+    queue = SubmissionQueue(max_workers=1, keep=2)
+    release = threading.Event()
+    tickets = [queue.submit("slow", lambda progress: release.wait(5))]
+    tickets += [queue.submit(f"quick {number}", lambda progress: None) for number in range(3)]
+    # Over keep, but none has finished
+    assert all(queue.status(ticket) for ticket in tickets)
+    release.set()
+    finished(queue, tickets[-1])
+    last = queue.submit("last", lambda progress: None)
+    assert list(queue.jobs) == [tickets[-1], last]
+
+
+def test_inspection_is_saved_in_one_commit():
+    repo = FakeRepository()
+    backend = storage.GithubBackend(repo, storage.DocumentCache())
+    queue = SubmissionQueue()
+
+    def persist(progress, entries):
+        # Staged the way persist_entries stages an inspection
+        with backend.transaction("Record inspection of Warehouse") as tx:
+            for number, (check_row, image_data) in enumerate(entries):
+                tx.append(CHECKLIST, check_row)
+                if image_data is not None:
+                    progress("Processing image", number / len(entries))
+                    image_path = tx.put_image(f"images/display/{number}.jpg", image_data)
+                    tx.append(WORK_ORDERS, {"id": "", "Location": "Warehouse", "Image": image_path})
+            ops = list(tx.ops)
+        saved = {}
+        for op, result in zip(ops, tx.results):
+            if op[0] == "append":
+                saved.setdefault(op[1], []).append(str(result["id"]))
+        return saved
+
+    commits = repo.calls["create_git_commit"]
+    entries = [({"id": "", "Element": element, "Rating": rating}, b"jpeg" if rating == "Bad" else None)
+               for element, rating in [("Floors", "Good"), ("Lights", "Bad"), ("Electrical Outlets", "Bad")]]
+    status = finished(queue, queue.submit("inspection of Warehouse", persist, entries))
+    assert status["state"] == "done"
+    assert status["result"] == {CHECKLIST: ["1", "2", "3"], WORK_ORDERS: ["1", "2"]}
+    assert repo.calls["create_git_commit"] == commits + 1
+    assert len(list(backend.iter_records(CHECKLIST))) == 3
+    assert [order["Image"] for order in backend.iter_records(WORK_ORDERS)] == ["images/display/1.jpg", "images/display/2.jpg"]
@@ -0,0 +1,101 @@
+import pytest
+import storage
+from fake_github import FakeRepository, unified_patch
+from search import SearchEngine
+
+WORK_ORDERS = "work order records.json"
+
+
+def order(number, location="Processing"):
+    return {"id": str(number), "Location": location, "Date": "2026-03-02 10:00:00"}
+
+
+def test_apply_patch_round_trips():
+    before = "".join(f"line {number}\n" for number in range(20))
+    after = before.replace("line 3\n", "").replace("line 12\n", "line twelve\n") + "line 20\n"
+    assert storage.apply_patch(before, unified_patch(before.encode(), after.encode())) == after
+
+
+def test_apply_patch_without_a_final_newline():
+    before = "a\nb"
+    after = "a\nb\nc"
+    assert storage.apply_patch(before, unified_patch(before.encode(), after.encode())) == after
+
+
+def test_apply_patch_refuses_another_base():
+    patch = unified_patch(b"a\nb\nc\n", b"a\nB\nc\n")
+    assert storage.apply_patch("a\nx\nc\n", patch) is None
+
+
+def backend(repo, layout):
+    return storage.GithubBackend(repo, storage.DocumentCache(), layout)
+
+
+@pytest.mark.parametrize("layout", ["single", "sharded"])
+def test_sync_patches_the_cache_and_notifies(layout):
+    repo = FakeRepository()
+    writer, reader = backend(repo, layout), backend(repo, layout)
+    writer.extend(WORK_ORDERS, [order(1), order(2)])
+    assert len(list(reader.iter_records(WORK_ORDERS))) == 2
+    events = []
+    reader.subscribe(lambda kind, file_path, record: events.append((kind, record["id"])))
+    reader.sync()
+    writer.append(WORK_ORDERS, order(3))
+    writer.update_by_id(WORK_ORDERS, "1", {"Location": "Warehouse"})
+    reader.sync()
+    assert sorted(events) == [("append", "3"), ("update", "1")]
+    # The patched copies are read without downloading anything
+    blobs = repo.calls["get_git_blob"]
+    records = list(reader.iter_records(WORK_ORDERS))
+    assert [(record["id"], record["Location"]) for record in records] == \
+        [("1", "Warehouse"), ("2", "Processing"), ("3", "Processing")]
+    assert repo.calls["get_git_blob"] == blobs
+
+
+def test_sync_of_a_removal_asks_for_a_rebuild():
+    repo = FakeRepository()
+    writer, reader = backend(repo, "single"), backend(repo, "single")
+    writer.extend(WORK_ORDERS, [order(1), order(2)])
+    list(reader.iter_records(WORK_ORDERS))
+    events = []
+    reader.subscribe(lambda kind, file_path, record: events.append(kind))
+    reader.sync()
+    writer.remove_by_ids(WORK_ORDERS, ["1"])
+    assert reader.sync() == [WORK_ORDERS]
+    assert events == ["save"]
+    assert [record["id"] for record in reader.iter_records(WORK_ORDERS)] == ["2"]
+
+
+def test_sync_through_the_outbox_updates_an_engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage.OutboxBackend, "_flush_forever", lambda self: None)
+    repo = FakeRepository()
+    writer = backend(repo, "single")
+    outbox = storage.OutboxBackend(backend(repo, "single"), str(tmp_path / "outbox.db"))
+    writer.extend(WORK_ORDERS, [order(1), order(2)])
+    search = SearchEngine(outbox)
+    assert len(search.search(WORK_ORDERS)) == 2
+    outbox.sync()
+    rebuilt = []
+    monkeypatch.setattr(outbox, "iter_records", lambda file_path: rebuilt.append(file_path) or iter([]))
+    writer.update_by_id(WORK_ORDERS, "1", {"Location": "Warehouse"})
+    outbox.sync()
+    assert [record["id"] for record in search.search(WORK_ORDERS, "warehouse")] == ["1"]
+    outbox.append(WORK_ORDERS, order("", "Warehouse"))
+    outbox.drain()
+    writer.append(WORK_ORDERS, order("", "Warehouse"))
+    outbox.sync()
+    assert [record["id"] for record in search.search(WORK_ORDERS, "warehouse")] == ["1", "3", "4"]
+    assert rebuilt == []
+
+
+def test_commit_over_another_writers_change_asks_for_a_rebuild():
+    repo = FakeRepository()
+    writer, reader = backend(repo, "single"), backend(repo, "single")
+    writer.extend(WORK_ORDERS, [order(1), order(2)])
+    list(reader.iter_records(WORK_ORDERS))
+    events = []
+    reader.subscribe(lambda kind, file_path, record: events.append(kind))
+    writer.update_by_id(WORK_ORDERS, "1", {"Location": "Warehouse"})
+    # Not synced: the reader's commit is the first to see the update
+    reader.append(WORK_ORDERS, order(""))
+    assert events == ["append", "save"]
@@ -0,0 +1,88 @@
+import pytest
+import storage
+from fake_github import FakeRepository
+from github import GithubException
+
+WORK_ORDERS = "work order records.json"
+CHANGE_LOG = "change log.json"
+
+
+def order(location="Processing"):
+    return {"id": "", "Location": location, "Date": "2026-03-02 10:00:00"}
+
+
+def github(repo=None):
+    return storage.GithubBackend(repo or FakeRepository(), storage.DocumentCache())
+
+
+def sqlite(tmp_path):
+    return storage.SQLiteBackend(str(tmp_path / "data.db"))
+
+
+def stage(tx):
+    tx.update_by_id(WORK_ORDERS, "1", {"Location": "Warehouse"})
+    tx.append(CHANGE_LOG, {"id": "", "Event ID": "1", "Modification Type": "Location"})
+    tx.put_image("images/display/a.jpg", b"jpeg")
+
+
+@pytest.mark.parametrize("make", [lambda tmp_path: github(), sqlite])
+def test_staged_changes_land_together(make, tmp_path):
+    backend = make(tmp_path)
+    backend.append(WORK_ORDERS, order())
+    with backend.transaction("Move order 1") as tx:
+        stage(tx)
+    assert tx.results[0]["Location"] == "Warehouse"
+    assert tx.results[1]["id"] == "1"
+    assert [record["Location"] for record in backend.iter_records(WORK_ORDERS)] == ["Warehouse"]
+    assert [entry["Event ID"] for entry in backend.iter_records(CHANGE_LOG)] == ["1"]
+    assert backend.get_image("images/display/a.jpg") == b"jpeg"
+
+
+def test_github_transaction_is_one_commit():
+    backend = github()
+    backend.append(WORK_ORDERS, order())
+    commits = backend.repo.calls["create_git_commit"]
+    with backend.transaction("Move order 1") as tx:
+        stage(tx)
+    assert backend.repo.calls["create_git_commit"] == commits + 1
+    assert backend.repo.calls["ref.edit"] == 1
+
+
+@pytest.mark.parametrize("make", [lambda tmp_path: github(), sqlite])
+def test_block_that_raises_writes_nothing(make, tmp_path):
+    backend = make(tmp_path)
+    backend.append(WORK_ORDERS, order())
+    version = backend.version(WORK_ORDERS)
+    with pytest.raises(RuntimeError):
+        with backend.transaction("Move order 1") as tx:
+            stage(tx)
+            raise RuntimeError("form invalid")
+    assert tx.ops == [] and tx.results == []
+    assert backend.version(WORK_ORDERS) == version
+    assert list(backend.iter_records(CHANGE_LOG)) == []
+
+
+def test_github_commit_that_fails_leaves_the_branch_alone(monkeypatch):
+    backend = github()
+    backend.append(WORK_ORDERS, order())
+    head = backend.repo.refs["refs/heads/main"]
+
+    def rejected(self, sha, force=False):
+        raise GithubException(403, {"message": "Resource not accessible"}, None)
+    monkeypatch.setattr("fake_github.FakeRef.edit", rejected)
+    with pytest.raises(GithubException):
+        with backend.transaction("Move order 1") as tx:
+            stage(tx)
+    assert backend.repo.refs["refs/heads/main"] == head
+    assert [record["Location"] for record in github(backend.repo).iter_records(WORK_ORDERS)] == ["Processing"]
+
+
+def test_sqlite_rolls_back_every_op_when_one_fails(tmp_path):
+    backend = sqlite(tmp_path)
+    backend.append(WORK_ORDERS, order())
+    with pytest.raises(TypeError):
+        with backend.transaction("Move order 1") as tx:
+            tx.update_by_id(WORK_ORDERS, "1", {"Location": "Warehouse"})
+            tx.append(CHANGE_LOG, {"id": "", "Event ID": object()})
+    assert [record["Location"] for record in backend.iter_records(WORK_ORDERS)] == ["Processing"]
+    assert list(backend.iter_records(CHANGE_LOG)) == []